@@ -0,0 +1,419 @@
+"""Asyncio (ASGI) serving mode for the dashboard.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+    python3 asgi.py
+
+`/stream` is served natively: each open SSE connection is one coroutine and
+a small deque, fed from the shared poller (through its booth's view) by a
+single loop callback per poll. Every other route (pages, /write, /api/read, /health, ...) is the
+unchanged Flask app, run on a bounded thread pool so blocking PLC calls
+never stall the event loop. URLs and payloads match the threaded server.
+
+`/ws` (and `/booth/<n>/ws`) is a WebSocket carrying a stream and writes on
+one connection (uvicorn needs `websockets` or `wsproto` installed for it).
+It takes /stream's query parameters, `last_id` for resuming, and sends
+the same events as text, in SSE form ("id: ...\ndata: ..."). Clients send
+
+    {"id": 7, "op": "write", "tag": "W00[15]", "value": 12000, "momentary": false}
+
+and get {"type": "ack", "id": 7, "code": 200, ...} with /write's reply.
+When the written tag is in the stream, the ack says "confirm": true and a
+{"type": "confirm", "id": 7, "ok": true, "event_id": ...} follows once a
+poll shows the value (ok false, with the value seen, after
+WRITE_CONFIRM_SEC). The threaded server has no /ws; pages fall back to
+/stream and POST /write.
+"""
+import asyncio, collections, io, json, sys, time
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+import paintbooth
+from poller import Subscriber
+
+WSGI_WORKERS = 8         # threads for Flask routes (and the PLC I/O they do)
+SSE_KEEPALIVE_SEC = 15.0  # comment line sent when no update arrives for this long
+WRITE_CONFIRM_SEC = 5.0   # a write not seen in the poll by then is reported unconfirmed
+
+_executor = ThreadPoolExecutor(max_workers=WSGI_WORKERS, thread_name_prefix="wsgi")
+_fanouts = {}  # (event loop, poller) -> LoopFanout
+
+
+class AsyncSubscriber(Subscriber):
+    """Subscriber living on the event loop; put() is only called from the loop."""
+
+    def __init__(self, maxsize=4, mode="full", codec=None):
+        super().__init__(maxsize, mode, codec)
+        self._items = collections.deque()
+        self._ready = asyncio.Event()
+
+    def put(self, item):
+        if len(self._items) >= self.queue.maxsize:
+            self._items.popleft()
+            self.dropped += 1
+        self._items.append(item)
+        self._ready.set()
+
+    @property
+    def depth(self):
+        return len(self._items)
+
+    async def next_message_async(self, timeout=None):
+        if self.pending is not None:
+            msg, self.pending = self.pending, None
+            return msg
+        while True:
+            while not self._items:
+                self._ready.clear()
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            msg = self.encode(self._items.popleft())
+            if msg is not None:
+                return msg
+
+
+class ChannelSubscriber(AsyncSubscriber):
+    """A WebSocket client: the stream's messages plus its replies, in one
+    queue. Each frame is checked against the writes waiting to be seen."""
+
+    def __init__(self, maxsize=4, mode="full", codec=None):
+        super().__init__(maxsize, mode, codec)
+        self.replies = collections.deque()
+        self.confirms = {}  # request id -> (key, expected value, deadline)
+        self.last_frame = None
+        self.closed = False
+
+    def reply(self, msg):
+        self.replies.append(json.dumps(msg))
+        self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    def confirm(self, rid, key, value):
+        """Report `rid` once a frame shows `key` at `value` (decoded)."""
+        self.confirms[rid] = (key, value, time.monotonic() + WRITE_CONFIRM_SEC)
+        if self.last_frame is not None:
+            self._check(self.last_frame)
+
+    def _check(self, frame):
+        now = time.monotonic()
+        for rid, (key, value, deadline) in list(self.confirms.items()):
+            seen = frame.values.get(key) if frame.values is not None else None
+            if seen == value:
+                del self.confirms[rid]
+                self.reply({"type": "confirm", "id": rid, "ok": True, "event_id": frame.id})
+            elif now >= deadline:
+                del self.confirms[rid]
+                self.reply({"type": "confirm", "id": rid, "ok": False, "value": seen})
+
+    def put(self, item):
+        self.last_frame = item
+        if self.confirms:
+            self._check(item)
+        super().put(item)
+
+    async def next_message_async(self, timeout=None):
+        """Next reply or stream message; None once the client has gone."""
+        while True:
+            if self.replies:
+                return self.replies.popleft()
+            if self.closed:
+                return None
+            if self.pending is not None:
+                msg, self.pending = self.pending, None
+                return msg
+            if not self._items:
+                self._ready.clear()
+                await asyncio.wait_for(self._ready.wait(), timeout)
+                continue
+            msg = self.encode(self._items.popleft())
+            if msg is not None:
+                return msg
+
+
+class LoopFanout:
+    """The one listener a poller sees for all async clients on an event loop:
+    each frame costs a single call_soon_threadsafe, then a plain loop over
+    the clients."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.subs = set()
+
+    def put(self, frame):
+        self.loop.call_soon_threadsafe(self._dispatch, frame)
+
+    def _dispatch(self, frame):
+        for sub in list(self.subs):
+            sub.put(frame)
+
+
+def _fanout(poller):
+    loop = asyncio.get_running_loop()
+    fan = _fanouts.get((loop, poller))
+    if fan is None:
+        fan = LoopFanout(loop)
+        poller.attach(fan, prime=False)  # ValueError when its tags don't fit the watch cap
+        _fanouts[(loop, poller)] = fan
+    return fan
+
+
+def _query(scope):
+    return {k: v[-1] for k, v in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+
+
+def _header(scope, name):
+    name = name.lower().encode()
+    for k, v in scope.get("headers", []):
+        if k == name:
+            return v.decode("latin-1")
+    return None
+
+
+async def _watch_disconnect(receive):
+    while True:
+        msg = await receive()
+        if msg["type"] == "http.disconnect":
+            return
+
+
+async def stream(scope, receive, send, poller=None, codec=None):
+    """Native SSE endpoint; same query parameters and payloads as the Flask /stream.
+    `poller` is any broadcaster, Booth 1's view by default; with a `codec`
+    updates are packed (?format=packed)."""
+    poller = poller or paintbooth.booth_views["1"]
+    args = _query(scope)
+    mode = "delta" if args.get("mode") == "delta" else "full"
+    last_id = _header(scope, "last-event-id") or args.get("last_id")
+
+    sub = AsyncSubscriber(poller.queue_size, mode, codec)
+    try:
+        fan = _join(poller, sub, last_id)
+    except ValueError:
+        await wsgi(scope, receive, send)  # the watch cap filled since the check: Flask answers it
+        return
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"text/event-stream"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ]})
+    gone = asyncio.ensure_future(_watch_disconnect(receive))
+    try:
+        if codec is not None:
+            await send({"type": "http.response.body", "body": codec.schema_msg.encode(), "more_body": True})
+        while not gone.done():
+            try:
+                msg = await sub.next_message_async(SSE_KEEPALIVE_SEC)
+            except asyncio.TimeoutError:
+                msg = ": keepalive\n\n"
+            t = time.perf_counter()
+            await send({"type": "http.response.body", "body": msg.encode(), "more_body": True})
+            paintbooth.YIELD_SECONDS.observe(time.perf_counter() - t)
+    except OSError:
+        pass  # client went away mid-send
+    finally:
+        _leave(poller, fan, sub)
+        gone.cancel()
+
+
+def _join(poller, sub, last_id):
+    fan = _fanout(poller)
+    fan.subs.add(sub)
+    poller.prime(sub, last_id)
+    paintbooth.track_client(sub, last_id)
+    return fan
+
+
+def _leave(poller, fan, sub):
+    paintbooth.sse_clients.pop(sub, None)
+    fan.subs.discard(sub)
+    if not fan.subs:
+        # Last client on this loop: detach, so on-demand sources (interlock
+        # trees) stop reading their extra tags
+        _fanouts.pop((fan.loop, poller), None)
+        poller.unsubscribe(fan)
+
+
+async def channel(scope, receive, send, booth):
+    """WebSocket /ws: one booth's stream plus writes (see the module docstring)."""
+    if (await receive())["type"] != "websocket.connect":
+        return
+    await send({"type": "websocket.accept"})
+    args = _query(scope)
+    spec = args.get("tags")
+    try:
+        view = paintbooth.tag_view(booth, spec) if spec else paintbooth.booth_views[booth]
+    except (LookupError, ValueError) as e:
+        code = 404 if isinstance(e, LookupError) else 400
+        await send({"type": "websocket.send", "text": json.dumps({"type": "error", "code": code, "error": str(e)})})
+        await send({"type": "websocket.close", "code": 1008})
+        return
+    codec = paintbooth.packed_codec(view) if args.get("format") == "packed" else None
+    sub = ChannelSubscriber(view.queue_size, "delta" if args.get("mode") == "delta" else "full", codec)
+    try:
+        fan = _join(view, sub, args.get("last_id"))
+    except ValueError as e:
+        await send({"type": "websocket.send", "text": json.dumps({"type": "error", "code": 400, "error": str(e)})})
+        await send({"type": "websocket.close", "code": 1008})
+        return
+    loop = asyncio.get_running_loop()
+
+    async def commands():
+        # Writes run one at a time, in the order the client sent them
+        try:
+            while True:
+                msg = await receive()
+                if msg["type"] == "websocket.disconnect":
+                    return
+                try:
+                    cmd = json.loads(msg.get("text") or msg.get("bytes") or "")
+                except ValueError:
+                    cmd = None
+                if not isinstance(cmd, dict):
+                    sub.reply({"type": "ack", "id": None, "code": 400, "error": "Command must be a JSON object"})
+                    continue
+                rid = cmd.get("id")
+                if cmd.get("op") != "write":
+                    sub.reply({"type": "ack", "id": rid, "code": 400, "error": f"Unknown op {cmd.get('op')!r}"})
+                    continue
+                reply, code = await loop.run_in_executor(_executor, paintbooth.write_command, booth, cmd)
+                key = cmd.get("tag")
+                field = paintbooth.FIELDS.get(reply.get("tag"))
+                # Momentary bits are back at 0 before a poll could show them
+                confirm = (code == 200 and key in view.mapping and not cmd.get("momentary")
+                           and field is not None and field.poll)
+                sub.reply(dict(reply, type="ack", id=rid, code=code, confirm=confirm))
+                if confirm:
+                    sub.confirm(rid, key, field.decode(reply["value"]))
+        finally:
+            sub.close()
+
+    reader = asyncio.ensure_future(commands())
+    try:
+        if codec is not None:
+            await send({"type": "websocket.send", "text": codec.schema_msg})
+        while True:
+            try:
+                msg = await sub.next_message_async(SSE_KEEPALIVE_SEC)
+            except asyncio.TimeoutError:
+                continue
+            if msg is None:
+                break
+            await send({"type": "websocket.send", "text": msg})
+    except OSError:
+        pass  # client went away mid-send
+    finally:
+        _leave(view, fan, sub)
+        reader.cancel()
+
+
+def _environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.input_terminated": True,
+        "CONTENT_LENGTH": str(len(body)),  # the body is already buffered, chunked or not
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for k, v in scope.get("headers", []):
+        name = k.decode("latin-1").upper().replace("-", "_")
+        value = v.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        if name == "CONTENT_TYPE":
+            environ[name] = value
+        else:
+            key = "HTTP_" + name
+            environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+async def wsgi(scope, receive, send, app=None):
+    """Run one request through the Flask app on the bounded executor."""
+    app = app or paintbooth.app
+    body = b""
+    while True:
+        msg = await receive()
+        body += msg.get("body", b"")
+        if not msg.get("more_body"):
+            break
+    environ = _environ(scope, body)
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+    def call():
+        result = app(environ, start_response)
+        try:
+            return b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+    data = await asyncio.get_running_loop().run_in_executor(_executor, call)
+    await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+    await send({"type": "http.response.body", "body": data})
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            msg = await receive()
+            if msg["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif msg["type"] == "lifespan.shutdown":
+                _executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    path = scope["path"]
+    if scope["type"] == "websocket":
+        booth = "1" if path == "/ws" else path[7:-3] if path.startswith("/booth/") and path.endswith("/ws") else None
+        if booth in paintbooth.booth_views:
+            await channel(scope, receive, send, booth)
+        else:
+            await send({"type": "websocket.close", "code": 1008})
+        return
+    if scope["type"] != "http":
+        return
+    booth = "1" if path == "/stream" else path[7:-7] if path.startswith("/booth/") and path.endswith("/stream") else None
+    if booth in paintbooth.booth_views and scope["method"] == "GET":
+        args = _query(scope)
+        spec = args.get("tags")
+        try:
+            view = paintbooth.tag_view(booth, spec) if spec else paintbooth.booth_views[booth]
+        except (LookupError, ValueError):
+            await wsgi(scope, receive, send)  # Flask answers the error
+        else:
+            codec = paintbooth.packed_codec(view) if args.get("format") == "packed" else None
+            await stream(scope, receive, send, view, codec)
+    elif path == "/api/explain/stream" and scope["method"] == "GET":
+        try:
+            tree = paintbooth.explainer_for(_query(scope).get("tag", "").strip(), watch=True)
+        except ValueError:
+            tree = None
+        if tree is None:
+            await wsgi(scope, receive, send)  # Flask answers the 404 or 400
+        else:
+            await stream(scope, receive, send, tree)
+    else:
+        await wsgi(scope, receive, send)
+
+
+if __name__ == "__main__":
+    import uvicorn  # optional: only needed for the asyncio serving mode
+    uvicorn.run(application, host="0.0.0.0", port=5000, log_level="warning")
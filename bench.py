@@ -0,0 +1,337 @@
+"""Load and latency benchmark for the dashboard, against an in-process fake PLC.
+
+    python3 bench.py --clients 10 --writers 2 --seconds 30 --latency-ms 8 --jitter-ms 3
+    python3 bench.py compare data/bench/a.json data/bench/b.json
+
+FakePLC stands in for pylogix.PLC (no network, no cpppo). It has
+configurable per-round-trip latency, jitter and failure rate plus a cost per
+CIP service inside a round trip, and it counts the services a real
+controller would see. Reads are batched the way pylogix batches them
+(readplan.batches): plain reads share Multiple Service Packets up to the
+connection size, every array read is a round trip of its own. The app is served on a local
+port, with N SSE clients, M writers and K /api/read pollers running against
+it. The report covers PLC round trips per second, end-to-end update latency
+(from each change of a value in the fake PLC to an SSE client receiving it),
+write and read latency, process CPU and RSS. It is saved as JSON so runs
+can be compared.
+"""
+import argparse, collections, http.client, json, os, random, re, resource
+import subprocess, sys, tempfile, threading, time
+
+import readplan
+
+PROBE_TAG = "W16[2]"   # the fake PLC counts this tag up every PROBE_SEC
+PROBE_SEC = 0.05
+PROBE_WRAP = 30000     # INT-sized, like the real temperature word
+WRITE_TAGS = ["W00[15]", "W00[13]", "B1_Bake_Time", "TMR[6].PRE"]
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUT = os.path.join(HERE, "data", "bench")
+
+_element = re.compile(r"^(.*)\[(\d+)\]$")
+
+
+class FakePLC:
+    """Drop-in for pylogix.PLC. Settings and counters are class-wide, so
+    every session the app opens shares them."""
+
+    latency = 0.005       # seconds per round trip
+    jitter = 0.0          # +/- seconds, uniform
+    failure_rate = 0.0    # chance a round trip fails like a dead link
+    service_time = 0.0001 # seconds per CIP service inside a round trip
+    ConnectionSize = readplan.CONNECTION_SIZE
+    services = collections.Counter()
+    values = {}           # written tags
+    started = time.monotonic()
+    _lock = threading.Lock()
+
+    def __init__(self, ip_address="", slot=0, timeout=5.0, Micro800=False, port=44818):
+        self.IPAddress = ip_address
+        self.ProcessorSlot = slot
+        self.SocketTimeout = timeout
+        self._connected = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
+
+    @classmethod
+    def reset(cls, latency=0.005, jitter=0.0, failure_rate=0.0, service_time=0.0001):
+        cls.latency, cls.jitter, cls.failure_rate = latency, jitter, failure_rate
+        cls.service_time = service_time
+        cls.services = collections.Counter()
+        cls.values = {}
+        cls.started = time.monotonic()
+
+    @classmethod
+    def probe(cls, now=None):
+        """Current probe count (unwrapped)."""
+        return int(((now or time.monotonic()) - cls.started) / PROBE_SEC)
+
+    def _round_trip(self, service, n=1):
+        with self._lock:
+            if not self._connected:
+                self.services["forward_open"] += 1
+            self.services[service] += n
+            self.services["round_trips"] += 1
+        delay = self.latency + random.uniform(-self.jitter, self.jitter) + n * self.service_time
+        if delay > 0:
+            time.sleep(delay)
+        if random.random() < self.failure_rate:
+            self._connected = False
+            return False
+        self._connected = True
+        return True
+
+    def _value(self, tag):
+        if tag == PROBE_TAG:
+            return self.probe() % PROBE_WRAP
+        return self.values.get(tag, 0)
+
+    def _read_one(self, request, count=1):
+        from pylogix.lgx_response import Response
+        tag, count = request if isinstance(request, (list, tuple)) else (request, count)
+        if count > 1:
+            m = _element.match(tag)
+            base, start = (m.group(1), int(m.group(2))) if m else (tag, 0)
+            return Response(tag, [self._value(f"{base}[{start + i}]") for i in range(count)], 0)
+        return Response(tag, self._value(tag), 0)
+
+    def Read(self, tag, count=1, datatype=None):
+        from pylogix.lgx_response import Response
+        many = isinstance(tag, list)
+        requests = tag if many else [tag if count == 1 else (tag, count)]
+        out = []
+        for chunk in readplan.batches(requests, lambda t: 4, self.ConnectionSize):
+            service = "multiple_service_packet" if len(chunk) > 1 else "read_tag"
+            if self._round_trip(service, len(chunk)):
+                out += [self._read_one(r, count) for r in chunk]
+            else:
+                out += [Response(r if isinstance(r, str) else r[0], None, 1) for r in chunk]
+        return out if many else out[0]
+
+    def Write(self, tag, value=None, datatype=None):
+        from pylogix.lgx_response import Response
+        many = isinstance(tag, list)
+        pairs = tag if many else [(tag, value)]
+        bits = sum(1 for t, _ in pairs if re.search(r"\.\d+$", t))
+        service = "multiple_service_packet" if len(pairs) > 1 else (
+            "read_modify_write" if bits else "write_tag")
+        if not self._round_trip(service, len(pairs)):
+            out = [Response(t, v, 1) for t, v in pairs]
+        else:
+            with self._lock:
+                for t, v in pairs:
+                    self.values[t] = v
+            out = [Response(t, v, 0) for t, v in pairs]
+        return out if many else out[0]
+
+    def Close(self):
+        self._connected = False
+
+
+def install():
+    """Patch pylogix so modules imported afterwards get FakePLC."""
+    import pylogix
+    pylogix.PLC = FakePLC
+
+
+def percentiles(samples, scale=1000.0):
+    """{p50, p90, p99, max, n} of `samples`, scaled (seconds -> ms by default)."""
+    if not samples:
+        return {"n": 0}
+    s = sorted(samples)
+    pick = lambda q: round(s[min(len(s) - 1, int(q * len(s)))] * scale, 2)
+    return {"n": len(s), "p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99),
+            "max": round(s[-1] * scale, 2)}
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _sse_client(port, stop, latencies, stats):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("GET", "/stream?mode=delta")
+    resp = conn.getresponse()
+    seen = None
+    try:
+        while not stop.is_set():
+            line = resp.readline()
+            if not line:
+                break
+            if not line.startswith(b"data: "):
+                continue
+            now = time.monotonic()
+            payload = json.loads(line[6:])
+            stats["messages"] += 1
+            v = (payload.get("values") or {}).get(PROBE_TAG)
+            if v is None:
+                continue
+            # Unwrap the probe count against the current one; every change since
+            # the last one this client saw reaches the screen now
+            n = FakePLC.probe(now)
+            n -= (n - v) % PROBE_WRAP
+            if seen is not None:
+                for k in range(seen + 1, n + 1):
+                    latencies.append(now - (FakePLC.started + k * PROBE_SEC))
+            seen = n
+    except (OSError, http.client.HTTPException):
+        stats["errors"] += 1
+    finally:
+        conn.close()
+
+
+def _requester(port, stop, rate, make, latencies, stats):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    i = 0
+    due = time.monotonic()
+    while not stop.is_set():
+        method, path, body = make(i)
+        started = time.monotonic()
+        try:
+            conn.request(method, path, body, {"Content-Type": "application/json"} if body else {})
+            resp = conn.getresponse()
+            resp.read()
+            latencies.append(time.monotonic() - started)
+            stats[resp.status] += 1
+        except (OSError, http.client.HTTPException):
+            stats["errors"] += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        i += 1
+        due += 1.0 / rate
+        stop.wait(max(0.0, due - time.monotonic()))
+    conn.close()
+
+
+def run(clients=10, writers=2, readers=1, seconds=30.0, latency=0.005, jitter=0.0,
+        failure_rate=0.0, write_rate=1.0, read_rate=1.0, warmup=2.0, service_time=0.0001):
+    install()
+    FakePLC.reset(latency, jitter, failure_rate, service_time)
+    sys.path.insert(0, HERE)
+    os.chdir(tempfile.mkdtemp(prefix="pb-bench-"))  # snapshot/historian files land here
+    import paintbooth
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", 0, paintbooth.app, threaded=True)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, name="bench-http", daemon=True).start()
+
+    stop = threading.Event()
+    update_lat, write_lat, read_lat = [], [], []
+    sse_stats = collections.Counter()
+    write_stats, read_stats = collections.Counter(), collections.Counter()
+    threads = [threading.Thread(target=_sse_client, args=(port, stop, update_lat, sse_stats), daemon=True)
+               for _ in range(clients)]
+    threads += [threading.Thread(target=_requester, daemon=True, args=(
+        port, stop, write_rate,
+        lambda i, w=w: ("POST", "/write", json.dumps({"tag": WRITE_TAGS[(i + w) % len(WRITE_TAGS)], "value": i})),
+        write_lat, write_stats)) for w in range(writers)]
+    threads += [threading.Thread(target=_requester, daemon=True, args=(
+        port, stop, read_rate, lambda i: ("GET", "/api/read?max_age=0", None), read_lat, read_stats))
+        for _ in range(readers)]
+    for t in threads:
+        t.start()
+
+    time.sleep(warmup)
+    del update_lat[:], write_lat[:], read_lat[:]
+    services0 = dict(FakePLC.services)
+    usage0, wall0 = resource.getrusage(resource.RUSAGE_SELF), time.monotonic()
+    time.sleep(seconds)
+    usage, wall = resource.getrusage(resource.RUSAGE_SELF), time.monotonic() - wall0
+    services = {k: v - services0.get(k, 0) for k, v in FakePLC.services.items()}
+    rss = _rss_mb()
+    stop.set()
+    server.shutdown()
+
+    cpu = (usage.ru_utime - usage0.ru_utime) + (usage.ru_stime - usage0.ru_stime)
+    return {
+        "config": {"clients": clients, "writers": writers, "readers": readers, "seconds": seconds,
+                   "latency_ms": latency * 1000, "jitter_ms": jitter * 1000, "service_us": service_time * 1e6,
+                   "failure_rate": failure_rate, "write_rate": write_rate, "read_rate": read_rate},
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _commit(),
+        "plc": {
+            "round_trips_per_sec": round(services.get("round_trips", 0) / wall, 2),
+            "services": services,
+            "link": paintbooth.link.report(),
+        },
+        "updates": {"messages": sse_stats["messages"], "client_errors": sse_stats["errors"],
+                    "latency_ms": percentiles(update_lat)},
+        "writes": {"status": {str(k): v for k, v in write_stats.items()}, "latency_ms": percentiles(write_lat)},
+        "api_read": {"status": {str(k): v for k, v in read_stats.items()}, "latency_ms": percentiles(read_lat)},
+        "process": {"cpu_pct": round(cpu / wall * 100, 1), "rss_mb": rss,
+                    "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                    "threads": threading.active_count()},
+        "scan_classes": {name: {k: c[k] for k in ("rate_hz", "jitter_ms", "read_ms", "overruns")}
+                         for name, c in paintbooth.poller.report().items()},
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "-C", HERE, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(paths):
+    """Side-by-side headline numbers from saved runs."""
+    runs = []
+    for p in paths:
+        with open(p) as f:
+            runs.append(json.load(f))
+    rows = [
+        ("commit", lambda r: r.get("commit")),
+        ("PLC round trips/s", lambda r: r["plc"]["round_trips_per_sec"]),
+        ("update p50 ms", lambda r: r["updates"]["latency_ms"].get("p50")),
+        ("update p99 ms", lambda r: r["updates"]["latency_ms"].get("p99")),
+        ("write p50 ms", lambda r: r["writes"]["latency_ms"].get("p50")),
+        ("write p99 ms", lambda r: r["writes"]["latency_ms"].get("p99")),
+        ("api/read p50 ms", lambda r: r["api_read"]["latency_ms"].get("p50")),
+        ("cpu %", lambda r: r["process"]["cpu_pct"]),
+        ("rss MB", lambda r: r["process"]["rss_mb"]),
+    ]
+    print(f"{'':20}" + "".join(f"{os.path.basename(p)[:22]:>24}" for p in paths))
+    for name, get in rows:
+        print(f"{name:20}" + "".join(f"{str(get(r)):>24}" for r in runs))
+
+
+def main(argv):
+    if argv[:1] == ["compare"]:
+        compare(argv[1:])
+        return
+    ap = argparse.ArgumentParser(description="Dashboard load/latency benchmark against a fake PLC")
+    ap.add_argument("--clients", type=int, default=10, help="SSE clients (delta mode)")
+    ap.add_argument("--writers", type=int, default=2, help="clients POSTing /write")
+    ap.add_argument("--readers", type=int, default=1, help="clients polling /api/read?max_age=0")
+    ap.add_argument("--seconds", type=float, default=30.0)
+    ap.add_argument("--latency-ms", type=float, default=5.0, help="fake PLC round trip")
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--service-us", type=float, default=100.0, help="fake PLC time per CIP service in a round trip")
+    ap.add_argument("--failure-rate", type=float, default=0.0, help="0..1 per round trip")
+    ap.add_argument("--write-rate", type=float, default=1.0, help="writes/s per writer")
+    ap.add_argument("--read-rate", type=float, default=1.0, help="reads/s per reader")
+    ap.add_argument("--out", help="result file (default: data/bench/<time>.json)")
+    a = ap.parse_args(argv)
+    out = os.path.abspath(a.out or os.path.join(DEFAULT_OUT, time.strftime("%Y%m%d-%H%M%S") + ".json"))
+    report = run(a.clients, a.writers, a.readers, a.seconds, a.latency_ms / 1000, a.jitter_ms / 1000,
+                 a.failure_rate, a.write_rate, a.read_rate, service_time=a.service_us / 1e6)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"saved {out}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
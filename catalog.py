@@ -0,0 +1,241 @@
+"""Controller tag catalog, for tag discovery without browsing the PLC.
+
+    python3 catalog.py refresh IP      # fetch the tag list from the controller now
+    python3 catalog.py search TEXT     # what the HMI's autocomplete would offer
+    python3 catalog.py bench
+
+GetTagList walks the whole symbol table (controller scope, then every
+program) in many requests and fetches each structure's template, so it is
+run once and the result kept on disk with each tag's type, array size,
+structure members and L5X description. It is fetched again only when the
+project has changed: the controller's identity (name, revision, serial) or
+the L5X export no longer match what the catalog was built against, or it
+is older than MAX_AGE_SEC. pylogix has no cheap "project edited" counter,
+so re-exporting the L5X after a download is what signals a changed project
+on the same controller. Until a controller list exists, the L5X's own tags
+stand in.
+
+Searches run on an in-memory index: a sorted name list for prefix matches
+and lowercased name/description strings for fuzzy ones. Bits and members
+the program comments or uses (M[2].0 "Center Door Switch", TMR[4].ACC) are
+entries too, so a description finds the address.
+"""
+import bisect, json, os, re, sys, threading, time
+from pylogix import PLC
+from link import LinkHealth
+from poller import error_text
+
+CATALOG_VERSION = 1
+DEFAULT_PATH = "data/catalog.json"
+MAX_AGE_SEC = 7 * 86400   # refetch at least this often even if nothing looks changed
+CHECK_SEC = 3600.0        # how often the controller identity is compared
+SEARCH_LIMIT = 20
+
+
+def identity(comm):
+    """Controller name, revision and serial number: one small request."""
+    d = comm.GetDeviceProperties().Value
+    if d is None:
+        return None
+    return f"{d.ProductName} {d.Revision} {d.SerialNumber}"
+
+
+def _description(comments, name):
+    # Program tags come back as Program:<program>.<tag>; the L5X names them plainly
+    return comments.get(name) or comments.get(name.split(".", 1)[1] if name.startswith("Program:") else "")
+
+
+def _entries(tags, xref):
+    """Tag entries plus one per bit, element or member the program comments
+    or references (M[2].0, TMR[4].ACC) that isn't listed itself."""
+    entries = {t["name"]: t for t in tags}
+    if xref is not None:
+        for operand in list(xref.comments) + list(xref.refs):
+            if operand not in entries and ("." in operand or "[" in operand):
+                entries[operand] = {"name": operand, "type": None, "dims": None,
+                                    "description": xref.comments.get(operand)}
+    return sorted(entries.values(), key=lambda t: t["name"].lower())
+
+
+def fetch(ip, xref=None, timeout=10.0):
+    """Catalog data from the controller's tag list."""
+    comments = xref.comments if xref is not None else {}
+    with PLC(ip, timeout=timeout) as comm:
+        ident = identity(comm)
+        res = comm.GetTagList(True)
+        if res.Value is None:
+            raise ConnectionError(f"GetTagList: {res.Status}")
+        members = {udt.Name: [f.TagName for f in udt.Fields] for udt in comm.UDT.values()}
+    tags = []
+    for t in res.Value:
+        if t.TagName.startswith("Program:") and "." not in t.TagName:
+            continue  # the program itself
+        tags.append({"name": t.TagName, "type": t.DataType or None, "dims": t.Size if t.Array else None,
+                     "members": members.get(t.DataType) if t.Struct else None,
+                     "description": _description(comments, t.TagName)})
+    return {"version": CATALOG_VERSION, "source": "plc", "fetched": time.time(), "identity": ident,
+            "l5x_sha256": xref.source_hash if xref is not None else None, "tags": _entries(tags, xref)}
+
+
+def from_l5x(xref):
+    """Stand-in catalog from the L5X export (types and descriptions, no sizes)."""
+    tags = [{"name": name, "type": kind, "dims": None, "description": xref.comments.get(name)}
+            for name, kind in xref.types.items()]
+    return {"version": CATALOG_VERSION, "source": "l5x", "fetched": None, "identity": None,
+            "l5x_sha256": xref.source_hash, "tags": _entries(tags, xref)}
+
+
+class TagCatalog:
+    def __init__(self, data):
+        self.data = data
+        self.tags = data["tags"]
+        self.source = data["source"]
+        self.fetched = data["fetched"]
+        self._names = [t["name"].lower() for t in self.tags]  # sorted, like self.tags
+        self._text = [f'{n} {(t.get("description") or "").lower()}' for n, t in zip(self._names, self.tags)]
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(data) if data.get("version") == CATALOG_VERSION else None
+
+    def save(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def stale(self, ident, l5x_sha256, now=None):
+        """True when the controller list should be fetched again."""
+        if self.source != "plc":
+            return True
+        if ident is not None and ident != self.data["identity"]:
+            return True
+        if l5x_sha256 is not None and l5x_sha256 != self.data["l5x_sha256"]:
+            return True
+        return (now or time.time()) - self.fetched > MAX_AGE_SEC
+
+    def prefix(self, text, limit=SEARCH_LIMIT):
+        text = text.strip().lower()
+        i = bisect.bisect_left(self._names, text)
+        out = []
+        while i < len(self._names) and self._names[i].startswith(text) and len(out) < limit:
+            out.append(self.tags[i])
+            i += 1
+        return out
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        """Prefix matches first, then names or descriptions containing every
+        word, then names containing the letters in order (tmracc -> TMR[4].ACC)."""
+        words = text.strip().lower().split()
+        if not words:
+            return []
+        out = self.prefix(words[0], limit) if len(words) == 1 else []
+        if len(out) >= limit:
+            return out
+        seen = {t["name"] for t in out}
+        letters = re.compile(".*?".join(map(re.escape, words[0]))).search if len(words) == 1 else None
+        scored = []
+        for i, hay in enumerate(self._text):
+            if all(w in hay for w in words):
+                scored.append((0, hay.find(words[0]), i))
+            elif letters is not None and letters(self._names[i]):
+                scored.append((1, len(self._names[i]), i))
+        scored.sort()
+        rest = (self.tags[i] for _, _, i in scored)
+        return out + [t for t in rest if t["name"] not in seen][:limit - len(out)]
+
+    def report(self):
+        return {"source": self.source, "tags": len(self.tags),
+                "fetched": self.fetched and round(self.fetched, 3), "identity": self.data["identity"]}
+
+
+class CatalogKeeper:
+    """Holds the current TagCatalog and refetches it from the PLC, in the
+    background, when stale(). `health` is the shared LinkHealth: no fetch
+    is attempted while the circuit is open."""
+
+    def __init__(self, ip, xref=None, path=DEFAULT_PATH, health=None):
+        self.ip = ip
+        self.xref = xref
+        self.path = path
+        self.health = health or LinkHealth()
+        self.catalog = TagCatalog.load(path)
+        if self.catalog is None and xref is not None:
+            self.catalog = TagCatalog(from_l5x(xref))
+        self.checked = None
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def check(self, force=False):
+        """Fetch the tag list if the catalog is stale (or `force`); returns
+        True when a new catalog was fetched."""
+        with self._lock:
+            try:
+                self.health.check()
+                if not force and self.catalog is not None:
+                    with PLC(self.ip) as comm:
+                        ident = identity(comm)
+                    sha = self.xref.source_hash if self.xref is not None else None
+                    if not self.catalog.stale(ident, sha):
+                        self.checked = time.time()
+                        return False
+                catalog = TagCatalog(fetch(self.ip, self.xref))
+                catalog.save(self.path)
+                self.catalog = catalog
+                self.checked = time.time()
+                self.last_error = None
+                return True
+            except Exception as e:
+                self.last_error = error_text(e)
+                return False
+
+    def start(self, interval=CHECK_SEC):
+        def run():
+            while True:
+                self.check()
+                time.sleep(interval)
+        threading.Thread(target=run, name="tag-catalog", daemon=True).start()
+        return self
+
+    def report(self):
+        out = self.catalog.report() if self.catalog is not None else {"source": None}
+        out.update(checked=self.checked and round(self.checked, 3), error=self.last_error)
+        return out
+
+
+def bench(l5x=None):
+    from xref import DEFAULT_L5X, XrefIndex
+    catalog = TagCatalog(from_l5x(XrefIndex.load(l5x or DEFAULT_L5X)))
+    print(f"{len(catalog.tags)} entries")
+    for q in ("m[", "tmr", "door", "tmracc", "bake time"):
+        n = 2000
+        t0 = time.perf_counter()
+        for _ in range(n):
+            found = catalog.search(q)
+        print(f"{q!r}: {len(found)} results, {(time.perf_counter() - t0) / n * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["bench"]:
+        bench(*args[1:2])
+    elif args[:1] == ["refresh"]:
+        from xref import XrefIndex
+        keeper = CatalogKeeper(args[1], XrefIndex.load())
+        print("fetched" if keeper.check(force=True) else f"failed: {keeper.last_error}")
+        print(json.dumps(keeper.report(), indent=2))
+    elif args[:1] == ["search"]:
+        catalog = TagCatalog.load()
+        if catalog is None:
+            from xref import XrefIndex
+            catalog = TagCatalog(from_l5x(XrefIndex.load()))
+        for t in catalog.search(" ".join(args[1:])):
+            print(f'{t["name"]:32} {t["type"] or "":12} {t.get("description") or ""}')
+    else:
+        print(__doc__)
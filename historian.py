@@ -0,0 +1,456 @@
+"""On-disk historian: compact, append-only, one file per day.
+
+Each day file is a sequence of self-describing chunks, one per batch of
+polls (CHUNK_SAMPLES, or whatever was buffered after FLUSH_SEC):
+
+    header  "<4sIddIH"  magic, body length, first ts, last ts, samples, columns
+    body    u32 length + timestamps, then per column:
+            u8 name length, name, u8 kind, u32 length, data
+
+Timestamps are milliseconds stored as delta-of-delta varints, so a steady
+1 s poll costs about one byte per sample. Columns pick their encoding per
+chunk: run-length for bits, zigzag deltas for integers and XOR against the
+previous value for floats (with a presence run-length map for failed reads).
+SD cards see one append per chunk rather than one write per poll.
+
+Queries mmap the day files in range, hop from header to header and decode
+only the chunks and columns they need.
+
+    python3 historian.py bench                   bytes/sample and query latency
+    python3 historian.py compact [dir] [days]    merge chunks, enforce retention
+"""
+import datetime, mmap, os, struct, sys, threading, time
+
+MAGIC = b"PBHC"
+HEADER = struct.Struct("<4sIddIH")
+CHUNK_SAMPLES = 600     # 10 min at 1 s
+FLUSH_SEC = 60.0        # most a crash or power cut can lose; compaction merges the small chunks later
+COMPACT_SAMPLES = 3600  # chunk size after compaction
+KEEP_DAYS = 400         # retention for compact()
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "history")
+
+BITS, INTS, FLOATS = 0, 1, 2
+_D = struct.Struct("<d")
+_Q = struct.Struct("<Q")
+_U32 = struct.Struct("<I")
+
+
+# ---- varints ----
+
+def _put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(buf, pos):
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _zz(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _unzz(n):
+    return (n >> 1) ^ -(n & 1)
+
+
+# ---- column encodings ----
+
+def encode_times(ts_ms):
+    out = bytearray()
+    prev, prev_delta = 0, 0
+    for i, t in enumerate(ts_ms):
+        if i == 0:
+            _put_varint(out, _zz(t))
+        else:
+            delta = t - prev
+            _put_varint(out, _zz(delta - prev_delta))
+            prev_delta = delta
+        prev = t
+    return bytes(out)
+
+
+def decode_times(buf, n):
+    out = []
+    pos = 0
+    prev = prev_delta = 0
+    for i in range(n):
+        v, pos = _get_varint(buf, pos)
+        v = _unzz(v)
+        if i == 0:
+            prev = v
+        else:
+            prev_delta += v
+            prev += prev_delta
+        out.append(prev)
+    return out
+
+
+def _runs(codes):
+    out = bytearray()
+    run_code, run = None, 0
+    for c in codes:
+        if c == run_code:
+            run += 1
+            continue
+        if run:
+            out.append(run_code)
+            _put_varint(out, run)
+        run_code, run = c, 1
+    if run:
+        out.append(run_code)
+        _put_varint(out, run)
+    return out
+
+
+def _unruns(buf, pos, n):
+    out = []
+    while len(out) < n:
+        code = buf[pos]
+        run, pos = _get_varint(buf, pos + 1)
+        out.extend([code] * run)
+    return out, pos
+
+
+def encode_column(values):
+    """Pick the cheapest encoding for one chunk of a column: (kind, bytes)."""
+    present = [v for v in values if v is not None]
+    if all(v == 0 or v == 1 for v in present):
+        # 2 marks a failed read
+        return BITS, bytes(_runs(2 if v is None else int(v) for v in values))
+    out = _runs(0 if v is None else 1 for v in values)
+    if all(float(v).is_integer() and abs(v) < 2 ** 53 for v in present):
+        prev = 0
+        for v in present:
+            v = int(v)
+            _put_varint(out, _zz(v - prev))
+            prev = v
+        return INTS, bytes(out)
+    prev = 0
+    for v in present:
+        bits = _Q.unpack(_D.pack(float(v)))[0]
+        x = bits ^ prev
+        prev = bits
+        if not x:
+            out.append(0)
+            continue
+        raw = x.to_bytes(8, "big")
+        lead = len(raw) - len(raw.lstrip(b"\0"))
+        trail = len(raw) - len(raw.rstrip(b"\0"))
+        out.append((lead << 4) | (8 - lead - trail))
+        out += raw[lead:8 - trail]
+    return FLOATS, bytes(out)
+
+
+def decode_column(kind, buf, n):
+    """Inverse of encode_column; missing samples come back as None."""
+    if kind == BITS:
+        codes, _ = _unruns(buf, 0, n)
+        return [None if c == 2 else c for c in codes[:n]]
+    mask, pos = _unruns(buf, 0, n)
+    vals = []
+    prev = 0
+    for m in mask[:n]:
+        if not m:
+            vals.append(None)
+            continue
+        if kind == INTS:
+            d, pos = _get_varint(buf, pos)
+            prev += _unzz(d)
+            vals.append(prev)
+        else:
+            b = buf[pos]
+            pos += 1
+            if b:
+                lead, size = b >> 4, b & 0x0F
+                x = int.from_bytes(buf[pos:pos + size], "big") << (8 * (8 - lead - size))
+                pos += size
+                prev ^= x
+            vals.append(_D.unpack(_Q.pack(prev))[0])
+    return vals
+
+
+# ---- chunks ----
+
+def encode_chunk(ts, columns):
+    """ts: list of epoch seconds; columns: {tag: [value or None, ...]}."""
+    ts_ms = [int(round(t * 1000)) for t in ts]
+    times = encode_times(ts_ms)
+    body = bytearray(_U32.pack(len(times)) + times)
+    for tag, values in columns.items():
+        name = tag.encode()
+        kind, data = encode_column(values)
+        body += bytes([len(name)]) + name + bytes([kind]) + _U32.pack(len(data)) + data
+    header = HEADER.pack(MAGIC, len(body), ts_ms[0] / 1000, ts_ms[-1] / 1000, len(ts), len(columns))
+    return header + bytes(body)
+
+
+def iter_chunks(buf):
+    """Yield (offset, t_first, t_last, samples, columns) by hopping headers only."""
+    pos = 0
+    end = len(buf)
+    while pos + HEADER.size <= end:
+        magic, length, t0, t1, n, ncols = HEADER.unpack_from(buf, pos)
+        if magic != MAGIC or pos + HEADER.size + length > end:
+            break  # torn write at the tail (power loss); everything before it is good
+        yield pos, t0, t1, n, ncols
+        pos += HEADER.size + length
+
+
+def decode_chunk(buf, offset, tags=None):
+    """Decode one chunk; with `tags`, other columns are skipped unread."""
+    _, length, _, _, n, ncols = HEADER.unpack_from(buf, offset)
+    pos = offset + HEADER.size
+    tlen = _U32.unpack_from(buf, pos)[0]
+    pos += 4
+    ts = [t / 1000 for t in decode_times(buf[pos:pos + tlen], n)]
+    pos += tlen
+    cols = {}
+    for _ in range(ncols):
+        nlen = buf[pos]
+        name = bytes(buf[pos + 1:pos + 1 + nlen]).decode()
+        pos += 1 + nlen
+        kind = buf[pos]
+        dlen = _U32.unpack_from(buf, pos + 1)[0]
+        pos += 5
+        if tags is None or name in tags:
+            cols[name] = decode_column(kind, buf[pos:pos + dlen], n)
+        pos += dlen
+    return ts, cols
+
+
+# ---- store ----
+
+def _day(ts):
+    return datetime.date.fromtimestamp(ts).isoformat()
+
+
+class Historian:
+    """Poller listener that batches samples and appends one chunk at a time."""
+
+    def __init__(self, directory, chunk_samples=CHUNK_SAMPLES, flush_sec=FLUSH_SEC):
+        self.directory = directory
+        self.chunk_samples = chunk_samples
+        self.flush_sec = flush_sec
+        self._ts = []
+        self._rows = []
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()  # appends vs. compaction rewriting the same day file
+        self._wake = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, day):
+        return os.path.join(self.directory, day + ".pbh")
+
+    def put(self, frame):
+        if frame.values is None:
+            return
+        with self._lock:
+            if self._ts and _day(self._ts[-1]) != _day(frame.ts):
+                self._wake.set()  # day rollover: close out yesterday's file
+            self._ts.append(frame.ts)
+            self._rows.append(frame.values)
+            full = len(self._ts) >= self.chunk_samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="historian", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            ts, rows = self._ts, self._rows
+            self._ts, self._rows = [], []
+        # Split at day boundaries so a chunk lives in exactly one file
+        while ts:
+            day = _day(ts[0])
+            cut = next((i for i, t in enumerate(ts) if _day(t) != day), len(ts))
+            self._append(day, ts[:cut], rows[:cut])
+            ts, rows = ts[cut:], rows[cut:]
+
+    def _append(self, day, ts, rows):
+        tags = list(dict.fromkeys(tag for row in rows for tag in row))
+        columns = {tag: [row.get(tag) for row in rows] for tag in tags}
+        chunk = encode_chunk(ts, columns)
+        with self._file_lock, open(self.path(day), "ab") as f:
+            f.write(chunk)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_sec)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"historian: flush failed: {e}", file=sys.stderr)
+
+    def days(self, t_from, t_to):
+        """Days in range that have a file, oldest first (from=0 mustn't walk 50 years)."""
+        first = datetime.date.fromtimestamp(t_from).isoformat()
+        last = datetime.date.fromtimestamp(t_to).isoformat()
+        names = (name[:-4] for name in os.listdir(self.directory) if name.endswith(".pbh"))
+        return sorted(day for day in names if first <= day <= last)
+
+    def query(self, tags, t_from, t_to):
+        """{tag: (timestamps, values)} from disk. Failed reads come back as NaN
+        so the result feeds straight into history.minmax()/lttb()."""
+        out = {tag: ([], []) for tag in tags}
+        want = set(tags)
+        for day in self.days(t_from, t_to):
+            try:
+                f = open(self.path(day), "rb")
+            except FileNotFoundError:
+                continue
+            with f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    for offset, t0, t1, _, _ in iter_chunks(buf):
+                        if t1 < t_from or t0 > t_to:
+                            continue
+                        ts, cols = decode_chunk(buf, offset, want)
+                        for tag in tags:
+                            values = cols.get(tag)
+                            ot, ov = out[tag]
+                            for i, t in enumerate(ts):
+                                if t_from <= t <= t_to:
+                                    v = None if values is None else values[i]
+                                    ot.append(t)
+                                    ov.append(float("nan") if v is None else v)
+        return out
+
+    def compact(self, keep_days=KEEP_DAYS, chunk_samples=COMPACT_SAMPLES):
+        """Delete day files past retention and rewrite finished days with
+        fewer, larger chunks. Today's file is left alone (it is still growing);
+        yesterday's may still get its last buffered samples just after midnight,
+        so each rewrite holds the lock appends take."""
+        today = datetime.date.today()
+        removed = rewritten = 0
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".pbh"):
+                continue
+            try:
+                day = datetime.date.fromisoformat(name[:-4])
+            except ValueError:
+                continue
+            path = os.path.join(self.directory, name)
+            with self._file_lock:
+                if (today - day).days > keep_days:
+                    os.remove(path)
+                    removed += 1
+                elif day < today and self._compact_file(path, chunk_samples):
+                    rewritten += 1
+        return {"removed": removed, "rewritten": rewritten}
+
+    def _compact_file(self, path, chunk_samples):
+        with open(path, "rb") as f:
+            buf = f.read()
+        chunks = list(iter_chunks(buf))
+        if len(chunks) <= 1 or all(n >= chunk_samples for _, _, _, n, _ in chunks[:-1]):
+            return False
+        ts, rows = [], []
+        for offset, *_ in chunks:
+            cts, cols = decode_chunk(buf, offset)
+            ts.extend(cts)
+            rows.extend({tag: vals[i] for tag, vals in cols.items()} for i in range(len(cts)))
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            for i in range(0, len(ts), chunk_samples):
+                part = rows[i:i + chunk_samples]
+                tags = list(dict.fromkeys(tag for row in part for tag in row))
+                f.write(encode_chunk(ts[i:i + chunk_samples], {t: [r.get(t) for r in part] for t in tags}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return True
+
+    def start_compaction(self, keep_days=KEEP_DAYS, interval=86400.0):
+        """Run compact() once a day on a background thread."""
+        def loop():
+            while True:
+                try:
+                    self.compact(keep_days)
+                except OSError as e:
+                    print(f"historian: compaction failed: {e}", file=sys.stderr)
+                time.sleep(interval)
+        threading.Thread(target=loop, name="historian-compact", daemon=True).start()
+
+
+# ---- benchmark ----
+
+def bench(days=1.0, directory=None):
+    """Synthetic Booth 1 day at 1 s: bytes per sample and query latency."""
+    import math, random, shutil, tempfile
+
+    class _F:
+        def __init__(self, ts, values):
+            self.ts, self.values = ts, values
+
+    directory = directory or tempfile.mkdtemp(prefix="pbh-bench-")
+    h = Historian(directory)
+    n = int(days * 86400)
+    t0 = time.time() - n
+    bits = ["M[0].0", "M[40].0", "M[0].11", "M[1].4", "M[1].5", "M[40].4", "M[3].0", "M[1].0",
+            "M[0].15", "M[40].2", "M[0].9", "M[2].0", "R000.3", "M[0].5", "M[0].6"]
+    state = {b: 1 for b in bits}
+    started = time.perf_counter()
+    for i in range(n):
+        t = t0 + i + random.uniform(-0.02, 0.02)
+        if random.random() < 0.001:
+            b = random.choice(bits)
+            state[b] ^= 1
+        values = dict(state)
+        values.update({
+            "W16[2]": int(11000 + 4000 * math.sin(i / 600) + random.randint(-20, 20)),
+            "W16[1]": 14000, "W00[15]": 12000, "W00[13]": 14000,
+            "B1_Bake_Time_ACC": round((i / 60.0) % 60.0, 1), "B1_Bake_Time": 30.0,
+            "B1_Purge_Time": 1.0, "TMR[6].ACC": (i * 1000) % 300000, "TMR[6].PRE": 300000,
+        })
+        h.put(_F(t, values))
+    h.flush()
+    write_s = time.perf_counter() - started
+    size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+    tags = len(values)
+
+    def timed(span, q_tags):
+        s = time.perf_counter()
+        res = h.query(q_tags, t0 + n - span, t0 + n)
+        return round((time.perf_counter() - s) * 1000, 1), len(res[q_tags[0]][0])
+
+    report = {
+        "samples": n, "tags": tags, "bytes": size,
+        "bytes_per_sample": round(size / n, 2),
+        "bytes_per_value": round(size / (n * tags), 3),
+        "csv_bytes_per_sample": len("%.3f," % t + ",".join(str(v) for v in values.values())) + 1,
+        "write_us_per_sample": round(write_s / n * 1e6, 1),
+        "query_ms": {
+            "1 tag, 1 h": timed(3600, ["W16[2]"]),
+            "1 tag, 24 h": timed(86400, ["W16[2]"]),
+            "4 tags, 24 h": timed(86400, ["W16[2]", "W16[1]", "M[0].0", "B1_Bake_Time_ACC"]),
+        },
+    }
+    shutil.rmtree(directory, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    import json
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if cmd == "bench":
+        print(json.dumps(bench(), indent=2))
+    elif cmd == "compact":
+        directory = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DIR
+        keep = int(sys.argv[3]) if len(sys.argv) > 3 else KEEP_DAYS
+        print(Historian(directory).compact(keep))
+    else:
+        print(__doc__)
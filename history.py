@@ -0,0 +1,155 @@
+"""In-memory trend history for the polled tags.
+
+A fixed-size ring: one preallocated array of timestamps plus one float32
+array per tag, all sharing a write index. Memory is set at startup
+(about 24 h of 1 s samples for the Booth 1 tag set is under 10 MB) and the
+poll loop only overwrites slots. Queries downsample on the server so a
+full-day trend is a few hundred points on the wire.
+"""
+import bisect, math, threading
+from array import array
+
+NAN = float("nan")
+
+
+class _RingView:
+    """Sequence view of a ring array in time order, for bisect."""
+
+    def __init__(self, data, start, size):
+        self.data, self.start, self.size = data, start, size
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        return self.data[(self.start + i) % len(self.data)]
+
+
+class RingHistory:
+    def __init__(self, tags, capacity=86400):
+        self.tags = list(tags)
+        self.capacity = capacity
+        self._t = array("d", bytes(8 * capacity))
+        self._v = {tag: array("f", bytes(4 * capacity)) for tag in self.tags}
+        self._next = 0   # slot for the next sample
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def append(self, ts, values):
+        with self._lock:
+            i = self._next
+            self._t[i] = ts
+            for tag, col in self._v.items():
+                v = values.get(tag)
+                col[i] = NAN if v is None else v
+            self._next = (i + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def put(self, frame):
+        """Poller listener hook: record every successful poll."""
+        if frame.values is not None:
+            self.append(frame.ts, frame.values)
+
+    def _range(self, t_from, t_to):
+        # Called with the lock held; returns ring positions [lo, hi) in time order
+        start = (self._next - self._size) % self.capacity
+        view = _RingView(self._t, start, self._size)
+        return start, bisect.bisect_left(view, t_from), bisect.bisect_right(view, t_to)
+
+    def _copy(self, col, start, lo, hi):
+        a, b = (start + lo) % self.capacity, (start + hi) % self.capacity
+        if hi - lo <= 0:
+            return col[0:0]
+        if a < b:
+            return col[a:b]
+        return col[a:] + col[:b]
+
+    def query(self, tags, t_from, t_to, max_points=500, method="minmax"):
+        """{tag: (timestamps, values)} between t_from and t_to, at most
+        `max_points` per tag, downsampled with min/max buckets or LTTB.
+        Missing samples (failed reads) are skipped."""
+        ts, cols = self.raw(tags, t_from, t_to)
+        return {tag: downsample(ts, col, max_points, method) for tag, col in cols.items()}
+
+    def raw(self, tags, t_from, t_to):
+        """(timestamps, {tag: values}) copied out of the ring, not downsampled.
+        Tags that are not recorded here are left out."""
+        with self._lock:
+            start, lo, hi = self._range(t_from, t_to)
+            ts = self._copy(self._t, start, lo, hi)
+            cols = {tag: self._copy(self._v[tag], start, lo, hi) for tag in tags if tag in self._v}
+        return ts, cols
+
+    @property
+    def oldest(self):
+        """Timestamp of the oldest sample still in the ring (None when empty)."""
+        with self._lock:
+            if not self._size:
+                return None
+            return self._t[(self._next - self._size) % self.capacity]
+
+
+def downsample(ts, vs, max_points, method="minmax"):
+    """Reduce parallel timestamp/value sequences (NaN = missing) to at most
+    `max_points` points with min/max buckets or LTTB."""
+    if len(vs) > max_points and method != "lttb":
+        pt, pv = minmax(ts, vs, max_points)
+    else:
+        pts = [(t, v) for t, v in zip(ts, vs) if not math.isnan(v)]
+        if len(pts) > max_points:
+            pts = lttb(pts, max_points)
+        pt, pv = [p[0] for p in pts], [p[1] for p in pts]
+    # float32 storage: trim the noise digits before they go out as JSON
+    return [round(t, 3) for t in pt], [round(v, 3) for v in pv]
+
+
+def minmax(ts, vs, n):
+    """Keep the min and max of each of n/2 equal-count buckets, in time order.
+    Cheap (min/max/index run in C on array slices) and spikes such as a door
+    opening or a burner dropout are never lost."""
+    buckets = max(1, n // 2)
+    size = len(vs) / buckets
+    out_t, out_v = [], []
+    for b in range(buckets):
+        a, e = int(b * size), int((b + 1) * size)
+        chunk = vs[a:e]
+        if not chunk:
+            continue
+        total = sum(chunk)
+        if total != total:  # NaN present: drop failed reads from this bucket
+            keep = [i for i, v in enumerate(chunk) if not math.isnan(v)]
+            if not keep:
+                continue
+            i = min(keep, key=chunk.__getitem__)
+            j = max(keep, key=chunk.__getitem__)
+        else:
+            i = chunk.index(min(chunk))
+            j = chunk.index(max(chunk))
+        for k in sorted({i, j}):
+            out_t.append(ts[a + k])
+            out_v.append(chunk[k])
+    return out_t, out_v
+
+
+def lttb(points, n):
+    """Largest-Triangle-Three-Buckets: n points that keep the visual shape."""
+    if n >= len(points) or n < 3:
+        return list(points)
+    out = [points[0]]
+    size = (len(points) - 2) / (n - 2)
+    a = points[0]
+    for i in range(n - 2):
+        start = int(i * size) + 1
+        end = int((i + 1) * size) + 1
+        nxt = points[end:min(int((i + 2) * size) + 1, len(points))] or [points[-1]]
+        avg_t = sum(p[0] for p in nxt) / len(nxt)
+        avg_v = sum(p[1] for p in nxt) / len(nxt)
+        best, best_area = None, -1.0
+        for p in points[start:end]:
+            area = abs((a[0] - avg_t) * (p[1] - a[1]) - (a[0] - p[0]) * (avg_v - a[1]))
+            if area > best_area:
+                best, best_area = p, area
+        out.append(best)
+        a = best
+    out.append(points[-1])
+    return out
@@ -0,0 +1,309 @@
+"""Live interlock explainer: "why is this output off?"
+
+Rungs from the L5X are compiled into Python predicates. Each condition
+instruction (XIC, XIO, GRT, ...) becomes a leaf closure over the poll
+snapshot, and each output instruction (OTE, TON, MOV, ...) becomes a
+compiled boolean expression over the leaves on its path through the rung's
+branches. An Explainer starts at one tag, follows the rungs that drive it
+back through the tags those rungs test (the supply fan chain in
+supply_fan_analysis.md, for example), and republishes the values, leaf
+results and rung results as a Broadcaster. Only leaves whose input tags
+changed in the poll frame are re-evaluated, and only rungs whose leaves
+changed are re-run.
+
+The tags a tree needs beyond the dashboard's own are added to the poller's
+scan while somebody is subscribed to the tree, and dropped when the last
+viewer leaves.
+"""
+import operator, re
+from poller import Broadcaster
+from xref import ROLES, operand_tags, operands, parents
+
+MAX_DEPTH = 6    # rungs walked back from the root tag
+MAX_NODES = 80   # tags expanded in one tree
+
+COMPARES = {
+    "GRT": operator.gt, "LES": operator.lt, "GEQ": operator.ge,
+    "LEQ": operator.le, "EQU": operator.eq, "NEQ": operator.ne,
+}
+CONDITIONS = {"XIC", "XIO", "LIM"} | set(COMPARES)
+PASS_THROUGH = {"ONS", "OSR", "OSF", "NOP", "JSR"}  # neither a condition nor worth explaining
+
+_TOKEN = re.compile(r"\s*(?:([\[\],])|([A-Z][A-Z0-9_]*)\()")
+_NUMBER = re.compile(r"^-?\d+(\.\d*)?([eE][-+]?\d+)?$")
+
+TRUE = ("and", [])
+
+
+def _and(a, b):
+    items = (a[1] if a[0] == "and" else [a]) + (b[1] if b[0] == "and" else [b])
+    return ("and", items)
+
+
+def _or(branches):
+    if any(b == TRUE for b in branches):
+        return TRUE
+    return branches[0] if len(branches) == 1 else ("or", branches)
+
+
+def parse_rung(text):
+    """Rung text -> series: list of ("instr", mnemonic, operands) and
+    ("branch", [series, ...]) elements."""
+    pos, stack, series = 0, [], []
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m:
+            pos += 1  # ';' or stray whitespace
+            continue
+        if m.group(1) == "[":
+            stack.append((series, []))
+            series = []
+            pos = m.end()
+        elif m.group(1) == ",":
+            stack[-1][1].append(series)
+            series = []
+            pos = m.end()
+        elif m.group(1) == "]":
+            outer, branches = stack.pop()
+            branches.append(series)
+            outer.append(("branch", branches))
+            series = outer
+            pos = m.end()
+        else:
+            args, pos = operands(text, m.end())
+            series.append(("instr", m.group(2), args))
+    return series
+
+
+def _value(operand):
+    """Leaf operand -> callable(values); numeric literals are constants."""
+    if _NUMBER.match(operand):
+        number = float(operand)
+        return lambda v: number
+    return lambda v: v.get(operand)
+
+
+def compile_leaf(mnemonic, args):
+    """A condition instruction as a predicate over {tag: value}. A missing
+    value never satisfies it, so an unread tag shows as the blocking one."""
+    if mnemonic == "XIC":
+        tag = args[0]
+        return lambda v: v.get(tag) == 1
+    if mnemonic == "XIO":
+        tag = args[0]
+        return lambda v: v.get(tag) == 0
+    if mnemonic == "LIM":
+        low, test, high = (_value(a) for a in args)
+
+        def lim(v):
+            lo, x, hi = low(v), test(v), high(v)
+            if None in (lo, x, hi):
+                return False
+            return lo <= x <= hi if lo <= hi else (x >= lo or x <= hi)
+        return lim
+    op, a, b = COMPARES[mnemonic], _value(args[0]), _value(args[1])
+
+    def compare(v):
+        x, y = a(v), b(v)
+        return x is not None and y is not None and op(x, y)
+    return compare
+
+
+class CompiledRung:
+    """Leaves and output predicates for one rung. Leaf and output ids are
+    global to the Explainer, so the rung is told where to start numbering."""
+
+    def __init__(self, key, text, leaf_base, output_base):
+        self.key = key
+        self.text = text
+        self.leaves = []    # [(id, mnemonic, operands, tags, predicate)]
+        self.outputs = []   # [(id, mnemonic, operands, cond, leaf ids, compiled expr)]
+        self._leaf_base, self._output_base = leaf_base, output_base
+        self._walk(parse_rung(text), TRUE, TRUE)
+
+    def _walk(self, series, prefix, local):
+        for element in series:
+            if element[0] == "branch":
+                outs = [self._walk(b, _and(prefix, local), TRUE) for b in element[1]]
+                local = _and(local, _or(outs))
+                continue
+            _, mnemonic, args = element
+            if mnemonic in CONDITIONS:
+                n = self._leaf_base + len(self.leaves)
+                tags = [t for a in args for t in operand_tags(a)]
+                self.leaves.append((n, mnemonic, args, tags, compile_leaf(mnemonic, args)))
+                local = _and(local, ("leaf", n))
+            elif mnemonic not in PASS_THROUGH:
+                cond = _and(prefix, local)
+                n = self._output_base + len(self.outputs)
+                src = _source(cond)
+                code = compile(src, f"<rung {self.key}>", "eval")
+                self.outputs.append((n, mnemonic, args, cond, _leaf_ids(cond), code))
+        return local
+
+
+def _source(cond):
+    if cond[0] == "leaf":
+        return f"L[{cond[1]}]"
+    if not cond[1]:
+        return "True" if cond[0] == "and" else "False"
+    return "(" + f" {cond[0]} ".join(_source(c) for c in cond[1]) + ")"
+
+
+def _leaf_ids(cond):
+    if cond[0] == "leaf":
+        return [cond[1]]
+    return [n for c in cond[1] for n in _leaf_ids(c)]
+
+
+def _cond_json(cond):
+    if cond[0] == "leaf":
+        return {"leaf": cond[1]}
+    return {"op": cond[0], "items": [_cond_json(c) for c in cond[1]]}
+
+
+def _drives(mnemonic, args, tag):
+    """Whether an output instruction writes `tag`: the tag itself, or the word
+    or structure holding it (MOV into M[100] writes M[100].3; TON(TMR[5])
+    sets TMR[5].DN)."""
+    roles = ROLES.get(mnemonic, ())
+    related = [tag] + parents(tag)
+    return any(t in related for i, a in enumerate(args)
+               if i < len(roles) and roles[i] == "write" for t in operand_tags(a))
+
+
+class Explainer(Broadcaster):
+    """Dependency tree for one root tag, evaluated live against `poller`.
+
+    Frame values are flat: "v:<tag>" (polled value), "l:<leaf>" and
+    "o:<output>" (0/1). The tree itself is static and comes from tree()."""
+
+    def __init__(self, root, xref, poller, queue_size=4):
+        self.root = xref.canonical(root) or root
+        self.xref = xref
+        self.poller = poller
+        self.nodes = {}    # tag -> {"tag", "description", "outputs": [ids]}
+        self.rungs = {}    # rung index -> CompiledRung
+        self.leaves = {}   # id -> (mnemonic, operands, tags, predicate, rung key)
+        self.outputs = {}  # id -> (mnemonic, operands, cond, leaf ids, code, rung key)
+        self._build()
+        self.read_tags = list(dict.fromkeys(
+            [t for t in self.nodes] + [t for leaf in self.leaves.values() for t in leaf[2]]))
+        self._leaves_by_tag = {}
+        for n, leaf in self.leaves.items():
+            for t in leaf[2]:
+                self._leaves_by_tag.setdefault(t, []).append(n)
+        self._outputs_by_leaf = {}
+        for n, out in self.outputs.items():
+            for leaf in out[3]:
+                self._outputs_by_leaf.setdefault(leaf, []).append(n)
+        super().__init__(["v:" + t for t in self.read_tags], queue_size)
+        self.full_interval = poller.full_interval
+        self._L = {}         # leaf id -> bool
+        self._state = None   # flat frame values
+        self._watching = False
+        self.evaluations = 0  # leaf + output predicate calls, for /health
+
+    def _compile(self, n):
+        rung = self.rungs.get(n)
+        if rung is None:
+            routine, number, text = self.xref.rungs[n]
+            rung = CompiledRung(f"{routine}/{number}", text, len(self.leaves), len(self.outputs))
+            self.rungs[n] = rung
+            for leaf_id, mnemonic, args, tags, pred in rung.leaves:
+                self.leaves[leaf_id] = (mnemonic, args, tags, pred, rung.key)
+            for out_id, mnemonic, args, cond, leaf_ids, code in rung.outputs:
+                self.outputs[out_id] = (mnemonic, args, cond, leaf_ids, code, rung.key)
+        return rung
+
+    def _build(self):
+        queue, depth = [self.root], {self.root: 0}
+        rung_index = {f"{r}/{num}": i for i, (r, num, _) in enumerate(self.xref.rungs)}
+        while queue and len(self.nodes) < MAX_NODES:
+            tag = queue.pop(0)
+            answer = self.xref.lookup(tag)
+            node = self.nodes[tag] = {
+                "tag": tag,
+                "description": self.xref.comments.get(tag) if answer is None else answer["description"],
+                "outputs": [],
+            }
+            if answer is None:
+                continue
+            for ref in answer["drivers"]:
+                if ref["operand"] not in [tag] + parents(tag):
+                    continue  # writes a bit of this word, not the word itself
+                rung = self._compile(rung_index[f"{ref['routine']}/{ref['rung']}"])
+                for out_id, mnemonic, args, cond, leaf_ids, code in rung.outputs:
+                    if out_id in node["outputs"] or not _drives(mnemonic, args, tag):
+                        continue
+                    node["outputs"].append(out_id)
+                    if depth[tag] + 1 > MAX_DEPTH:
+                        continue
+                    for leaf in leaf_ids:
+                        for t in self.leaves[leaf][2]:
+                            if t not in depth:
+                                depth[t] = depth[tag] + 1
+                                queue.append(t)
+
+    def tree(self):
+        """Static structure for the page: nodes, rung outputs (with their
+        branch/leaf condition) and leaves."""
+        return {
+            "root": self.root,
+            "nodes": self.nodes,
+            "outputs": {
+                n: {"rung": key, "instruction": m, "operands": args, "cond": _cond_json(cond)}
+                for n, (m, args, cond, _, _, key) in self.outputs.items()
+            },
+            "leaves": {
+                n: {"rung": key, "instruction": m, "operands": args, "tags": tags,
+                    "expand": [t for t in tags if t in self.nodes and self.nodes[t]["outputs"]]}
+                for n, (m, args, tags, _, key) in self.leaves.items()
+            },
+            "text": {r.key: r.text for r in self.rungs.values()},
+        }
+
+    def _start(self):
+        # First viewer: add our tags to the poller's scan and start listening
+        if not self._watching:
+            self.poller.watch(self.read_tags)  # may refuse: over the poller's watch cap
+            self._watching = True
+            self._state, self._L = None, {}
+            self.poller.attach(self, prime=False)
+
+    def _stop(self):
+        if self._watching:
+            self._watching = False
+            self.poller.unsubscribe(self)
+            self.poller.unwatch(self.read_tags)
+
+    def put(self, frame):
+        # Called from the poll thread, once per scan
+        if frame.values is None:
+            self._publish(error=frame.error, status=frame.status)
+            return
+        values = frame.values
+        if self._state is None or frame.changed is None:
+            # First frame for this viewing session: evaluate everything
+            self._state, self._L = {}, {}
+            changed = self.read_tags
+            dirty = set(self.leaves)
+        else:
+            changed = [t for t in frame.changed if t in self._leaves_by_tag or t in self.nodes]
+            dirty = {n for t in changed for n in self._leaves_by_tag.get(t, ())}
+        state = dict(self._state)
+        for t in changed:
+            state["v:" + t] = values.get(t)
+        rerun = set() if self._L else set(self.outputs)
+        for n in dirty:
+            ok = bool(self.leaves[n][3](values))
+            self.evaluations += 1
+            if self._L.get(n) != ok:
+                self._L[n] = ok
+                state[f"l:{n}"] = int(ok)
+                rerun.update(self._outputs_by_leaf.get(n, ()))
+        for n in rerun:
+            state[f"o:{n}"] = int(bool(eval(self.outputs[n][4], {}, {"L": self._L})))
+            self.evaluations += 1
+        self._state = state
+        self._publish(values=state)
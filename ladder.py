@@ -0,0 +1,627 @@
+"""Ladder-logic emulator: the L5X program scanned like a controller.
+
+    python3 ladder.py [port] [scan_ms] [faults]   # serve on EtherNet/IP (requires cpppo)
+    python3 ladder.py tags PORT FAULTS NAME=TYPE ...   # a bare tag table instead of the program
+    python3 ladder.py bench
+
+Tags and their exported values are loaded from the L5X (arrays, TIMER and PID
+members, BOOL scalars), and every routine is compiled to one Python function:
+rung-condition-in/out is a local, XIC/XIO/compares AND into it, branches OR
+their legs, and outputs act on it (OTE/OTL/OTU, ONS, TON/TOF/RTO, MOV, CPT,
+math, COP, PID, JSR). A scan thread runs MainRoutine every SCAN_MS with the
+elapsed milliseconds fed to the timers, then steps a small process model (each
+burner valve output heats its temperature input), so the dashboard sees the
+program's own sequencing instead of a sine wave.
+
+Module I/O (Local:N:I/O) has no tag in the export; inputs are seeded so the
+first scan reproduces the exported R000/R002/R00x image and can be written
+over EtherNet/IP like any other tag.
+
+Served through cpppo: structure members are exposed as one tag per member
+("TMR.ACC" = DINT[50]) and TMR[6].ACC requests are re-pathed onto them;
+bit writes (pylogix sends Read-Modify-Write, which cpppo lacks) are handled
+here too.
+
+Faults can be injected into the server for resilience tests, from a spec
+such as "latency=40,jitter=20,drop=0.01,error=W16+TMR.ACC,stuck=M":
+latency/jitter (ms) delay every request, drop is the chance a request
+closes the connection instead of being answered, error tags answer with
+"path destination unknown", and stuck tags keep serving the value they had
+at startup whatever the program or a client writes.
+"""
+import math, random, re, sys, threading, time
+import xml.etree.ElementTree as ET
+from interlock import COMPARES, parse_rung
+from xref import DEFAULT_L5X
+
+SCAN_MS = 10        # continuous task period; Logix scans this program in 10-20 ms
+ENTRY = "MainRoutine"
+
+TIMER_MEMBERS = ("PRE", "ACC", "EN", "TT", "DN")
+CIP_TYPES = {"BOOL", "SINT", "INT", "DINT", "REAL"}
+CPT_WORDS = {"MOD": "%", "AND": "&", "OR": "|", "XOR": "^", "NOT": "~",
+             "ABS": "abs", "SQR": "math.sqrt", "TRN": "math.trunc"}
+
+# Process model: burner valve output (0-10000) -> temperature input (raw
+# 0-10000, scaled by the program to degrees x100 as raw * 2.35 - 6000)
+ZONES = [("Local:6:O.Ch0Data", "Local:5:I.Ch2Data"), ("Local:6:O.Ch1Data", "Local:5:I.Ch3Data")]
+AMBIENT = 6000      # degrees x100 with the burner off
+HEAT_GAIN = 2.5     # degrees x100 per valve count above VALVE_MIN, at steady state
+VALVE_MIN = 2300
+TIME_CONSTANT = 120.0  # seconds
+
+_OPERAND = re.compile(r"^([A-Za-z_][\w:]*)(?:\[(\d+)\])?((?:\.[A-Za-z_]\w*)*)(?:\.(\d+))?$")
+_NUMBER = re.compile(r"^-?\d+(\.\d*)?([eE][-+]?\d+)?$")
+_CPT_TOKEN = re.compile(r"[A-Za-z_][\w:]*(?:\[\d+\])?(?:\.\w+)*")
+_INT_TYPES = {"SINT": 8, "INT": 16, "DINT": 32, "BOOL": 1}
+
+
+def _number(data_type, text):
+    return float(text) if data_type == "REAL" else int(text)
+
+
+def load_tags(path=DEFAULT_L5X):
+    """({key: [values]}, {key: DataType}) from the Decorated tag data. Every
+    tag is a list (scalars have one element); structure members get their own
+    key, so TMR[6].ACC lives at columns["TMR.ACC"][6]."""
+    columns, types = {}, {}
+
+    def member(key, m, i, n):
+        if key not in columns:
+            columns[key] = [0] * n
+            types[key] = m.get("DataType")
+        columns[key][i] = _number(types[key], m.get("Value"))
+
+    for tag in ET.parse(path).getroot().iter("Tag"):
+        name = tag.get("Name")
+        data = tag.find("Data[@Format='Decorated']")
+        if data is None or not len(data):
+            continue
+        node = data[0]
+        if node.tag == "DataValue":
+            columns[name], types[name] = [_number(node.get("DataType"), node.get("Value"))], node.get("DataType")
+        elif node.tag == "Structure":
+            for m in node.iterfind("DataValueMember"):
+                member(f"{name}.{m.get('Name')}", m, 0, 1)
+        elif node.tag == "Array":
+            elements = node.findall("Element")
+            for i, e in enumerate(elements):
+                if e.get("Value") is not None:
+                    member(name, {"DataType": node.get("DataType"), "Value": e.get("Value")}, i, len(elements))
+                    continue
+                for m in e.iterfind("Structure/DataValueMember"):
+                    member(f"{name}.{m.get('Name')}", m, i, len(elements))
+    return columns, types
+
+
+def _wrap(bits):
+    if bits == 1:
+        return lambda v: 1 if v else 0
+    half = 1 << (bits - 1)
+    return lambda v: ((int(round(v)) + half) & ((half << 1) - 1)) - half
+
+
+def _ton(rc, i, pre, acc, en, tt, dn, dt):
+    if rc:
+        en[i] = 1
+        if not dn[i]:
+            a = acc[i] + dt
+            if a >= pre[i]:
+                acc[i], tt[i], dn[i] = pre[i], 0, 1
+            else:
+                acc[i], tt[i] = a, 1
+    else:
+        en[i] = tt[i] = dn[i] = acc[i] = 0
+
+
+def _tof(rc, i, pre, acc, en, tt, dn, dt):
+    if rc:
+        en[i], tt[i], dn[i], acc[i] = 1, 0, 1, 0
+    else:
+        en[i] = 0
+        if dn[i]:
+            a = acc[i] + dt
+            if a >= pre[i]:
+                acc[i], tt[i], dn[i] = pre[i], 0, 0
+            else:
+                acc[i], tt[i] = a, 1
+
+
+def _rto(rc, i, pre, acc, en, tt, dn, dt):
+    if rc:
+        _ton(rc, i, pre, acc, en, tt, dn, dt)
+    else:
+        en[i] = tt[i] = 0
+
+
+class PIDBlock:
+    """Velocity-form PID on a PID tag's members: independent gains, error in
+    percent of the MINS..MAXS span, one update of UPD seconds per execution
+    (the program gates it with a loop-update timer), OUT clamped to
+    MINO..MAXO and scaled to MINCV..MAXCV for the CV operand. Enough to close
+    the loop against the process model, not a full PIDE."""
+
+    def __init__(self, columns, name):
+        self.m = {k[len(name) + 1:]: v for k, v in columns.items() if k.startswith(name + ".")}
+        self.last_error = None
+
+    def step(self, pv):
+        m = self.m
+        g = lambda k: m[k][0] if k in m else 0.0
+        span = (g("MAXS") - g("MINS")) or 100.0
+        error = (pv - g("SP")) if g("CA") else (g("SP") - pv)
+        e = error / span * 100.0
+        out = g("OUT") + g("KI") / 60.0 * e * (g("UPD") or 1.0)
+        if self.last_error is not None:
+            out += g("KP") * (e - self.last_error)
+        self.last_error = e
+        out = min(max(out, g("MINO")), g("MAXO") or 100.0)
+        for k, v in (("PV", float(pv)), ("ERR", float(error)), ("OUT", out)):
+            if k in m:
+                m[k][0] = v
+        return g("MINCV") + out / 100.0 * (g("MAXCV") - g("MINCV"))
+
+
+class _Ref:
+    """One operand: storage key, element, optional bit."""
+
+    def __init__(self, program, operand):
+        m = _OPERAND.match(operand.replace(" ", ""))
+        if not m:
+            raise ValueError(f"unsupported operand {operand!r}")
+        base, index, members, bit = m.groups()
+        self.base, self.index = base + (f"[{index}]" if index else ""), int(index or 0)
+        self.key = base + members
+        self.bit = None if bit is None else int(bit)
+        if self.key not in program.columns and not any(
+                k.startswith(self.key + ".") for k in program.columns):
+            program.add_column(self.key)
+        self.name = program.pyname(self.key)
+        self.type = program.types.get(self.key)
+
+    def read(self):
+        word = f"{self.name}[{self.index}]"
+        return word if self.bit is None else f"({word} >> {self.bit} & 1)"
+
+    def set_bit(self, cond):
+        """Statement writing `cond` (a Python expression) to this bit/BOOL."""
+        word = f"{self.name}[{self.index}]"
+        if self.bit is None:
+            return f"{word} = 1 if {cond} else 0"
+        bits = _INT_TYPES.get(self.type, 32)
+        mask = -(1 << self.bit) if self.bit == bits - 1 else 1 << self.bit
+        return f"{word} = {word} | {mask} if {cond} else {word} & {~mask}"
+
+    def write(self, value):
+        """Statement storing a number, converted to the destination type."""
+        if self.bit is not None:
+            return self.set_bit(value)
+        conv = "float" if self.type == "REAL" else f"_i{_INT_TYPES.get(self.type, 32)}"
+        return f"{self.name}[{self.index}] = {conv}({value})"
+
+
+class Program:
+    """The compiled program and its tag memory. scan(dt_ms) runs one scan of
+    ENTRY; callers serialise access to the columns through `lock`."""
+
+    def __init__(self, l5x=DEFAULT_L5X):
+        self.columns, self.types = load_tags(l5x)
+        self.lock = threading.RLock()
+        self.unsupported = {}  # mnemonic -> count
+        self.namespace = {"_i1": _wrap(1), "_i8": _wrap(8), "_i16": _wrap(16), "_i32": _wrap(32),
+                          "_ton": _ton, "_tof": _tof, "_rto": _rto, "math": math}
+        self._pynames = {}
+        self.routines = {}
+        root = ET.parse(l5x).getroot()
+        for routine in root.iter("Routine"):
+            rungs = [" ".join((r.findtext("Text") or "").split())
+                     for r in routine.iterfind("RLLContent/Rung")]
+            self.routines[routine.get("Name")] = rungs
+        t0 = time.perf_counter()
+        self.source = "\n".join(self._routine(name, rungs) for name, rungs in self.routines.items())
+        exec(compile(self.source, "<ladder>", "exec"), self.namespace)
+        self.compile_ms = (time.perf_counter() - t0) * 1000
+        self._entry = self.namespace["r_" + ENTRY]
+        self._seed_inputs()
+
+    def add_column(self, key):
+        # Module I/O: Data words are DINT, analog channels REAL
+        self.columns[key] = [0 if key.endswith(".Data") else 0.0]
+        self.types[key] = "DINT" if key.endswith(".Data") else "REAL"
+
+    def pyname(self, key):
+        name = self._pynames.get(key)
+        if name is None:
+            name = self._pynames[key] = "t_" + re.sub(r"\W", "_", key)
+            self.namespace[name] = self.columns[key]
+        return name
+
+    def value(self, operand):
+        """Current value of one operand, e.g. "M[0].3" or "TMR[6].ACC"."""
+        ref = _Ref(self, operand)
+        word = self.columns[ref.key][ref.index]
+        return word if ref.bit is None else word >> ref.bit & 1
+
+    def scan(self, dt):
+        self._entry(dt)
+
+    # -- code generation ------------------------------------------------
+
+    def _routine(self, name, rungs):
+        lines = [f"def r_{name}(dt):"]
+        for n, text in enumerate(rungs):
+            lines.append(f"    # {name}/{n}: {text[:100]}")
+            lines.append("    rc = True")
+            self._vars = 0
+            self._series(parse_rung(text), "rc", lines)
+        lines.append("    return")
+        return "\n".join(lines) + "\n"
+
+    def _series(self, series, rc, out):
+        for element in series:
+            if element[0] == "branch":
+                self._vars += 1
+                start = f"b{self._vars}"
+                out.append(f"    {start} = {rc}")
+                legs = []
+                for leg in element[1]:
+                    self._vars += 1
+                    v = f"b{self._vars}"
+                    out.append(f"    {v} = {start}")
+                    self._series(leg, v, out)
+                    legs.append(v)
+                out.append(f"    {rc} = {' or '.join(legs)}")
+                continue
+            _, mnemonic, args = element
+            try:
+                out.extend("    " + line for line in self._instruction(mnemonic, args, rc))
+            except (KeyError, ValueError, IndexError):
+                self.unsupported[mnemonic] = self.unsupported.get(mnemonic, 0) + 1
+
+    def _operand(self, text):
+        if _NUMBER.match(text):
+            return text
+        return _Ref(self, text).read()
+
+    def _cpt(self, expr):
+        def token(m):
+            word = m.group(0)
+            if word.upper() in CPT_WORDS:
+                return f" {CPT_WORDS[word.upper()]} "
+            return _Ref(self, word).read()
+        return _CPT_TOKEN.sub(token, expr)
+
+    def _timer(self, operand):
+        ref = _OPERAND.match(operand)
+        base, index = ref.group(1), int(ref.group(2) or 0)
+        names = [self.pyname(f"{base}.{m}") for m in TIMER_MEMBERS]
+        return f"{index}, {', '.join(names)}"
+
+    def _instruction(self, m, args, rc):
+        if m == "XIC":
+            return [f"{rc} = {rc} and {_Ref(self, args[0]).read()}"]
+        if m == "XIO":
+            return [f"{rc} = {rc} and not {_Ref(self, args[0]).read()}"]
+        if m in COMPARES:
+            op = {"GRT": ">", "LES": "<", "GEQ": ">=", "LEQ": "<=", "EQU": "==", "NEQ": "!="}[m]
+            return [f"{rc} = {rc} and {self._operand(args[0])} {op} {self._operand(args[1])}"]
+        if m == "LIM":
+            lo, x, hi = (self._operand(a) for a in args)
+            return [f"{rc} = {rc} and (({lo} <= {x} <= {hi}) if {lo} <= {hi} else ({x} >= {lo} or {x} <= {hi}))"]
+        if m == "OTE":
+            return [_Ref(self, args[0]).set_bit(rc)]
+        if m in ("OTL", "OTU"):
+            return [f"if {rc}: " + _Ref(self, args[0]).set_bit("1" if m == "OTL" else "0")]
+        if m == "ONS":
+            s = _Ref(self, args[0])
+            return [f"if {rc}:",
+                    f"    if {s.read()}: {rc} = False",
+                    f"    else: {s.set_bit('1')}",
+                    f"else: {s.set_bit('0')}"]
+        if m in ("TON", "TOF", "RTO"):
+            return [f"_{m.lower()}({rc}, {self._timer(args[0])}, dt)"]
+        if m == "RES":
+            i, *names = self._timer(args[0]).split(", ")
+            return [f"if {rc}: " + "; ".join(f"{n}[{i}] = 0" for n in names[1:])]
+        if m == "JSR":
+            return [f"if {rc}: r_{args[0]}(dt)"]
+        if m == "NOP":
+            return []
+        if m == "MOV":
+            return [f"if {rc}: " + _Ref(self, args[1]).write(self._operand(args[0]))]
+        if m == "CPT":
+            return [f"if {rc}: " + _Ref(self, args[0]).write(self._cpt(args[1]))]
+        if m in ("ADD", "SUB", "MUL", "MOD"):
+            op = {"ADD": "+", "SUB": "-", "MUL": "*", "MOD": "%"}[m]
+            a, b, dst = self._operand(args[0]), self._operand(args[1]), _Ref(self, args[2])
+            if m == "MOD":
+                return [f"if {rc} and {b}: " + dst.write(f"math.fmod({a}, {b})")]
+            return [f"if {rc}: " + dst.write(f"{a} {op} {b}")]
+        if m == "DIV":
+            a, b, dst = self._operand(args[0]), self._operand(args[1]), _Ref(self, args[2])
+            # All-integer DIV truncates; any REAL operand rounds into an integer
+            # destination. A zero divisor leaves the destination alone.
+            ints = dst.type != "REAL" and all(
+                _NUMBER.match(x) and "." not in x or _Ref(self, x).type in _INT_TYPES for x in args[:2])
+            expr = f"math.trunc({a} / {b})" if ints else f"{a} / {b}"
+            return [f"if {rc} and {b}: " + dst.write(expr)]
+        if m in ("ABS", "NEG"):
+            return [f"if {rc}: " + _Ref(self, args[1]).write(
+                f"{'abs' if m == 'ABS' else '-'}({self._operand(args[0])})")]
+        if m == "COP":
+            src, dst, n = _Ref(self, args[0]), _Ref(self, args[1]), int(args[2])
+            n = min(n, len(self.columns[dst.key]) - dst.index, len(self.columns[src.key]) - src.index)
+            return [f"if {rc}: {dst.name}[{dst.index}:{dst.index + n}] = {src.name}[{src.index}:{src.index + n}]"]
+        if m == "PID":
+            block = args[0]
+            name = "p_" + re.sub(r"\W", "_", block)
+            if name not in self.namespace:
+                self.namespace[name] = PIDBlock(self.columns, block)
+            return [f"if {rc}: " + _Ref(self, args[3]).write(f"{name}.step({self._operand(args[1])})")]
+        raise KeyError(m)
+
+    def _seed_inputs(self):
+        """Module inputs start at the values that reproduce the exported image:
+        XIC(Local:1:I.Data.0)OTE(R000.0) copies the bit back, MOV(Local:5:I.
+        Ch2Data,R006_Raw) the value."""
+        for text in self.routines.values():
+            for rung in text:
+                series = parse_rung(rung)
+                if len(series) == 2 and [e[1] for e in series] == ["XIC", "OTE"] and ":I." in series[0][2][0]:
+                    src, dst = _Ref(self, series[0][2][0]), series[1][2][0]
+                    exec(src.set_bit(str(self.value(dst))), self.namespace)
+                for e in series:
+                    if e[0] == "instr" and e[1] == "MOV" and ":I." in e[2][0]:
+                        src = _Ref(self, e[2][0])
+                        self.columns[src.key][src.index] = self.value(e[2][1])
+
+
+class Process:
+    """First-order thermal lag per zone, stepped after every scan."""
+
+    def __init__(self, program):
+        self.zones = []
+        for valve, temp in ZONES:
+            if valve in program.columns and temp in program.columns:
+                self.zones.append((program.columns[valve], program.columns[temp]))
+
+    def step(self, dt):
+        k = 1.0 - math.exp(-dt / 1000.0 / TIME_CONSTANT)
+        for valve, temp in self.zones:
+            target = AMBIENT + max(0.0, valve[0] - VALVE_MIN) * HEAT_GAIN if valve[0] > 0 else AMBIENT
+            t = temp[0] * 2.35 - 6000
+            temp[0] = (t + (target - t) * k + 6000) / 2.35
+
+
+class Emulator:
+    """Scan thread: one scan of the program plus one process step every
+    `scan_ms`, under the program lock so EtherNet/IP requests see whole
+    scans."""
+
+    def __init__(self, program, scan_ms=SCAN_MS):
+        self.program = program
+        self.process = Process(program)
+        self.scan_ms = scan_ms
+        self.scans = 0
+        self.overruns = 0      # scans that took longer than the period
+        self.last_ms = None    # execution time of the last scan
+        self.max_ms = 0.0
+        self.mean_ms = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ladder-scan", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        period = self.scan_ms / 1000.0
+        last = next_at = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            dt = int(round((now - last) * 1000))
+            last = now
+            t0 = time.perf_counter()
+            with self.program.lock:
+                self.program.scan(dt)
+                self.process.step(dt)
+            ms = (time.perf_counter() - t0) * 1000
+            self.scans += 1
+            self.last_ms, self.max_ms = ms, max(self.max_ms, ms)
+            self.mean_ms = ms if self.mean_ms is None else self.mean_ms * 0.99 + ms * 0.01
+            next_at += period
+            wait = next_at - time.monotonic()
+            if wait < 0:
+                self.overruns += 1
+                next_at = time.monotonic()  # late: start the next scan now, don't burst to catch up
+            else:
+                self._stop.wait(wait)
+
+    def report(self):
+        return {
+            "scans": self.scans,
+            "scan_ms": self.scan_ms,
+            "last_ms": self.last_ms and round(self.last_ms, 3),
+            "mean_ms": self.mean_ms and round(self.mean_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "overruns": self.overruns,
+        }
+
+
+class Faults:
+    def __init__(self, latency=0.0, jitter=0.0, drop=0.0, errors=(), stuck=()):
+        self.latency = latency   # seconds
+        self.jitter = jitter
+        self.drop = drop
+        self.errors = set(errors)
+        self.stuck = set(stuck)
+        self.dropped = 0
+
+    @classmethod
+    def parse(cls, spec):
+        opts = dict(item.split("=", 1) for item in (spec or "").split(",") if "=" in item)
+        tags = lambda k: [t for t in opts.get(k, "").split("+") if t]
+        return cls(float(opts.get("latency", 0)) / 1000, float(opts.get("jitter", 0)) / 1000,
+                   float(opts.get("drop", 0)), tags("error"), tags("stuck"))
+
+    def __bool__(self):
+        return bool(self.latency or self.jitter or self.drop or self.errors or self.stuck)
+
+    def before_request(self):
+        """Delay one top-level request; raising here makes cpppo drop the connection."""
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if self.drop and random.random() < self.drop:
+            self.dropped += 1
+            raise ConnectionAbortedError("fault injection: connection dropped")
+
+
+class TagTable:
+    """Bare tag memory with the Program interface serve() needs, from cpppo
+    style "NAME=TYPE[n]" definitions (run_demo.py's simulated tag set)."""
+
+    def __init__(self, defs):
+        self.columns, self.types = {}, {}
+        for d in defs:
+            name, _, kind = d.partition("=")
+            kind, _, n = kind.rstrip("]").partition("[")
+            self.types[name] = kind
+            self.columns[name] = [0.0 if kind == "REAL" else 0] * int(n or 1)
+        self.lock = threading.RLock()
+
+
+def serve(program, port=44818, address="0.0.0.0", faults=None):
+    """Serve the program's tags on EtherNet/IP with cpppo; blocks."""
+    from cpppo.server.enip import device, logix, parser
+    from cpppo.server.enip.main import main as enip_main
+
+    lock = program.lock
+    faults = faults or Faults()
+    frozen = {key: list(program.columns[key]) for key in faults.stuck if key in program.columns}
+    nested = threading.local()  # Multiple Service Packet sub-requests re-enter request()
+
+    class Column(device.Attribute):
+        # The cpppo tag's storage is the program's own list for that key
+        def __init__(self, name, type_cls, default=0, error=0x00, mask=0):
+            super().__init__(name, type_cls, default=program.columns[name], error=error, mask=mask)
+            self.frozen = frozen.get(name)
+
+        def __getitem__(self, key):
+            if self.frozen is not None:
+                return self.frozen[key]
+            with lock:
+                return super().__getitem__(key)
+
+        def __setitem__(self, key, value):
+            with lock:
+                super().__setitem__(key, value)
+
+    class EmulatedLogix(logix.Logix):
+        RMW_REQ = 0x4E
+        RMW_RPY = RMW_REQ | 0x80
+
+        def request(self, data, addr=None):
+            if faults and not getattr(nested, "depth", 0):
+                faults.before_request()
+            segments = data.get("path", {}).get("segment") if "path" in data else None
+            if segments and any("symbolic" in s for s in segments[1:]):
+                # TMR[6].ACC -> TMR.ACC[6]: cpppo joins symbolic segments into
+                # one tag name, but stops resolving at an element
+                data.path["segment"] = segments = ([s for s in segments if "symbolic" in s]
+                                                   + [s for s in segments if "symbolic" not in s])
+            if faults.errors and segments:
+                if ".".join(s["symbolic"] for s in segments if "symbolic" in s) in faults.errors:
+                    data.path["segment"] = [{"symbolic": "__fault__"}]  # answered as unknown tag
+            if data.get("service") == self.RMW_REQ:
+                return self._read_modify_write(data)
+            nested.depth = getattr(nested, "depth", 0) + 1
+            try:
+                return super().request(data, addr=addr)
+            finally:
+                nested.depth -= 1
+
+        def _read_modify_write(self, data):
+            data.service |= 0x80
+            data.status = 0x05  # path destination unknown
+            try:
+                attribute = device.lookup(*device.resolve(data.path, attribute=1))
+                i = device.resolve_element(data.path)[0]
+                n = data.read_modify_write.size
+                masks = bytes(data.read_modify_write.input)
+                or_mask = int.from_bytes(masks[:n], "little", signed=True)
+                and_mask = int.from_bytes(masks[n:2 * n], "little", signed=True)
+                with lock:
+                    attribute[i] = (int(attribute[i]) | or_mask) & and_mask
+                data.status = 0x00
+            except Exception:
+                pass
+            data.input = bytearray(self.produce(data))
+            return True
+
+        @classmethod
+        def produce(cls, data):
+            if data.get("service") == cls.RMW_RPY:
+                return parser.USINT.produce(data.service) + b"\x00" + parser.status.produce(data)
+            return super().produce(data)
+
+    if "Read Modify Write Tag" not in logix.Logix.service:
+        srvc = parser.USINT(context="service")
+        srvc[True] = path = parser.EPATH(context="path")
+        path[True] = size = parser.UINT("size", context="read_modify_write", extension=".size")
+        size[True] = masks = parser.octets(context="read_modify_write", terminal=True)
+        masks[True] = masks
+        logix.Logix.register_service_parser(number=EmulatedLogix.RMW_REQ, name="Read Modify Write Tag",
+                                            short="read_modify_write", machine=srvc)
+
+    tags = [f"{key}={program.types[key] if program.types[key] in CIP_TYPES else 'DINT'}[{len(col)}]"
+            for key, col in program.columns.items()]
+    return enip_main(["--address", f"{address}:{port}", *tags],
+                     attribute_class=Column, message_router_class=EmulatedLogix)
+
+
+def bench(l5x=DEFAULT_L5X, scans=2000):
+    program = Program(l5x)
+    rungs = sum(len(r) for r in program.routines.values())
+    print(f"{rungs} rungs in {len(program.routines)} routines, compiled in {program.compile_ms:.1f} ms")
+    if program.unsupported:
+        print(f"not emulated: {program.unsupported}")
+    times = []
+    for _ in range(scans):
+        t0 = time.perf_counter()
+        program.scan(SCAN_MS)
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    print(f"scan: p50 {times[len(times) // 2]:.3f} ms  p99 {times[len(times) * 99 // 100]:.3f} ms  "
+          f"max {times[-1]:.3f} ms")
+
+
+def main(port=44818, scan_ms=SCAN_MS, l5x=DEFAULT_L5X, faults=None):
+    program = Program(l5x)
+    if program.unsupported:
+        print(f"not emulated: {program.unsupported}")
+    emulator = Emulator(program, scan_ms).start()
+    faults = faults or Faults()
+
+    def status():
+        while True:
+            time.sleep(10)
+            print("scan", emulator.report(), "dropped", faults.dropped, flush=True)
+    threading.Thread(target=status, daemon=True).start()
+    print(f"ladder emulator: {program.compile_ms:.0f} ms compile, {scan_ms} ms scan, port {port}", flush=True)
+    serve(program, port, faults=faults)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["bench"]:
+        bench(*args[1:2])
+    elif args[:1] == ["tags"]:
+        serve(TagTable(args[3:]), int(args[1]), faults=Faults.parse(args[2]))
+    else:
+        main(int(args[0]) if args else 44818, int(args[1]) if len(args) > 1 else SCAN_MS,
+             faults=Faults.parse(args[2] if len(args) > 2 else ""))
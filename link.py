@@ -0,0 +1,105 @@
+"""Connection health for one PLC, shared by the poller, the writer and /api/read.
+
+    connected  the last attempt succeeded
+    degraded   recent attempts failed; retries go out after a jittered,
+               exponentially growing backoff
+    open       OPEN_AFTER failures in a row: callers fail fast without
+               opening a session, and one probe is let through per backoff
+               period until the controller answers again
+"""
+import random, threading, time
+from pylogix.lgx_response import cip_error_codes
+
+OPEN_AFTER = 3         # consecutive failures before the circuit opens
+BACKOFF_BASE = 1.5     # first retry delay, seconds (doubles per failure)
+BACKOFF_MAX = 30.0     # longest retry delay
+# Statuses the controller itself answers with for a bad tag (the link is up)
+TAG_ERRORS = frozenset(cip_error_codes.values()) - {"Success", "Connection failure", "Connection lost"}
+
+
+class LinkDown(ConnectionError):
+    """Raised instead of attempting a session while the circuit is open."""
+
+
+def tag_error(status):
+    """True for a status that came back from the controller about the tag,
+    rather than from a failed connection."""
+    return status in TAG_ERRORS or str(status).startswith("Unknown error")
+
+
+def check_responses(res):
+    """Raise ConnectionError when every pylogix Response failed: a dead link
+    shows up as a status on each tag, not as an exception."""
+    if res and all(getattr(r, "Status", "") != "Success" for r in res):
+        raise ConnectionError(res[0].Status)
+
+
+class LinkHealth:
+    def __init__(self, open_after=OPEN_AFTER, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+        self.open_after = open_after
+        self.base = base
+        self.cap = cap
+        self.state = "connected"
+        self.failures = 0        # consecutive
+        self.last_error = None
+        self.opened = 0          # times the circuit has opened
+        self.since = time.time()  # wall time of the last state change
+        self._retry_at = 0.0     # monotonic time the next attempt is allowed
+        self._lock = threading.Lock()
+
+    def _set(self, state):
+        if state != self.state:
+            self.state = state
+            self.since = time.time()
+            if state == "open":
+                self.opened += 1
+
+    def backoff(self):
+        """Delay before the next attempt after `failures` failures: exponential,
+        with half of it random so several callers never retry in step."""
+        delay = min(self.cap, self.base * 2 ** max(0, self.failures - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def attempt(self):
+        """0 when the caller may try the PLC now, else seconds until it may.
+        With the circuit open, the first caller after the backoff gets the
+        probe and everyone else waits another backoff period."""
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            now = time.monotonic()
+            if now < self._retry_at:
+                return self._retry_at - now
+            self._retry_at = now + self.backoff()
+            return 0.0
+
+    def retry_in(self):
+        return max(0.0, self._retry_at - time.monotonic())
+
+    def check(self):
+        """attempt(), raising LinkDown instead of returning a wait."""
+        wait = self.attempt()
+        if wait:
+            raise LinkDown(f"PLC offline, retrying in {wait:.0f} s")
+
+    def ok(self):
+        with self._lock:
+            self.failures = 0
+            self._set("connected")
+
+    def failed(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            self._retry_at = time.monotonic() + self.backoff()
+            self._set("open" if self.failures >= self.open_after else "degraded")
+
+    def report(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in": round(self.retry_in(), 1) if self.state != "connected" else None,
+            "last_error": self.last_error,
+            "since": round(self.since, 3),
+            "opened": self.opened,
+        }
@@ -0,0 +1,155 @@
+"""Prometheus text-format metrics, cheap enough to leave on.
+
+Histograms keep their bucket counts in a preallocated array: observe() is a
+bisect and an in-place increment, with no lock (a rare lost increment
+under contention is the price of never blocking the poll thread). Labeled
+families create one child per label value on first use, capped at
+MAX_LABELS so a client can't grow them without bound.
+"""
+import bisect, threading
+from array import array
+
+# Seconds, for everything from a JSON dump (~100 us on a Pi) to a timed-out read
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+MAX_LABELS = 200  # children per labeled family; later label values share "other"
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+
+def _num(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Histogram:
+    def __init__(self, bounds=TIME_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = array("Q", bytes(8 * (len(self.bounds) + 1)))  # last slot: +Inf
+        self.total = array("d", [0.0])
+
+    def observe(self, v):
+        self.counts[bisect.bisect_left(self.bounds, v)] += 1
+        self.total[0] += v
+
+    def samples(self, name, pairs):
+        running = 0
+        for le, n in zip(self.bounds + ("+Inf",), self.counts):
+            running += n
+            yield f"{name}_bucket{_labels(pairs + [('le', le)])} {running}"
+        yield f"{name}_sum{_labels(pairs)} {self.total[0]!r}"
+        yield f"{name}_count{_labels(pairs)} {running}"
+
+
+class _Family:
+    kind = None
+
+    def __init__(self, name, help, label=None):
+        self.name, self.help, self.label = name, help, label
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, value):
+        child = self._children.get(value)
+        if child is None:
+            with self._lock:
+                if value not in self._children and len(self._children) >= MAX_LABELS:
+                    value = "other"
+                child = self._children.get(value)
+                if child is None:
+                    child = self._children[value] = self._new()
+        return child
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for value, child in list(self._children.items()):
+            yield from self._render_child(child, [(self.label, value)] if self.label else [])
+
+
+class HistogramFamily(_Family):
+    kind = "histogram"
+
+    def __init__(self, name, help, label=None, bounds=TIME_BUCKETS):
+        super().__init__(name, help, label)
+        self.bounds = bounds
+        if label is None:
+            self._children[None] = self._new()
+
+    def _new(self):
+        return Histogram(self.bounds)
+
+    def observe(self, v, label=None):
+        self.labels(label).observe(v)
+
+    def _render_child(self, child, pairs):
+        return child.samples(self.name, pairs)
+
+
+class CounterFamily(_Family):
+    kind = "counter"
+
+    def __init__(self, name, help, label=None):
+        super().__init__(name, help, label)
+        if label is None:
+            self._children[None] = self._new()
+
+    def _new(self):
+        return array("Q", [0])
+
+    def inc(self, label=None, n=1):
+        self.labels(label)[0] += n
+
+    def _render_child(self, child, pairs):
+        yield f"{self.name}{_labels(pairs)} {child[0]}"
+
+
+class GaugeFunction:
+    """Gauge read at scrape time: fn() returns a number, or {label value: number}."""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, label=None):
+        self.name, self.help, self.fn, self.label = name, help, fn, label
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        value = self.fn()
+        if isinstance(value, dict):
+            for k, v in value.items():
+                yield f"{self.name}{_labels([(self.label, k)])} {_num(v)}"
+        elif value is not None:
+            yield f"{self.name} {_num(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        # Modules register at import; a reload gets the existing metric back
+        return self._metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name, help, label=None, bounds=TIME_BUCKETS):
+        return self._add(HistogramFamily(name, help, label, bounds))
+
+    def counter(self, name, help, label=None):
+        return self._add(CounterFamily(name, help, label))
+
+    def gauge(self, name, help, fn, label=None):
+        self._metrics[name] = GaugeFunction(name, help, fn, label)  # latest callback wins
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+histogram, counter, gauge = REGISTRY.histogram, REGISTRY.counter, REGISTRY.gauge
@@ -1,49 +1,251 @@
-from flask import Flask, Response, jsonify, render_template_string, request
+from flask import Flask, Response, abort, jsonify, render_template_string, request
 from pylogix import PLC
-import json, time
+import atexit, itertools, json, os, signal, sys, threading, time
+from catalog import CatalogKeeper
+from concurrent.futures import TimeoutError as FutureTimeout
+from historian import Historian
+from interlock import Explainer
+from link import LinkDown, LinkHealth
+from metrics import REGISTRY, counter, gauge, histogram
+from history import RingHistory, downsample
+from poller import Sampler, SliceView, SnapshotFile, TagPoller, WatchView, error_text
+from readplan import parse_address
+from replay import Recorder, Replay, parse_speed
+from schema import Field, by_tag, decoder
+from wire import PACKED_JS, PackedCodec
+from writer import PulseScheduler, TagWriter
+from xref import XrefIndex
 
 # ---- CONFIG ----
 PLC_IP = "192.168.1.1"  # CompactLogix PLC IP for Booth 1
-# Define the PLC tags to read for Booth 1 status
-TAGS = [
-    "M[0].0",       # System ON (Booth 1 System Control Enabled)
-    "M[40].0",      # Heat ENABLED (Booth 1 Heat Control Enabled)
-    "M[0].11",      # Bake Mode ACTIVE (Booth 1 Bake Cycle Active)
-    "B1_Bake_Time_ACC",  # Bake Timer Accumulator (REAL, minutes)
-    "W16[2]",       # Current Temperature (Booth 1, INT scaled x100)
-    "W16[1]",       # Temperature Setpoint (Booth 1 PID, INT scaled x100)
-    "M[1].4",       # Mode: Restart Bake Cycle (AUTO)
-    "M[1].5",       # Mode: End Bake Cycle (MANUAL)
-    "M[40].4",      # Cooldown Active Status
-    "TMR[6].ACC",   # Cooldown Timer Accumulator (ms)
-    "B1_Bake_Time", # Bake Timer Preset (REAL, minutes)
-    "M[3].0",       # Lights Status
-    "M[1].0",       # Lights ON Command
-    "M[0].15",      # Lights OFF Command
-    "TMR[6].PRE",   # Cooldown Timer Preset (DINT, ms)
-    "W00[15]",      # Spray Temperature Setpoint (INT, scaled x100)
-    "M[40].2",      # Purge Cycle ON
-    "M[0].9",       # System Ready
-    "M[2].0",       # Center Door Switch Not Active
-    "R000.3",       # Exhaust Fan 1 Air Proving
-    "M[0].5",       # Supply Fan 1 High Air Pressure Good
-    "M[0].6",       # Supply Fan 1 Low Air Pressure Good
-    "W00[13]",      # Bake Temperature Setpoint (INT, scaled x100)
-    "B1_Purge_Time", # Purge Timer Preset (REAL, minutes)
-    "M[1].4",       # Auto Mode Status
-    "M[1].5",       # Manual Mode Status
-]
-POLL_SEC = 1.0  # polling interval in seconds
+# Booth 1 tags: PLC type, display scale/units, write limits and scan class (see
+# schema.py). Values stay in PLC units; scale is PLC units per displayed unit.
+TEMP = dict(scale=100, units="°F", decimals=1)       # INT, °F x100
+TEMP_SP = dict(TEMP, lo=0, hi=250, writable=True)
+MINUTES = dict(units="min", decimals=1)              # REAL minutes
+TAG_SCHEMA = {
+    "M[0].0": Field("BOOL", label="System ON"),
+    "M[40].0": Field("BOOL", label="Heat ENABLED"),
+    "M[0].11": Field("BOOL", label="Bake Mode ACTIVE"),
+    "B1_Bake_Time_ACC": Field("REAL", **MINUTES, scan="fast", display="mmss", label="Bake Timer"),
+    "W16[2]": Field("INT", **TEMP, scan="fast", label="Current Temperature"),
+    "W16[1]": Field("INT", **TEMP_SP, scan="fast", label="Temperature Setpoint (PID)"),
+    "M[1].4": Field("BOOL", label="Auto Mode Status (Restart Bake Cycle)"),
+    "M[1].5": Field("BOOL", label="Manual Mode Status (End Bake Cycle)"),
+    "M[40].4": Field("BOOL", label="Cooldown Active"),
+    "TMR[6].ACC": Field("DINT", scale=60000, units="min", scan="fast", display="mmss", label="Cooldown Timer"),
+    "B1_Bake_Time": Field("REAL", **MINUTES, lo=0, hi=240, writable=True, scan="presets", label="Bake Timer Preset"),
+    "M[3].0": Field("BOOL", label="Lights Status"),
+    "M[1].0": Field("BOOL", writable=True, pulse=0.5, label="Lights ON Command"),
+    "M[0].15": Field("BOOL", writable=True, pulse=0.5, label="Lights OFF Command"),
+    "TMR[6].PRE": Field("DINT", scale=60000, units="min", decimals=1, lo=0, hi=120, writable=True,
+                        scan="presets", label="Cooldown Timer Preset"),
+    "W00[15]": Field("INT", **TEMP_SP, scan="presets", label="Spray Temperature Setpoint"),
+    "M[40].2": Field("BOOL", label="Purge Cycle ON"),
+    "M[0].9": Field("BOOL", label="System Ready"),
+    "M[2].0": Field("BOOL", label="Center Door Switch Not Active"),
+    "R000.3": Field("BOOL", label="Exhaust Fan 1 Air Proving"),
+    "M[0].5": Field("BOOL", label="Supply Fan 1 High Air Pressure Good"),
+    "M[0].6": Field("BOOL", label="Supply Fan 1 Low Air Pressure Good"),
+    "W00[13]": Field("INT", **TEMP_SP, scan="presets", label="Bake Temperature Setpoint"),
+    "B1_Purge_Time": Field("REAL", **MINUTES, lo=0, hi=60, writable=True, scan="presets", label="Purge Timer Preset"),
+    # Written by the controls page but not polled
+    "M[1].3": Field("BOOL", writable=True, poll=False, pulse=0.5, label="Restart Bake HMI Input (AUTO button)"),
+    "M[1].2": Field("BOOL", writable=True, poll=False, pulse=0.5, label="Single Cycle Bake HMI Input (MANUAL button)"),
+    "M[40].10": Field("BOOL", writable=True, poll=False, pulse=1.0, label="Bake Cycle Start HMI Input"),
+    "M[40].14": Field("BOOL", writable=True, poll=False, pulse=1.0, label="End Bake Cycle HMI Input"),
+}
+TAGS = [key for key, f in TAG_SCHEMA.items() if f.poll]
+COMMAND_TAGS = [key for key, f in TAG_SCHEMA.items() if not f.poll]
+
+# Booth 2 and the combined "Both Booths" system run the same logic at other
+# addresses (see the L5X). Pages and the /booth/<n>/ APIs address tags by their
+# Booth 1 name (the key); each booth maps keys to its own PLC tags, and keys a
+# booth has no equivalent for are simply absent from its pages.
+BOOTH_TAGS = {
+    "1": {tag: tag for tag in TAGS + COMMAND_TAGS},
+    "2": {
+        "M[0].0": "M[30].0",          # System ON
+        "M[40].0": "M[41].0",         # Heat ENABLED
+        "M[0].11": "M[30].11",        # Bake Cycle Active
+        "B1_Bake_Time_ACC": "B2_Bake_Time_ACC",
+        "W16[2]": "W16[34]",          # Current Temperature
+        "W16[1]": "W16[33]",          # PID Setpoint
+        "M[1].4": "M[31].4",          # Restart Bake Cycle Mode (AUTO)
+        "M[1].5": "M[31].5",          # End Bake Cycle Mode (MANUAL)
+        "M[40].4": "M[41].4",         # Cooldown Active
+        "TMR[6].ACC": "TMR[35].ACC",  # Cooldown Timer
+        "B1_Bake_Time": "B2_Bake_Time",
+        "M[3].0": "M[4].0",           # Lights Status
+        "M[1].0": "M[31].0",          # Lights ON Command
+        "M[0].15": "M[30].15",        # Lights OFF Command
+        "TMR[6].PRE": "TMR[35].PRE",
+        "W00[15]": "W00[45]",         # Spray Setpoint
+        "M[40].2": "M[41].2",         # Purge Cycle ON
+        "M[0].9": "M[30].9",          # System Ready
+        "M[2].0": "M[2].0",           # Center Door Switch Not Active (shared)
+        "R000.3": "R002.3",           # Supply Fan 2 Input
+        "M[0].5": "M[30].5",          # Supply Fan 2 High Air Pressure Good
+        "M[0].6": "M[30].6",          # Supply Fan 2 Low Air Pressure Good
+        "W00[13]": "W00[43]",         # Bake Setpoint
+        "B1_Purge_Time": "B2_Purge_Time",
+        "M[1].3": "M[31].3",
+        "M[1].2": "M[31].2",
+        "M[40].10": "M[41].10",
+        "M[40].14": "M[41].14",
+    },
+    "both": {
+        "M[0].0": "M[60].0",          # Both Booths System Enabled
+        "M[40].0": "M[42].0",         # Both Booths Burners Active
+        "M[0].11": "M[60].11",        # Both Booths Bake Cycle Active
+        "B1_Bake_Time_ACC": "Both_Bake_Time_ACC",
+        "W16[2]": "W16[66]",          # Booth 1&2 Temperature
+        "W16[1]": "W16[65]",          # PID3 Setpoint
+        "M[40].4": "M[42].4",         # Bake Cycle Done / cooling
+        "TMR[6].ACC": "TMR[49].ACC",
+        "B1_Bake_Time": "Both_Bake_Time",
+        "M[1].0": "M[61].0",          # Lights On HMI Input
+        "M[0].15": "M[60].15",        # Lights Off HMI Input
+        "TMR[6].PRE": "TMR[49].PRE",
+        "W00[15]": "W00[75]",
+        "M[40].2": "M[42].2",
+        "M[0].9": "M[60].9",          # Both Booths System Active
+        "M[2].0": "M[2].1",           # Center Door Switch Active (booths joined)
+        "W00[13]": "W00[73]",
+        "B1_Purge_Time": "Both_Purge_Time",
+        "M[40].10": "M[42].10",
+        "M[40].14": "M[42].14",
+    },
+}
+BOOTH_NAMES = {"1": "Booth 1", "2": "Booth 2", "both": "Both Booths"}
+# Every polled tag for every booth, read with one combined plan per scan
+READ_TAGS = list(dict.fromkeys(
+    tag for tags in BOOTH_TAGS.values() for key, tag in tags.items() if key in TAGS))
+POLL_SEC = 1.0  # polling interval in seconds for tags not in a scan class below
+# Scan classes: read period (s); tags join one with `scan=` in TAG_SCHEMA and
+# the other booths' equivalents go in the same class. Presets are also re-read
+# right after a write to them.
+SCAN_PERIODS = {"fast": 0.25, "presets": 30.0}
+SCAN_CLASSES = {name: (period, [key for key, f in TAG_SCHEMA.items() if f.scan == name])
+                for name, period in SCAN_PERIODS.items()}
+WRITE_TIMEOUT = 3.0  # seconds an HTTP write waits for the PLC before giving up
+HISTORY_SAMPLES = 86400  # trend ring size: 24 h at POLL_SEC = 1.0
+# Raw PLC reads are recorded under this directory (one file per day) when set;
+# PAINTBOOTH_REPLAY serves a recording instead of the PLC (see replay.py)
+RECORD_DIR = os.environ.get("PAINTBOOTH_RECORD")
+REPLAY_FILE = os.environ.get("PAINTBOOTH_REPLAY")
+REPLAY_SPEED = parse_speed(os.environ.get("PAINTBOOTH_REPLAY_SPEED", "1"))  # None: as fast as possible
+SNAPSHOT_FILE = "data/snapshot.json"  # last poll values, shown right after a restart
+SNAPSHOT_SAVE_SEC = 5.0   # how often the snapshot file is rewritten while polling
+API_READ_MAX_AGE = 5.0    # /api/read default: older snapshots trigger a fresh PLC read
+HISTORIAN_DIR = "data/history"  # day files for the on-disk historian
+HISTORIAN_KEEP_DAYS = 400       # older day files are deleted by the daily compaction
+L5X_FILE = "MainProgram_Program.L5X"  # controller program export, for /api/xref
+XREF_CACHE_DIR = "data/xref"          # parsed index, keyed by the L5X's hash
+CATALOG_FILE = "data/catalog.json"    # controller tag list (GetTagList), refetched when the project changes
+EXPLAIN_ROOT = "M[0].9"  # troubleshoot page default: why is System Ready off (Booth 1 key)
+EXPLAIN_CACHE = 32       # interlock trees kept built; idle ones are dropped beyond this
+STREAM_MAX_TAGS = 32     # tags one /stream?tags= client may ask for
+WATCH_MAX_TAGS = 64      # program tags outside TAGS read on demand, across all clients and trees
+TAG_VIEW_CACHE = 64      # per-client tag views kept built; idle ones are dropped beyond this
+TROUBLESHOOT_KEYS = ["M[0].0", "M[2].0", "R000.3", "M[0].5", "M[0].6"]  # System Ready permissives shown there
+PULSE_SEC = 0.5  # default hold time for momentary buttons before writing 0
+PULSE_WIDTHS = {key: f.pulse for key, f in TAG_SCHEMA.items() if f.pulse}  # hold time per momentary button
+# PLC types of the word/array tags addressed by bit or element above (see the L5X).
+# Bit tags are read as whole words once per scan and unpacked locally.
+WORD_TYPES = {"M": "INT", "W16": "INT", "W00": "INT", "R000": "INT", "R002": "INT"}
 
 app = Flask(__name__)
 
+
+# Connection state shared by the poller, the writer and /api/read, so a dead
+# PLC gets one backed-off probe instead of a reconnect from every path
+link = LinkHealth()
+# Per-tag decoders for every booth's tags, compiled once from the schema
+FIELDS = by_tag(TAG_SCHEMA, BOOTH_TAGS)
+decode_values = decoder(FIELDS)
+# One background reader shared by every /stream client
+poller = TagPoller(PLC_IP, READ_TAGS, POLL_SEC, decode_values, WORD_TYPES, classes={
+    name: (period, [tags[key] for tags in BOOTH_TAGS.values() for key in keys if key in tags])
+    for name, (period, keys) in SCAN_CLASSES.items()
+}, health=link, max_watched=WATCH_MAX_TAGS)
+# Each booth's subscribers get only their slice of the snapshot, under Booth 1 keys
+booth_views = {
+    booth: SliceView(poller, {key: tag for key, tag in tags.items() if key in TAGS})
+    for booth, tags in BOOTH_TAGS.items()
+}
+# systemd stops the service with SIGTERM, which skips atexit unless it becomes a
+# normal exit; that is what flushes the recorder, snapshot and historian below
+if threading.current_thread() is threading.main_thread():
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+# A replay stands in for the PLC; it must not touch the plant's snapshot or historian
+replay = Replay(poller, REPLAY_FILE, REPLAY_SPEED) if REPLAY_FILE else None
+if RECORD_DIR and replay is None:
+    poller.recorder = Recorder(RECORD_DIR)
+    atexit.register(poller.recorder.close)
+# Last values from the previous run, until the first read replaces them
+snapshot_file = SnapshotFile(SNAPSHOT_FILE, SNAPSHOT_SAVE_SEC)
+if replay is None:
+    saved = snapshot_file.load()
+    if saved is not None:
+        poller.restore(*saved)
+    poller.attach(snapshot_file, prime=False)
+    atexit.register(lambda: snapshot_file.save(poller.last_good))
+# Fixed-memory trend buffer, filled by the poll loop (which now always runs);
+# the fast scan class publishes several frames a second, history keeps one per POLL_SEC
+history = RingHistory(poller.tags, HISTORY_SAMPLES)
+poller.attach(Sampler(history, POLL_SEC), prime=False)
+# Long-term history on disk, batched into compressed chunks per day
+historian = Historian(HISTORIAN_DIR)
+if replay is None:
+    poller.attach(Sampler(historian, POLL_SEC), prime=False)
+    historian.start_compaction(HISTORIAN_KEEP_DAYS)
+    atexit.register(historian.flush)
+else:
+    replay.start()
+# One long-lived write session; repeated writes to a queued tag are coalesced
+writer = TagWriter(PLC_IP, link)
+# Releases momentary bits in the background after their pulse width
+pulses = PulseScheduler(writer, PULSE_WIDTHS, PULSE_SEC)
+# Ladder cross-reference, parsed once per L5X export (None if the export is missing)
+try:
+    xref = XrefIndex.load(L5X_FILE, XREF_CACHE_DIR)
+except OSError:
+    xref = None
+# Tag list for autocomplete, fetched from the controller only when its project changes
+catalog = CatalogKeeper(PLC_IP, xref, CATALOG_FILE, link)
+if replay is None:
+    catalog.start()
+# Live "why is this off" trees by root tag; each reads its extra tags only while viewed
+explainers = {}
+explainers_lock = threading.Lock()
+# /stream?tags=... views by booth and tag set; clients asking for the same set share one
+tag_views = {}
+tag_views_lock = threading.Lock()
+
+# What the pages need from the schema, keyed like the stream values
+PAGE_SCHEMA = {key: f.describe() for key, f in TAG_SCHEMA.items()}
+# Shared by the pages: PLC units -> displayed text for a schema tag
+SCHEMA_JS = """
+    function fmt(tag, raw) {
+      const f = SCHEMA[tag];
+      if (!f || raw === null || raw === undefined) return raw;
+      const v = Number(raw) / f.scale;
+      if (f.display === 'mmss') {
+        const sec = Math.floor(v * 60);
+        return Math.floor(sec / 60) + ':' + String(sec % 60).padStart(2, '0') + ' ' + f.units;
+      }
+      return v.toFixed(f.decimals) + ' ' + f.units;
+    }
+"""
+
 # HTML template for the dashboard page
 PAGE = """
 <!doctype html>
 <html>
 <head>
   <meta charset="utf-8">
-  <title>Paint Booth 1 Live Status</title>
+  <title>Paint {{ booth_name }} Live Status</title>
   <meta name="viewport" content="width=device-width,initial-scale=1">
   <style>
     :root { color-scheme: dark; }
@@ -141,7 +343,7 @@ PAGE = """
 <body>
   <header>
     <div class="dot"></div>
-    <h1>Paint Booth 1 Dashboard</h1>
+    <h1>Paint {{ booth_name }} Dashboard</h1>
     <div class="small" style="margin-left:auto;">PLC: {{ plc_ip }}</div>
   </header>
   <main>
@@ -150,11 +352,11 @@ PAGE = """
         <tr>
           <th class="status-cell">Status</th>
           <th>Tag</th>
-          <th style="padding:0;"><a href="/controls" class="controls-btn" style="border-radius:0;">CONTROLS</a></th>
+          <th style="padding:0;"><a href="{{ base }}/controls" class="controls-btn" style="border-radius:0;">CONTROLS</a></th>
         </tr>
       </thead>
       <tbody id="rows">
-        <tr><td class="status-cell"><div id="s_M_0_9" class="status-indicator"></div></td><td class="tag"><a href="/troubleshoot" style="color:inherit; text-decoration:none; border-bottom:1px dotted #777;">System Ready</a></td>        <td class="val" id="M_0_9">—</td></tr>
+        <tr><td class="status-cell"><div id="s_M_0_9" class="status-indicator"></div></td><td class="tag"><a href="{{ base }}/troubleshoot" style="color:inherit; text-decoration:none; border-bottom:1px dotted #777;">System Ready</a></td>        <td class="val" id="M_0_9">—</td></tr>
         <tr><td class="status-cell"><div id="s_M_0_0" class="status-indicator"></div></td><td class="tag">System ON</td>           <td class="val" id="M_0_0">—</td></tr>
         <tr><td class="status-cell"><div id="s_M_40_0" class="status-indicator"></div></td><td class="tag">Heat ENABLED</td>        <td class="val" id="M_40_0">—</td></tr>
         <tr><td class="status-cell"><div id="s_M_40_2" class="status-indicator"></div></td><td class="tag">Purge Cycle</td>         <td class="val" id="M_40_2">—</td></tr>
@@ -180,6 +382,10 @@ PAGE = """
       }
     }
 
+    const SCHEMA = {{ schema|tojson }};
+    {{ schema_js|safe }}
+    {{ packed_js|safe }}
+
     function applyUpdate(data) {
       const vals = data.values || {};
 
@@ -193,25 +399,9 @@ PAGE = """
         const el = document.getElementById(elementId);
         if (!el) continue;
 
-        if (tag === "B1_Bake_Time_ACC") {
-          // Display bake timer in MM:SS min
-          let totalMin = parseFloat(val);
-          let m = Math.floor(totalMin);
-          let s = Math.round((totalMin - m) * 60);
-          if (s === 60) { m++; s = 0; }
-          el.textContent = m + ":" + s.toString().padStart(2, '0') + " min";
-        } else if (tag === "TMR[6].ACC") {
-          // Cooldown timer ACC (ms) → MM:SS min
-          let totalSec = parseInt(val, 10) / 1000;
-          let m = Math.floor(totalSec / 60);
-          let s = Math.floor(totalSec % 60);
-          el.textContent = m + ":" + s.toString().padStart(2, '0') + " min";
-          continue;
-        } else if (tag === "W16[1]" || tag === "W16[2]" || tag === "W00[15]" || tag === "W00[13]") {
-          // Temperature setpoint/current: divide by 100 to get one decimal + °F
-          el.textContent = (parseInt(val) / 100.0).toFixed(1) + " °F";
-        } else if (tag === "B1_Purge_Time") {
-             el.textContent = parseFloat(val).toFixed(1) + " min";
+        if (SCHEMA[tag] && SCHEMA[tag].units) {
+          // Temperatures and timers: scaled and labelled from the tag schema
+          el.textContent = fmt(tag, val);
         } else {
           // Booleans or other values: show as ON/OFF if boolean, or numeric directly
           if (tag === "M[0].9") {
@@ -290,26 +480,45 @@ PAGE = """
       updateStatusIndicator('s_TMR_6_ACC', parseInt(vals['TMR[6].ACC'] || 0) > 0);
 
       // Update status text (timestamp or error)
-      if (data.error) {
+      if (data.plc && data.plc.state === "open") {
+        statusEl.textContent = "PLC offline, retrying in " + Math.ceil(data.plc.retry_in) + " s (" + data.error + ")";
+      } else if (data.error) {
         statusEl.textContent = "error: " + data.error;
       } else {
         statusEl.textContent = "last update: " + new Date().toLocaleTimeString();
       }
     }
 
+    // Local copy of all tag values; keyframes replace it, deltas merge into it
+    let state = {};
+    let lastId = null;
+
+    let wire = null;  // packed stream schema, sent first on every connection
+
     function connect() {
-      const ev = new EventSource("/stream");
+      let url = "{{ base }}/stream?mode=delta&format=packed";
+      if (lastId) url += "&last_id=" + encodeURIComponent(lastId);
+      const ev = new EventSource(url);
+      ev.addEventListener('schema', (e) => { wire = packedSchema(JSON.parse(e.data)); });
       ev.onmessage = (e) => {
         try {
-          const payload = JSON.parse(e.data);
-          applyUpdate(payload);
+          const payload = unpackEvent(wire, e.data);
+          if (e.lastEventId) lastId = e.lastEventId;
+          if (payload.values) {
+            if (payload.keyframe) state = {};
+            Object.assign(state, payload.values);
+            applyUpdate({values: state});
+          } else {
+            applyUpdate(payload);
+          }
         } catch (err) {
           console.error("Failed to parse update", err);
         }
       };
       ev.onerror = () => {
         statusEl.textContent = "disconnected, retrying…";
-        // Attempt reconnect after a delay
+        // Attempt reconnect after a delay, resuming from the last event id
+        ev.close();
         setTimeout(connect, 3000);
       };
     }
@@ -328,7 +537,7 @@ TROUBLESHOOT_PAGE = """
 <html>
 <head>
   <meta charset="utf-8">
-  <title>Troubleshooting - Paint Booth 1</title>
+  <title>Troubleshooting - Paint {{ booth_name }}</title>
   <meta name="viewport" content="width=device-width,initial-scale=1">
   <style>
     :root { color-scheme: dark; }
@@ -372,7 +581,7 @@ TROUBLESHOOT_PAGE = """
       padding: 2vh 2vw; 
       display: flex; 
       flex-direction: column; 
-      overflow: hidden; 
+      overflow-y: auto; 
     }
     table { 
       width: 100%; 
@@ -404,11 +613,21 @@ TROUBLESHOOT_PAGE = """
     .tag-name { color: #777; font-family: monospace; font-size: 2.5vh; }
     .val { color: #ffd28a; font-weight: bold; }
     .desc { color: #7b8aa8; font-size: 2vh; }
+    #explain { margin-top: 3vh; font-size: 2.2vh; }
+    #explain h2 { font-size: 3vh; color: #9fb0ff; margin: 0 0 1vh 0; }
+    .xnode { margin-left: 2vw; padding-left: 1vw; border-left: 1px solid #222735; }
+    .xout { margin: 0.6vh 0; }
+    .xout .rung { color: #777; }
+    .leaf { padding: 0 0.4vw; border-radius: 4px; }
+    .leaf.ok, .xout.ok > .instr { color: #3fdc5a; }
+    .leaf.bad, .xout.bad > .instr { color: #ff4444; font-weight: bold; }
+    .xval { color: #ffd28a; }
+    details > summary { cursor: pointer; }
   </style>
 </head>
 <body>
   <header>
-    <a href="/" class="back-btn">← BACK</a>
+    <a href="{{ base }}/" class="back-btn">← BACK</a>
     <h1>System Ready Diagnostics</h1>
   </header>
   <main>
@@ -422,23 +641,63 @@ TROUBLESHOOT_PAGE = """
         </tr>
       </thead>
       <tbody id="rows">
+        {% if 'M[0].0' in permissives %}
         <tr><td class="status-cell"><div id="s_M_0_0" class="status-indicator"></div></td><td class="tag-name">M[0].0</td><td class="tag">System ON</td><td class="desc">Main System Power</td></tr>
+        {% endif %}
+        {% if 'M[2].0' in permissives %}
         <tr><td class="status-cell"><div id="s_M_2_0" class="status-indicator"></div></td><td class="tag-name">M[2].0</td><td class="tag">Center Door</td><td class="desc">Switch must be NOT Active</td></tr>
+        {% endif %}
+        {% if 'R000.3' in permissives %}
         <tr><td class="status-cell"><div id="s_R000_3" class="status-indicator"></div></td><td class="tag-name">R000.3</td><td class="tag">Supply Fan 1</td><td class="desc">Fan Input (1M-2)</td></tr>
+        {% endif %}
+        {% if 'M[0].5' in permissives %}
         <tr><td class="status-cell"><div id="s_M_0_5" class="status-indicator"></div></td><td class="tag-name">M[0].5</td><td class="tag">Supply Fan High</td><td class="desc">High Air Pressure Good</td></tr>
+        {% endif %}
+        {% if 'M[0].6' in permissives %}
         <tr><td class="status-cell"><div id="s_M_0_6" class="status-indicator"></div></td><td class="tag-name">M[0].6</td><td class="tag">Supply Fan Low</td><td class="desc">Low Air Pressure Good</td></tr>
+        {% endif %}
       </tbody>
     </table>
     <div style="margin-top: 2vh; color: #777; text-align: center; font-size: 2vh;">
       All items above must be GREEN for System Ready to be active.
     </div>
+    <form id="watchform" style="margin-top: 3vh; font-size: 2.5vh;">
+      <input id="watchtag" list="tagmatches" placeholder="Watch a tag (name or description)" autocomplete="off"
+             style="font: inherit; width: 60%; background: #131826; color: #e6e6e6; border: 1px solid #222735; padding: 1vh;">
+      <datalist id="tagmatches"></datalist>
+      <button style="font: inherit; padding: 1vh 2vw;">Watch</button>
+    </form>
+    {% if watch %}
+    <table style="margin-top: 3vh;">
+      <thead><tr><th>Watched Tag</th><th>Value</th></tr></thead>
+      <tbody>
+        {% for t in watch %}
+        <tr><td class="tag-name">{{ t }}</td><td class="val" data-watch="{{ t }}">--</td></tr>
+        {% endfor %}
+      </tbody>
+    </table>
+    {% endif %}
+    <div id="explain">
+      <h2>Why is <span class="tag">{{ explain_tag }}</span> off?</h2>
+      <div id="xtree" class="desc">Loading rung logic...</div>
+    </div>
   </main>
   <script>
-    const ev = new EventSource("/stream");
+    {{ packed_js|safe }}
+    // Delta stream: keyframes replace the local state, deltas merge into it.
+    // EventSource resends Last-Event-ID on reconnect so the server can resume.
+    // Only the permissives above and any ?watch= tags are streamed.
+    let state = {}, wire = null;
+    const ev = new EventSource("{{ base }}/stream?mode=delta&format=packed&tags=" + encodeURIComponent({{ stream_tags|tojson }}));
+    ev.addEventListener('schema', (e) => { wire = packedSchema(JSON.parse(e.data)); });
     ev.onmessage = (e) => {
       try {
-        const data = JSON.parse(e.data);
-        if (data.values) updateUI(data.values);
+        const data = unpackEvent(wire, e.data);
+        if (data.values) {
+          if (data.keyframe) state = {};
+          Object.assign(state, data.values);
+          updateUI(state);
+        }
       } catch (err) {}
     };
 
@@ -449,14 +708,105 @@ TROUBLESHOOT_PAGE = """
       }
     }
 
+    // Interlock tree: structure from /api/explain, live results from its own
+    // stream (v:<tag> values, l:<leaf> and o:<rung output> as 0/1). Failing
+    // conditions open automatically, walking back to the first false input.
+    const XTAG = {{ explain_tag|tojson }};
+    let xstate = {};
+    function esc(s) { return String(s).replace(/[&<>"]/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;'}[c])); }
+    function renderNode(t, tag, seen) {
+      seen.add(tag);
+      const node = t.nodes[tag];
+      let h = '<div class="xnode"><span class="tag">' + esc(tag) + '</span> = <span class="xval" data-v="' + esc(tag) + '">--</span>';
+      if (node.description) h += ' <span class="desc">' + esc(node.description) + '</span>';
+      if (!node.outputs.length) h += ' <span class="desc">(not driven by logic)</span>';
+      for (const n of node.outputs) {
+        const o = t.outputs[n];
+        h += '<div class="xout" data-out="' + n + '"><span class="rung">' + esc(o.rung) + '</span> <span class="instr">' +
+             esc(o.instruction + '(' + o.operands.join(',') + ')') + '</span> when ' + renderCond(t, o.cond, seen) + '</div>';
+      }
+      return h + '</div>';
+    }
+    function renderCond(t, c, seen) {
+      if (c.leaf !== undefined) {
+        const l = t.leaves[c.leaf];
+        let h = '<span class="leaf" data-leaf="' + c.leaf + '">' + esc(l.instruction + '(' + l.operands.join(',') + ')') + '</span>';
+        for (const tag of l.expand) {
+          if (seen.has(tag)) continue;
+          h += '<details data-for="' + c.leaf + '"><summary class="desc">' + esc(tag) + '</summary>' + renderNode(t, tag, seen) + '</details>';
+        }
+        return h;
+      }
+      if (!c.items.length) return '<span class="desc">always</span>';
+      const parts = c.items.map(i => renderCond(t, i, seen));
+      return c.op === 'or' ? '[ ' + parts.join(' OR ') + ' ]' : parts.join(' ');
+    }
+    function updateTree() {
+      document.querySelectorAll('#xtree [data-v]').forEach(el => {
+        const v = xstate['v:' + el.dataset.v];
+        el.textContent = (v === null || v === undefined) ? '--' : v;
+      });
+      document.querySelectorAll('#xtree [data-leaf]').forEach(el => {
+        const v = xstate['l:' + el.dataset.leaf];
+        el.className = 'leaf' + (v === 1 ? ' ok' : v === 0 ? ' bad' : '');
+      });
+      document.querySelectorAll('#xtree [data-out]').forEach(el => {
+        const v = xstate['o:' + el.dataset.out];
+        el.className = 'xout' + (v === 1 ? ' ok' : v === 0 ? ' bad' : '');
+      });
+      document.querySelectorAll('#xtree details[data-for]').forEach(el => {
+        el.open = xstate['l:' + el.dataset.for] === 0;
+      });
+    }
+    fetch('/api/explain?tag=' + encodeURIComponent(XTAG)).then(r => r.json()).then(t => {
+      const box = document.getElementById('xtree');
+      if (t.error) { box.textContent = t.error; return; }
+      box.className = '';
+      box.innerHTML = renderNode(t, t.root, new Set());
+      const xev = new EventSource('/api/explain/stream?mode=delta&tag=' + encodeURIComponent(XTAG));
+      xev.onmessage = (e) => {
+        const data = JSON.parse(e.data);
+        if (!data.values) return;
+        if (data.keyframe) xstate = {};
+        Object.assign(xstate, data.values);
+        updateTree();
+      };
+    }).catch(() => {});
+
     function updateUI(vals) {
       updateStatusIndicator('s_M_0_0', vals['M[0].0'] === 1);
       updateStatusIndicator('s_M_2_0', vals['M[2].0'] === 1);
       updateStatusIndicator('s_R000_3', vals['R000.3'] === 1);
       updateStatusIndicator('s_M_0_5', vals['M[0].5'] === 1);
       updateStatusIndicator('s_M_0_6', vals['M[0].6'] === 1);
+      document.querySelectorAll('[data-watch]').forEach(el => {
+        const v = vals[el.dataset.watch];
+        el.textContent = (v === null || v === undefined) ? '--' : v;
+      });
     }
     
+    // Tag autocomplete from the server's catalog; watching reloads with ?watch=
+    const WATCH = {{ watch|tojson }};
+    const watchInput = document.getElementById('watchtag');
+    let lookup = null;
+    watchInput.addEventListener('input', () => {
+      clearTimeout(lookup);
+      lookup = setTimeout(() => {
+        fetch('/api/tags?limit=15&q=' + encodeURIComponent(watchInput.value)).then(r => r.json()).then(d => {
+          document.getElementById('tagmatches').innerHTML = (d.tags || []).map(t =>
+            '<option value="' + esc(t.name) + '">' + esc(t.description || t.type || '') + '</option>').join('');
+        }).catch(() => {});
+      }, 150);
+    });
+    document.getElementById('watchform').addEventListener('submit', (e) => {
+      e.preventDefault();
+      const tag = watchInput.value.trim();
+      if (!tag || WATCH.includes(tag)) return;
+      const params = new URLSearchParams(location.search);
+      params.set('watch', WATCH.concat([tag]).join(','));
+      location.search = params.toString();
+    });
+
     // Hardening
     document.addEventListener('contextmenu', event => event.preventDefault());
     document.addEventListener('dragstart', event => event.preventDefault());
@@ -470,7 +820,7 @@ CONTROLS_PAGE = """
 <html>
 <head>
   <meta charset="utf-8">
-  <title>Controls - Paint Booth 1</title>
+  <title>Controls - Paint {{ booth_name }}</title>
   <meta name="viewport" content="width=device-width,initial-scale=1">
   <style>
     :root { color-scheme: dark; }
@@ -639,7 +989,7 @@ CONTROLS_PAGE = """
 </head>
 <body>
   <header>
-    <a href="/" class="back-btn">← BACK</a>
+    <a href="{{ base }}/" class="back-btn">← BACK</a>
     <h1>Controls</h1>
     <div style="margin-left:auto; display:flex; align-items:center; gap:2vw;">
       <button id="btn-login" onclick="toggleLogin()">LOG IN</button>
@@ -650,25 +1000,25 @@ CONTROLS_PAGE = """
     <!-- 1. Bake Timer -->
     <div class="card">
       <div class="card-title">Bake Timer</div>
-      <div class="value-display" onclick="openKeypad('B1_Bake_Time', 'Bake Timer (min)')" id="disp_B1_Bake_Time">--</div>
+      <div class="value-display" onclick="openKeypad('B1_Bake_Time', 'Bake Timer (min)')" id="disp_B1_Bake_Time" data-tag="B1_Bake_Time">--</div>
     </div>
     
     <!-- 2. Spray Setpoint -->
     <div class="card">
       <div class="card-title">Spray Setpoint</div>
-      <div class="value-display" onclick="openKeypad('W00[15]', 'Spray Setpoint (°F)')" id="disp_W00_15">--</div>
+      <div class="value-display" onclick="openKeypad('W00[15]', 'Spray Setpoint (°F)')" id="disp_W00_15" data-tag="W00[15]">--</div>
     </div>
 
     <!-- 3. Bake Setpoint -->
     <div class="card">
       <div class="card-title">Bake Setpoint</div>
-      <div class="value-display" onclick="openKeypad('W00[13]', 'Bake Setpoint (°F)')" id="disp_W00_13">--</div>
+      <div class="value-display" onclick="openKeypad('W00[13]', 'Bake Setpoint (°F)')" id="disp_W00_13" data-tag="W00[13]">--</div>
     </div>
 
     <!-- 4. Purge Timer -->
     <div class="card">
       <div class="card-title">Purge Timer</div>
-      <div class="value-display" onclick="openKeypad('B1_Purge_Time', 'Purge Time (min)')" id="disp_B1_Purge_Time">--</div>
+      <div class="value-display" onclick="openKeypad('B1_Purge_Time', 'Purge Time (min)')" id="disp_B1_Purge_Time" data-tag="B1_Purge_Time">--</div>
     </div>
     
     <!-- 5. Lights -->
@@ -694,7 +1044,7 @@ CONTROLS_PAGE = """
     <!-- 5. Cooldown Timer -->
     <div class="card">
       <div class="card-title">Cooldown Timer</div>
-      <div class="value-display" onclick="openKeypad('TMR[6].PRE', 'Cooldown (min)')" id="disp_TMR_6_PRE">--</div>
+      <div class="value-display" onclick="openKeypad('TMR[6].PRE', 'Cooldown (min)')" id="disp_TMR_6_PRE" data-tag="TMR[6].PRE">--</div>
     </div>
     
     <!-- 6. Bake Cycle Controls -->
@@ -736,6 +1086,9 @@ CONTROLS_PAGE = """
   </div>
 
   <script>
+    const SCHEMA = {{ schema|tojson }};
+    {{ schema_js|safe }}
+    {{ packed_js|safe }}
     let currentTag = null;
     let currentValStr = "";
     let isUnlocked = false;
@@ -772,16 +1125,73 @@ CONTROLS_PAGE = """
       }
     }
 
-    // SSE for live updates
-    const ev = new EventSource("/stream");
-    ev.onmessage = (e) => {
+    // Live updates and writes share one WebSocket (/ws) when the server has
+    // it (asgi.py); otherwise, or in browsers without WebSocket, the page uses
+    // the /stream EventSource and POST /write.
+    // Delta stream: keyframes replace the local state, deltas merge into it.
+    // Reconnects resume from the last event id.
+    let state = {}, wire = null, lastId = null, ws = null, nextId = 1, noteUntil = 0;
+    const pending = {};  // write id -> tag, until acknowledged and seen in the poll
+
+    function note(text) {
+      statusEl.textContent = text;
+      noteUntil = Date.now() + 5000;
+    }
+
+    function onEvent(raw, id) {
       try {
-        const data = JSON.parse(e.data);
-        if (data.values) updateUI(data.values);
-        if (data.error) statusEl.textContent = "Error: " + data.error;
+        const data = unpackEvent(wire, raw);
+        if (id) lastId = id;
+        if (data.values) {
+          if (data.keyframe) state = {};
+          Object.assign(state, data.values);
+          updateUI(state);
+        }
+        if (Date.now() < noteUntil) return;
+        if (data.plc && data.plc.state === "open") statusEl.textContent = "PLC offline";
+        else if (data.error) statusEl.textContent = "Error: " + data.error;
         else statusEl.textContent = "Online";
       } catch (err) {}
-    };
+    }
+
+    function onReply(m) {
+      const tag = pending[m.id];
+      if (m.type === 'ack' && (m.error || !m.confirm)) delete pending[m.id];
+      if (m.type === 'confirm') delete pending[m.id];
+      if (m.error) note("Write failed: " + m.error);
+      else if (m.type === 'confirm' && !m.ok) note("Write not confirmed by the PLC: " + tag);
+    }
+
+    function openStream() {
+      const ev = new EventSource("{{ base }}/stream?mode=delta&format=packed");
+      ev.addEventListener('schema', (e) => { wire = packedSchema(JSON.parse(e.data)); });
+      ev.onmessage = (e) => onEvent(e.data, e.lastEventId);
+    }
+
+    function openChannel() {
+      // Server messages are the /stream events as text, or JSON replies
+      let url = (location.protocol === 'https:' ? 'wss://' : 'ws://') + location.host + "{{ base }}/ws?mode=delta&format=packed";
+      if (lastId) url += "&last_id=" + encodeURIComponent(lastId);
+      const sock = new WebSocket(url);
+      let opened = false;
+      sock.onopen = () => { opened = true; ws = sock; };
+      sock.onmessage = (e) => {
+        if (e.data[0] === '{') return onReply(JSON.parse(e.data));
+        const f = {};
+        for (const line of e.data.split('\\n')) {
+          const i = line.indexOf(': ');
+          if (i > 0) f[line.slice(0, i)] = line.slice(i + 2);
+        }
+        if (f.event === 'schema') wire = packedSchema(JSON.parse(f.data));
+        else onEvent(f.data, f.id);
+      };
+      sock.onclose = () => {
+        ws = null;
+        if (opened) setTimeout(openChannel, 3000);  // dropped: reconnect and resume
+        else openStream();                          // no WebSocket endpoint here
+      };
+    }
+    if (window.WebSocket) openChannel(); else openStream();
 
     function updateStatusIndicator(id, isActive) {
       const el = document.getElementById(id);
@@ -792,31 +1202,11 @@ CONTROLS_PAGE = """
     }
 
     function updateUI(vals) {
-      // Bake Timer (B1_Bake_Time)
-      if (vals.B1_Bake_Time !== undefined) {
-        document.getElementById('disp_B1_Bake_Time').textContent = parseFloat(vals.B1_Bake_Time).toFixed(1) + " min";
-      }
-      
-      // Spray Setpoint (W00[15]) - scaled x100
-      if (vals['W00[15]'] !== undefined) {
-        document.getElementById('disp_W00_15').textContent = (vals['W00[15]'] / 100).toFixed(1) + " °F";
-      }
-
-      // Bake Setpoint (W00[13]) - scaled x100
-      if (vals['W00[13]'] !== undefined) {
-        document.getElementById('disp_W00_13').textContent = (vals['W00[13]'] / 100).toFixed(1) + " °F";
-      }
-
-      // Purge Timer (B1_Purge_Time) - minutes
-      if (vals['B1_Purge_Time'] !== undefined) {
-        document.getElementById('disp_B1_Purge_Time').textContent = parseFloat(vals['B1_Purge_Time']).toFixed(1) + " min";
-      }
-      
-      // Cooldown (TMR[6].PRE) - ms to min
-      if (vals['TMR[6].PRE'] !== undefined) {
-        let min = (vals['TMR[6].PRE'] / 60000).toFixed(1);
-        document.getElementById('disp_TMR_6_PRE').textContent = min + " min";
-      }
+      // Presets: scaled and labelled from the tag schema
+      document.querySelectorAll('.value-display[data-tag]').forEach(el => {
+        const v = vals[el.dataset.tag];
+        if (v !== undefined) el.textContent = fmt(el.dataset.tag, v);
+      });
       
       // Lights (M[3].0 status)
       const lightsOn = vals['M[3].0'] === 1;
@@ -900,12 +1290,17 @@ CONTROLS_PAGE = """
       
       let val = parseFloat(currentValStr);
       
-      // Conversions before sending
-      if (currentTag === 'W16[1]' || currentTag === 'W00[15]' || currentTag === 'W00[13]') { 
-        val = val * 100; // °F -> Scaled
+      // Entered in the schema's units (°F, min), sent in PLC units; the
+      // server checks the same limits before writing
+      const f = SCHEMA[currentTag];
+      if (f) {
+        if ((f.lo !== null && val < f.lo) || (f.hi !== null && val > f.hi)) {
+          document.getElementById('kp-display').textContent = f.lo + "-" + f.hi + " " + f.units;
+          currentValStr = "";
+          return;
+        }
+        val = val * f.scale;
       }
-      if (currentTag === 'TMR[6].PRE') val = val * 60000; // min -> ms
-      // B1_Purge_Time is already in minutes, no conversion needed.
       
       sendCmd(currentTag, val);
       kpClose();
@@ -916,99 +1311,337 @@ CONTROLS_PAGE = """
     document.addEventListener('dragstart', event => event.preventDefault());
     
     function sendCmd(tag, val, isMomentary=false) {
-      fetch('/write', {
+      if (ws) {
+        const id = nextId++;
+        pending[id] = tag;
+        ws.send(JSON.stringify({id: id, op: 'write', tag: tag, value: val, momentary: isMomentary}));
+        return;
+      }
+      fetch('{{ base }}/write', {
         method: 'POST',
         headers: {'Content-Type': 'application/json'},
         body: JSON.stringify({tag: tag, value: val, momentary: isMomentary})
-      }).catch(err => console.error("Write failed", err));
+      }).then(r => r.json()).then(d => { if (d.error) note("Write failed: " + d.error); })
+        .catch(err => console.error("Write failed", err));
     }
   </script>
 </body>
 </html>
 """
 
+# The unprefixed routes are Booth 1; /booth/<n>/... serves any booth in BOOTH_TAGS.
+def booth_or_404(booth):
+    if booth not in BOOTH_TAGS:
+        abort(404)
+    return booth
+
+def page_args(booth):
+    base = "" if booth is None else f"/booth/{booth}"
+    return {"base": base, "booth_name": BOOTH_NAMES[booth or "1"], "schema": PAGE_SCHEMA, "schema_js": SCHEMA_JS,
+            "packed_js": PACKED_JS}
+
 @app.route("/")
-def index():
-    return render_template_string(PAGE, plc_ip=PLC_IP, poll_ms=int(POLL_SEC * 1000))
+@app.route("/booth/<booth>/")
+def index(booth=None):
+    if booth is not None:
+        booth_or_404(booth)
+    return render_template_string(PAGE, plc_ip=PLC_IP, poll_ms=int(POLL_SEC * 1000), **page_args(booth))
 
 @app.route("/controls")
-def controls():
-    return render_template_string(CONTROLS_PAGE)
+@app.route("/booth/<booth>/controls")
+def controls(booth=None):
+    if booth is not None:
+        booth_or_404(booth)
+    return render_template_string(CONTROLS_PAGE, **page_args(booth))
 
 @app.route("/troubleshoot")
-def troubleshoot():
-    return render_template_string(TROUBLESHOOT_PAGE)
+@app.route("/booth/<booth>/troubleshoot")
+def troubleshoot(booth=None):
+    if booth is not None:
+        booth_or_404(booth)
+    # ?tag= explains any tag; the default is this booth's System Ready bit
+    tag = request.args.get("tag") or BOOTH_TAGS[booth or "1"].get(EXPLAIN_ROOT, EXPLAIN_ROOT)
+    # ?watch=R000.1,TMR[4].ACC adds live values for any program tags
+    watch = [t.strip() for t in request.args.get("watch", "").split(",") if t.strip()]
+    # Permissives this booth has no equivalent for are left out, not shown as Booth 1's bits
+    permissives = [k for k in TROUBLESHOOT_KEYS if k in BOOTH_TAGS[booth or "1"]]
+    watch = watch[:STREAM_MAX_TAGS - len(permissives)]
+    return render_template_string(TROUBLESHOOT_PAGE, explain_tag=tag, watch=watch, permissives=permissives,
+                                  stream_tags=",".join(permissives + watch), **page_args(booth))
 
-@app.route("/write", methods=["POST"])
-def write_tag():
+def write_command(booth, data):
+    """Validate and perform one write ({"tag", "value", "momentary"}; the tag
+    is a Booth 1 key when `booth` is set). Returns (reply, HTTP status);
+    shared by /write and the WebSocket channel."""
+    started = time.perf_counter()
     try:
-        data = request.json
         tag = data.get("tag")
         value = data.get("value")
         if not tag or value is None:
-            return jsonify({"error": "Missing tag or value"}), 400
-            
-        with PLC() as comm:
-            comm.IPAddress = PLC_IP
-            # Determine type? pylogix usually handles it, but for REALs we might need to be careful.
-            # B1_Bake_Time is REAL. W16_1 is INT. TMR_6_PRE is DINT.
-            # pylogix Write should handle it if we pass the right python type.
-            # value from JSON is likely float or int.
-            
-            res = comm.Write(tag, value)
-            if res.Status != "Success":
-                 return jsonify({"error": f"PLC Write Failed: {res.Status}"}), 500
-            
-            # Handle momentary buttons (write 1, wait, write 0)
-            if data.get("momentary"):
-                time.sleep(0.5)
-                comm.Write(tag, 0)
-                 
-        return jsonify({"status": "ok", "tag": tag, "value": value})
+            return {"error": "Missing tag or value"}, 400
+        if replay is not None:
+            return {"error": "Replaying a recording: writes are disabled"}, 409
+        if booth is not None:
+            # Booth routes take Booth 1 keys and only write that booth's tags
+            tag = BOOTH_TAGS[booth].get(tag)
+            if tag is None:
+                return {"error": f"{data.get('tag')} has no equivalent on {BOOTH_NAMES[booth]}"}, 400
+        # Only schema tags marked writable, with values inside their limits,
+        # reach the PLC; encode() also gives pylogix the python type it needs
+        field = FIELDS.get(tag)
+        if field is None or not field.writable:
+            return {"error": f"{data.get('tag')} is not writable"}, 403
+        try:
+            value = field.encode(value)
+        except ValueError as e:
+            return {"error": f"{data.get('tag')}: {e}"}, 400
+
+        # Momentary buttons: the scheduler writes 0 after the tag's pulse width,
+        # so we only wait for the on write here.
+        if data.get("momentary"):
+            fut = pulses.pulse(tag, value)
+        else:
+            fut = writer.submit(tag, value)
+        try:
+            res = fut.result(timeout=WRITE_TIMEOUT)
+        except FutureTimeout:
+            WRITE_SECONDS.observe(time.perf_counter() - started, tag)
+            return {"error": "PLC write timed out"}, 504
+        except LinkDown as e:
+            return {"error": str(e), "plc": link.report()}, 503
+        WRITE_SECONDS.observe(time.perf_counter() - started, tag)
+        if res["status"] != "Success":
+            return {"error": f"PLC Write Failed: {res['status']}",
+                    "queue_ms": res["queue_ms"], "plc_ms": res["plc_ms"]}, 500
+        # Slow-scan tags (presets) would otherwise show the old value until their next read
+        poller.refresh([tag])
+
+        # "value" is what reached the PLC; it differs from the request when a
+        # newer write to the same tag was coalesced with this one.
+        return {"status": "ok", "tag": tag, "value": res["value"],
+                "queue_ms": res["queue_ms"], "plc_ms": res["plc_ms"],
+                "coalesced": res["coalesced"]}, 200
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
+@app.route("/write", methods=["POST"])
+@app.route("/booth/<booth>/write", methods=["POST"])
+def write_tag(booth=None):
+    if booth is not None:
+        booth_or_404(booth)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    reply, status = write_command(booth, data)
+    return jsonify(reply), status
 
 @app.route("/api/read")
-def api_read():
-    # One-shot read endpoint (for debugging, not strictly needed for SSE functionality)
-    data = read_tags_once()
-    return jsonify(data)
+@app.route("/booth/<booth>/api/read")
+def api_read(booth="1"):
+    # Served from the last poll snapshot; a fresh PLC read only happens when
+    # that is older than max_age seconds (max_age=0 always reads).
+    booth = booth_or_404(booth)
+    try:
+        max_age = float(request.args.get("max_age", API_READ_MAX_AGE))
+    except ValueError:
+        return jsonify({"error": "Bad max_age"}), 400
+    snap, latest = poller.last_good, poller.latest
+    now = time.time()
+    if replay is None and (snap is None or now - snap.ts > max_age):
+        data = read_tags_once(booth)
+        if data["error"] is None or snap is None:
+            data.update(ts=now, age_sec=0.0, stale=data["error"] is not None, source="plc")
+            return jsonify(data)
+        error = data["error"]  # PLC unreachable: fall back to the last values, marked stale
+    else:
+        error = latest.error if latest is not None else None
+    if snap is None:
+        return jsonify({"values": {}, "error": error or "No data yet", "ts": None, "age_sec": None,
+                        "stale": True, "source": "replay"})
+    age = max(0.0, now - snap.ts)
+    return jsonify({"values": {key: snap.values.get(tag) for key, tag in booth_views[booth].mapping.items()},
+                    "error": error, "ts": snap.ts, "age_sec": round(age, 3),
+                    "stale": age > max_age or error is not None, "source": "snapshot"})
+
+@app.route("/api/history")
+def api_history():
+    # /api/history?tags=W16[2],W16[1]&from=-86400&to=&max_points=500&method=minmax|lttb
+    # from/to are epoch seconds; zero or negative values are relative to now.
+    # Ranges older than the in-memory ring (or source=disk) come from the historian.
+    now = time.time()
+    try:
+        tags = [t for t in request.args.get("tags", "").split(",") if t]
+        t_from = float(request.args.get("from", -3600))
+        t_to = float(request.args.get("to", 0))
+        max_points = max(3, min(int(request.args.get("max_points", 500)), 5000))
+    except ValueError:
+        return jsonify({"error": "Bad from/to/max_points"}), 400
+    method = request.args.get("method", "minmax")
+    if t_from <= 0:
+        t_from += now
+    if t_to <= 0:
+        t_to += now
+    if not tags:
+        return jsonify({"error": "Missing tags", "available": history.tags}), 400
+
+    # Disk covers whatever is older than the ring; the ring covers the rest
+    # (including samples the historian has not flushed yet).
+    source = request.args.get("source", "auto")
+    oldest = history.oldest
+    raw = {tag: ([], []) for tag in tags}
+    if source == "disk" or oldest is None or t_from < oldest:
+        disk_to = t_to if source == "disk" or oldest is None else min(t_to, oldest - 0.001)
+        for tag, (ts, vs) in historian.query(tags, t_from, disk_to).items():
+            raw[tag][0].extend(ts)
+            raw[tag][1].extend(vs)
+    if source != "disk" and oldest is not None and t_to >= oldest:
+        ts, cols = history.raw(tags, max(t_from, oldest), t_to)
+        for tag, col in cols.items():
+            raw[tag][0].extend(ts)
+            raw[tag][1].extend(col)
+    series = {tag: downsample(ts, vs, max_points, method) for tag, (ts, vs) in raw.items()}
+    return jsonify({"from": t_from, "to": t_to, "method": method,
+                    "series": {tag: {"t": ts, "v": vs} for tag, (ts, vs) in series.items()}})
+
+@app.route("/api/xref")
+def api_xref():
+    # /api/xref?tag=M[0].3 -> rungs that drive (write) and read the tag
+    tag = request.args.get("tag", "").strip()
+    if not tag:
+        return jsonify({"error": "Missing tag"}), 400
+    if xref is None:
+        return jsonify({"error": f"{L5X_FILE} not found"}), 503
+    answer = xref.lookup(tag)
+    if answer is None:
+        return jsonify({"error": f"{tag} is not referenced in the program"}), 404
+    return jsonify(answer)
+
+@app.route("/api/schema")
+def api_schema():
+    # Type, scale, units, limits and writability per Booth 1 key
+    return jsonify(PAGE_SCHEMA)
+
+@app.route("/api/tags")
+def api_tags():
+    # /api/tags?q=door -> catalog matches for autocomplete; never reads the PLC
+    current = catalog.catalog
+    if current is None:
+        return jsonify({"error": "No tag catalog yet"}), 503
+    try:
+        limit = min(int(request.args.get("limit", 20)), 200)
+    except ValueError:
+        return jsonify({"error": "Bad limit"}), 400
+    return jsonify({"tags": current.search(request.args.get("q", ""), limit), "catalog": catalog.report()})
+
+@app.route("/api/tags/refresh", methods=["POST"])
+def api_tags_refresh():
+    # Fetch the controller tag list now, e.g. right after a download
+    if replay is not None:
+        return jsonify({"error": "Replaying a recording: the PLC is not used"}), 409
+    fetched = catalog.check(force=True)
+    return jsonify({"fetched": fetched, "catalog": catalog.report()}), 200 if fetched else 502
+
+def explainer_for(tag, watch=False):
+    """Shared Explainer for a root tag, or None if the program never uses it.
+    Raises ValueError when EXPLAIN_CACHE trees are all being viewed, or, with
+    `watch` (it is about to be streamed), when its tags don't fit the watch cap."""
+    name = xref.canonical(tag) if xref is not None else None
+    if name is None:
+        return None
+    with explainers_lock:
+        e = explainers.get(name)
+        if e is None:
+            if len(explainers) >= EXPLAIN_CACHE:
+                for key in [k for k, v in explainers.items() if not v.subscriber_count]:
+                    del explainers[key]
+            if len(explainers) >= EXPLAIN_CACHE:
+                raise ValueError(f"{EXPLAIN_CACHE} interlock trees are open, try again later")
+            e = explainers[name] = Explainer(name, xref, poller)
+        if watch:
+            poller.check_watch(e.read_tags)
+    return e
+
+@app.route("/api/explain")
+def api_explain():
+    # /api/explain?tag=M[3].4 -> the rung tree behind a tag (structure only;
+    # live results come from /api/explain/stream?tag=...)
+    tag = request.args.get("tag", "").strip()
+    if not tag:
+        return jsonify({"error": "Missing tag"}), 400
+    try:
+        e = explainer_for(tag)
+    except ValueError as err:
+        return jsonify({"error": str(err)}), 400
+    if e is None:
+        return jsonify({"error": f"{tag} is not referenced in the program"}), 404
+    return jsonify(e.tree())
+
+@app.route("/api/explain/stream")
+def api_explain_stream():
+    try:
+        e = explainer_for(request.args.get("tag", "").strip(), watch=True)
+    except ValueError as err:
+        return jsonify({"error": str(err)}), 400
+    if e is None:
+        abort(404)
+    return sse_response(e)
+
+# ---- Metrics (/metrics, Prometheus text format) ----
+WRITE_SECONDS = histogram("write_seconds", "/write latency from request to PLC reply", "tag")
+YIELD_SECONDS = histogram("sse_yield_seconds", "Time handing one SSE message to the client")
+SSE_RECONNECTS = counter("sse_reconnects_total", "SSE connections resuming from a last event id")
+sse_clients = {}  # Subscriber -> client number, for the per-client gauges
+_client_numbers = itertools.count(1)
+
+
+def track_client(sub, last_id):
+    sse_clients[sub] = next(_client_numbers)
+    if last_id:
+        SSE_RECONNECTS.inc()
+
+
+gauge("sse_clients", "Connected SSE clients", lambda: len(sse_clients))
+gauge("sse_queue_depth", "Frames waiting to be sent, per SSE client",
+      lambda: {n: sub.depth for sub, n in list(sse_clients.items())}, "client")
+gauge("sse_dropped_frames", "Frames dropped because the client fell behind, per SSE client",
+      lambda: {n: sub.dropped for sub, n in list(sse_clients.items())}, "client")
+gauge("plc_link_state", "PLC connection state (1 for the current one)",
+      lambda: {s: int(link.state == s) for s in ("connected", "degraded", "open")}, "state")
+gauge("plc_circuit_opens", "Times the PLC circuit breaker has opened", lambda: link.opened)
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+def sse_response(source, codec=None):
+    # ?mode=delta sends only changed tags plus periodic keyframes; a reconnecting
+    # client passes its last event id (header or ?last_id=) to resume with a delta.
+    # With a codec (?format=packed) the schema event goes first, then packed updates.
+    mode = "delta" if request.args.get("mode") == "delta" else "full"
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_id")
 
-@app.route("/stream")
-def stream():
     def gen():
-        # Use a persistent PLC connection per client SSE stream
-        while True:
-            try:
-                with PLC() as comm:
-                    comm.IPAddress = PLC_IP
-                    while True:
-                        res = comm.Read(TAGS)
-                        values = {}
-                        for r in res:
-                            if getattr(r, "Status", "") == "Success":
-                                # For the bake timer, preserve one decimal (float). For others, cast to int.
-                                if r.TagName == "B1_Bake_Time_ACC":
-                                    try:
-                                        values[r.TagName] = round(float(r.Value), 1)
-                                    except Exception:
-                                        values[r.TagName] = 0.0
-                                else:
-                                    try:
-                                        values[r.TagName] = int(float(r.Value))
-                                    except Exception:
-                                        values[r.TagName] = 0
-                            else:
-                                values[r.TagName] = None
-                        # Send the JSON payload for this update
-                        payload = {"values": values}
-                        yield f"data: {json.dumps(payload)}\n\n"
-                        time.sleep(POLL_SEC)
-            except Exception as e:
-                # On error, send the error message then retry after a short delay
-                err_msg = {"error": str(e).splitlines()[-1]}
-                yield f"data: {json.dumps(err_msg)}\n\n"
-                time.sleep(1.5)
+        # All clients share one poller; each gets its own bounded queue
+        try:
+            sub = source.subscribe(mode, last_id, codec)
+        except ValueError as e:
+            # Lost a race for the last watch slots since the view was checked
+            yield "data: %s\n\n" % json.dumps({"error": str(e)})
+            return
+        track_client(sub, last_id)
+        try:
+            if codec is not None:
+                yield codec.schema_msg
+            while True:
+                msg = sub.next_message()
+                t = time.perf_counter()
+                yield msg
+                YIELD_SECONDS.observe(time.perf_counter() - t)
+        finally:
+            sse_clients.pop(sub, None)
+            source.unsubscribe(sub)
     return Response(gen(), headers={
         "Content-Type": "text/event-stream",
         "Cache-Control": "no-cache",
@@ -1016,30 +1649,109 @@ def stream():
         "X-Accel-Buffering": "no"
     })
 
+def tag_view(booth, spec):
+    """Shared view for /stream?tags=a,b,c: booth keys (as in TAG_SCHEMA) are
+    the booth's own tags (LookupError where it has no equivalent), any other
+    program tag is added to the scan while the view has clients. Raises LookupError for a tag the program doesn't
+    have, ValueError when over the per-client or server-wide tag caps."""
+    keys = list(dict.fromkeys(t.strip() for t in spec.split(",") if t.strip()))
+    if len(keys) > STREAM_MAX_TAGS:
+        raise ValueError(f"At most {STREAM_MAX_TAGS} tags per stream")
+    booth_tags = BOOTH_TAGS[booth]
+    mapping = {}
+    for key in keys:
+        if key in TAG_SCHEMA:
+            # A booth key: this booth's own tag or nothing, never Booth 1's
+            tag = booth_tags.get(key)
+            if tag is None:
+                raise LookupError(f"{key} has no equivalent on {BOOTH_NAMES[booth]}")
+        else:
+            tag = xref.canonical(key) if xref is not None else None
+            if tag is None:
+                raise LookupError(f"{key} is not referenced in the program")
+        mapping[key] = tag
+    cache_key = (booth, tuple(mapping.items()))
+    with tag_views_lock:
+        poller.check_watch(mapping.values())
+        view = tag_views.get(cache_key)
+        if view is None:
+            if len(tag_views) >= TAG_VIEW_CACHE:
+                for k in [k for k, v in tag_views.items() if not v.subscriber_count]:
+                    del tag_views[k]
+            view = tag_views[cache_key] = WatchView(poller, mapping)
+    return view
+
+def wire_type(tag):
+    """PLC type of a streamed tag for the packed encoding; None when unknown."""
+    f = FIELDS.get(tag)
+    if f is not None:
+        return f.type
+    addr = parse_address(tag)
+    if addr is not None:
+        return "BOOL" if addr[2] is not None else WORD_TYPES.get(addr[0])
+    member = tag.rpartition(".")[2]
+    if member in ("DN", "EN", "TT"):
+        return "BOOL"
+    if member in ("ACC", "PRE"):
+        return "DINT"
+    return xref.types.get(tag) if xref is not None else None
+
+
+def packed_codec(view):
+    """The view's PackedCodec (?format=packed), built on first use."""
+    with tag_views_lock:
+        if view.codec is None:
+            types = [wire_type(view.mapping[key]) for key in view.tags]
+            decimals = [(FIELDS[view.mapping[key]].decimals if view.mapping[key] in FIELDS else 1)
+                        if t == "REAL" else None for key, t in zip(view.tags, types)]
+            view.codec = PackedCodec(view.tags, types, decimals)
+    return view.codec
+
+@app.route("/stream")
+@app.route("/booth/<booth>/stream")
+def stream(booth="1"):
+    # ?tags=a,b,c streams just those tags instead of the whole booth;
+    # ?format=packed sends positional binary updates (wire.py) instead of JSON
+    booth = booth_or_404(booth)
+    spec = request.args.get("tags")
+    try:
+        view = tag_view(booth, spec) if spec else booth_views[booth]
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return sse_response(view, packed_codec(view) if request.args.get("format") == "packed" else None)
+
 @app.route("/health")
 def health():
-    return {"ok": True, "service": "booth-dashboard", "status": "online", "plc_ip": PLC_IP}
+    return {"ok": True, "service": "booth-dashboard", "status": "online", "plc_ip": PLC_IP,
+            "plc": link.report(),
+            "replay": replay and {"file": REPLAY_FILE, "speed": REPLAY_SPEED, "passes": replay.passes,
+                                  "done": replay.done.is_set()},
+            "recorder": poller.recorder and {"dir": RECORD_DIR, "passes": poller.recorder.passes},
+            "scan_classes": poller.report(),
+            "explainers": {tag: {"viewers": e.subscriber_count, "read_tags": len(e.read_tags),
+                                 "evaluations": e.evaluations} for tag, e in list(explainers.items())},
+            "catalog": catalog.report(),
+            "watched": {"tags": len(poller.watched), "max": WATCH_MAX_TAGS,
+                        "views": sum(1 for v in list(tag_views.values()) if v.subscriber_count)}}
 
-def read_tags_once():
-    """Helper function to read all tags once (for /api/read or debugging)."""
+def read_tags_once(booth="1"):
+    """Helper function to read one booth's tags once (for /api/read or debugging)."""
     output = {"values": {}, "error": None}
     try:
+        link.check()
         with PLC() as comm:
             comm.IPAddress = PLC_IP
-            res = comm.Read(TAGS)
-            for r in res:
-                if getattr(r, "Status", "") == "Success":
-                    if r.TagName == "B1_Bake_Time_ACC":
-                        output["values"][r.TagName] = round(float(r.Value), 1)
-                    else:
-                        try:
-                            output["values"][r.TagName] = int(float(r.Value))
-                        except Exception:
-                            output["values"][r.TagName] = 0
-                else:
-                    output["values"][r.TagName] = None
+            mapping = booth_views[booth].mapping
+            raw = poller.read_once(comm, mapping.values())
+            output["values"] = {key: raw.get(tag) for key, tag in mapping.items()}
+        link.ok()
+    except LinkDown as e:
+        output["error"] = str(e)
     except Exception as e:
-        output["error"] = str(e).splitlines()[-1]
+        output["error"] = error_text(e)
+        link.failed(output["error"])
     return output
 
 if __name__ == "__main__":
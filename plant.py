@@ -0,0 +1,439 @@
+"""Plant gateway: one service polling every booth controller.
+
+    python3 plant.py                      # serve the overview on :5001
+    python3 plant.py loadtest [n] [dead] [seconds]
+
+The controllers come from a JSON file, plcs.json next to this one or the
+path in PAINTBOOTH_PLCS:
+
+    [{"name": "booth12", "ip": "192.168.1.10"}, {"name": "booth34", "ip": "192.168.1.11", "port": 44818}]
+
+Each controller keeps its own PLC session and ReadPlan, but the scans run on
+one bounded thread pool driven by a single fixed-rate tick, so thread count
+and CPU stay flat however many controllers are configured. A controller that
+is still busy (or backing off after a failure) is skipped for the tick
+instead of queueing more work, and every session has a short socket timeout,
+so one dead PLC costs at most one worker for `timeout` seconds and never
+delays the others. Failed controllers back off exponentially (LinkHealth),
+so a few dead ones can't keep the pool busy with retries. Each tick publishes one merged snapshot to /plant/stream.
+"""
+import json, os, resource, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, abort, jsonify, render_template_string, request
+from pylogix import PLC
+from link import LinkHealth, check_responses
+from poller import Broadcaster, error_text
+from readplan import ReadPlan
+
+# Controllers polled by the gateway: name, IP and (optionally) EtherNet/IP port
+PLCS_FILE = os.environ.get("PAINTBOOTH_PLCS",
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), "plcs.json"))
+DEFAULT_PLCS = [{"name": "booth12", "ip": "192.168.1.10"}]  # when there is no PLCS_FILE
+# Per-controller overview tags (Booth 1 addresses; see BOOTH_TAGS in paintbooth.py)
+OVERVIEW_TAGS = [
+    "M[0].0",            # System ON
+    "M[0].9",            # System Ready
+    "M[40].0",           # Heat ENABLED
+    "M[0].11",           # Bake Cycle Active
+    "M[40].4",           # Cooldown Active
+    "W16[2]",            # Current Temperature (x100)
+    "W16[1]",            # PID Setpoint (x100)
+    "B1_Bake_Time_ACC",  # Bake Timer (min)
+]
+WORD_TYPES = {"M": "INT", "W16": "INT", "W00": "INT"}
+POLL_SEC = 1.0      # plant tick
+PLC_TIMEOUT = 2.0   # socket timeout per controller; a dead PLC holds a worker this long at most
+POLL_WORKERS = 8    # scans in flight at once across all controllers
+
+app = Flask(__name__)
+
+
+def load_plcs(path=PLCS_FILE):
+    """The controller list from `path`, or DEFAULT_PLCS if it doesn't exist.
+    Raises ValueError for a malformed file."""
+    try:
+        with open(path) as f:
+            plcs = json.load(f)
+    except FileNotFoundError:
+        return [dict(p) for p in DEFAULT_PLCS]
+    names = set()
+    for p in plcs if isinstance(plcs, list) else [None]:
+        if not (isinstance(p, dict) and isinstance(p.get("name"), str) and isinstance(p.get("ip"), str)
+                and isinstance(p.get("port", 44818), int)) or p["name"] in names:
+            raise ValueError(f"{path}: expected a list of {{\"name\", \"ip\", \"port\"?}} with unique names")
+        names.add(p["name"])
+    return plcs
+
+
+def decode_values(res):
+    """REALs to one decimal, everything else to int, failed reads to None."""
+    values = {}
+    for r in res:
+        v = r.Value if getattr(r, "Status", "") == "Success" else None
+        if isinstance(v, float):
+            v = round(v, 1)
+        elif v is not None:
+            try:
+                v = int(v)
+            except Exception:
+                v = None
+        values[r.TagName] = v
+    return values
+
+
+class Controller(Broadcaster):
+    """One PLC in the plant. scan() runs a single read on the caller's thread
+    (a pool worker) and publishes the result; it never loops or sleeps."""
+
+    def __init__(self, name, ip, tags, decode, word_types=None, port=44818, timeout=2.0, queue_size=4):
+        self.plan = ReadPlan(tags, word_types)
+        super().__init__(self.plan.tags, queue_size)
+        self.name = name
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+        self.decode = decode
+        self.online = False
+        self.busy = False
+        self.health = LinkHealth()  # backoff between attempts while it keeps failing
+        self.scan_ms = None
+        self.scans = 0
+        self.failures = 0
+        self._comm = None
+
+    def _session(self):
+        if self._comm is None:
+            self._comm = PLC(self.ip, timeout=self.timeout, port=self.port)
+        return self._comm
+
+    def _drop_session(self):
+        if self._comm is not None:
+            try:
+                self._comm.Close()
+            except Exception:
+                pass
+            self._comm = None
+
+    def scan(self):
+        started = time.monotonic()
+        try:
+            res = self.plan.read(self._session())
+            check_responses(res)  # pylogix reports a dead link as a status
+            values = self.decode(res)
+        except Exception as e:
+            self._drop_session()
+            self.online = False
+            self.failures += 1
+            self.health.failed(error_text(e))
+            self._publish(error=error_text(e))
+        else:
+            self.online = True
+            self.health.ok()
+            self._publish(values=values)
+        finally:
+            self.scans += 1
+            self.scan_ms = round((time.monotonic() - started) * 1000, 1)
+            self.busy = False
+
+    def report(self):
+        return {
+            "ip": self.ip,
+            "port": self.port,
+            "online": self.online,
+            "error": self.latest.error if self.latest else None,
+            "scan_ms": self.scan_ms,
+            "scans": self.scans,
+            "failures": self.failures,
+            "retry_in": self.health.report()["retry_in"],
+            "requests_per_scan": len(self.plan.requests),
+        }
+
+
+class PlantPoller(Broadcaster):
+    """Drives every Controller from one tick thread and a bounded pool, and
+    broadcasts the merged plant snapshot as {"<controller>/<tag>": value}
+    plus "<controller>/online"."""
+
+    def __init__(self, controllers, interval, workers=8, queue_size=4):
+        self.controllers = {c.name: c for c in controllers}
+        keys = []
+        for c in controllers:
+            keys += [f"{c.name}/{tag}" for tag in c.tags] + [f"{c.name}/online"]
+        super().__init__(keys, queue_size)
+        self.interval = interval
+        self.workers = workers
+        self.cycles = 0
+        self.overruns = 0    # ticks that started late by more than one interval
+        self.skipped = 0     # controller scans skipped because the last one was still running
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plant-scan")
+        self._thread = None
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="plant-poller", daemon=True)
+            self._thread.start()
+
+    def _dispatch(self):
+        for c in self.controllers.values():
+            if c.busy:
+                self.skipped += 1
+            elif not c.health.retry_in():
+                c.busy = True
+                self._pool.submit(c.scan)
+
+    def _merge(self):
+        values = {}
+        for c in self.controllers.values():
+            frame = c.latest
+            got = frame.values if frame is not None and frame.values is not None else {}
+            for tag in c.tags:
+                values[f"{c.name}/{tag}"] = got.get(tag)
+            values[f"{c.name}/online"] = int(c.online)
+        return values
+
+    def _run(self):
+        due = time.monotonic()
+        while True:
+            self._dispatch()
+            # Results that land after this point go out with the next tick
+            self._publish(values=self._merge())
+            self.cycles += 1
+            due += self.interval
+            delay = due - time.monotonic()
+            if delay < -self.interval:
+                self.overruns += 1
+                due = time.monotonic()  # fell behind: drop the missed ticks, keep the rate
+            elif delay > 0:
+                time.sleep(delay)
+
+    def report(self):
+        return {
+            "controllers": len(self.controllers),
+            "online": sum(c.online for c in self.controllers.values()),
+            "workers": self.workers,
+            "interval_sec": self.interval,
+            "cycles": self.cycles,
+            "overruns": self.overruns,
+            "skipped_scans": self.skipped,
+            "plcs": {name: c.report() for name, c in self.controllers.items()},
+        }
+
+
+def build(plcs, tags=OVERVIEW_TAGS, interval=POLL_SEC, workers=POLL_WORKERS, timeout=PLC_TIMEOUT):
+    controllers = [
+        Controller(p["name"], p["ip"], tags, decode_values, WORD_TYPES, p.get("port", 44818), timeout)
+        for p in plcs
+    ]
+    return PlantPoller(controllers, interval, workers)
+
+
+PLCS = load_plcs()
+plant = build(PLCS)
+
+PLANT_PAGE = """
+<!doctype html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>Paint Booths - Plant Overview</title>
+  <meta name="viewport" content="width=device-width,initial-scale=1">
+  <style>
+    :root { color-scheme: dark; }
+    body {
+      background: #0b0e13;
+      color: #e6e6e6;
+      font-family: ui-monospace, SFMono-Regular, Menlo, Consolas, monospace;
+      margin: 0;
+      padding: 2vh 2vw;
+    }
+    h1 { font-size: 4vh; margin: 0 0 2vh 0; }
+    .grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(260px, 1fr)); gap: 12px; }
+    .card { background: #151a22; border: 2px solid #2a3140; border-radius: 8px; padding: 10px 14px; }
+    .card.offline { border-color: #a33; opacity: 0.7; }
+    .card h2 { font-size: 1.1em; margin: 0 0 8px 0; display: flex; justify-content: space-between; }
+    .row { display: flex; justify-content: space-between; padding: 2px 0; }
+    .on { color: #3c3; } .off { color: #888; }
+    .err { color: #e55; font-size: 0.8em; min-height: 1em; }
+    #status { color: #888; font-size: 0.8em; }
+  </style>
+</head>
+<body>
+  <h1>Plant Overview <span id="status"></span></h1>
+  <div class="grid">
+    {% for name in names %}
+    <div class="card offline" id="card-{{ name }}">
+      <h2>{{ name }} <span data-k="{{ name }}/online">--</span></h2>
+      <div class="row"><span>System</span><span data-k="{{ name }}/M[0].0" data-bit="ON">--</span></div>
+      <div class="row"><span>Ready</span><span data-k="{{ name }}/M[0].9" data-bit="READY">--</span></div>
+      <div class="row"><span>Heat</span><span data-k="{{ name }}/M[40].0" data-bit="ENABLED">--</span></div>
+      <div class="row"><span>Bake</span><span data-k="{{ name }}/M[0].11" data-bit="ACTIVE">--</span></div>
+      <div class="row"><span>Cooldown</span><span data-k="{{ name }}/M[40].4" data-bit="ACTIVE">--</span></div>
+      <div class="row"><span>Temp</span><span data-k="{{ name }}/W16[2]" data-temp="1">--</span></div>
+      <div class="row"><span>Setpoint</span><span data-k="{{ name }}/W16[1]" data-temp="1">--</span></div>
+      <div class="row"><span>Bake Timer</span><span data-k="{{ name }}/B1_Bake_Time_ACC" data-min="1">--</span></div>
+      <div class="err" id="err-{{ name }}"></div>
+    </div>
+    {% endfor %}
+  </div>
+  <script>
+    const state = {};
+    const cells = {};
+    document.querySelectorAll("[data-k]").forEach(el => { cells[el.dataset.k] = el; });
+
+    function show(key, val) {
+      const el = cells[key];
+      if (!el) return;
+      if (key.endsWith("/online")) {
+        const name = key.slice(0, -7);
+        document.getElementById("card-" + name).classList.toggle("offline", val !== 1);
+        el.textContent = val === 1 ? "ONLINE" : "OFFLINE";
+        el.className = val === 1 ? "on" : "off";
+      } else if (val === null || val === undefined) {
+        el.textContent = "--";
+        el.className = "off";
+      } else if (el.dataset.bit) {
+        el.textContent = val === 1 ? el.dataset.bit : "OFF";
+        el.className = val === 1 ? "on" : "off";
+      } else if (el.dataset.temp) {
+        el.textContent = (val / 100.0).toFixed(1) + " °F";
+        el.className = "";
+      } else if (el.dataset.min) {
+        el.textContent = parseFloat(val).toFixed(1) + " min";
+        el.className = "";
+      } else {
+        el.textContent = val;
+      }
+    }
+
+    let lastId = null;
+    function connect() {
+      let url = "/plant/stream?mode=delta";
+      if (lastId) url += "&last_id=" + encodeURIComponent(lastId);
+      const ev = new EventSource(url);
+      ev.onmessage = (e) => {
+        lastId = e.lastEventId || lastId;
+        const data = JSON.parse(e.data);
+        if (data.error) { document.getElementById("status").textContent = data.error; return; }
+        document.getElementById("status").textContent = "";
+        if (data.keyframe) {
+          for (const k in state) delete state[k];
+        }
+        Object.assign(state, data.values);
+        for (const k in data.values) show(k, data.values[k]);
+      };
+      ev.onerror = () => {
+        document.getElementById("status").textContent = "(reconnecting)";
+        ev.close();
+        setTimeout(connect, 2000);
+      };
+    }
+    connect();
+    // Per-controller errors change rarely; poll them from /plant/health
+    function errors() {
+      fetch("/plant/health").then(r => r.json()).then(h => {
+        for (const name in h.plant.plcs) {
+          const el = document.getElementById("err-" + name);
+          if (el) el.textContent = h.plant.plcs[name].error || "";
+        }
+      }).catch(() => {});
+    }
+    errors();
+    setInterval(errors, 5000);
+  </script>
+</body>
+</html>
+"""
+
+
+@app.route("/")
+def overview():
+    return render_template_string(PLANT_PAGE, names=list(plant.controllers))
+
+
+def sse_response(source):
+    mode = "delta" if request.args.get("mode") == "delta" else "full"
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_id")
+
+    def gen():
+        sub = source.subscribe(mode, last_id)
+        try:
+            while True:
+                yield sub.next_message()
+        finally:
+            source.unsubscribe(sub)
+
+    return Response(gen(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@app.route("/plant/stream")
+def plant_stream():
+    return sse_response(plant)
+
+
+@app.route("/plant/<name>/stream")
+def controller_stream(name):
+    if name not in plant.controllers:
+        abort(404)
+    return sse_response(plant.controllers[name])
+
+
+@app.route("/plant/health")
+def plant_health():
+    return jsonify({"ok": True, "service": "plant", "plant": plant.report()})
+
+
+def loadtest(n=30, dead=2, seconds=30.0, base_port=44818):
+    """Poll `n` cpppo emulators (run_demo.py's tag set) plus `dead` unreachable
+    controllers through one PlantPoller, and report tick rate, scan latency,
+    process CPU and thread count."""
+    from run_demo import TAGS_DEF, start_emulator
+    tags = [t.split("=")[0] for t in TAGS_DEF[:8]]
+    plcs = [{"name": f"emu{i}", "ip": "127.0.0.1", "port": base_port + i} for i in range(n)]
+    # TEST-NET addresses never answer, so these exercise the timeout path
+    plcs += [{"name": f"dead{i}", "ip": f"192.0.2.{i + 1}"} for i in range(dead)]
+    procs = [start_emulator(base_port + i) for i in range(n)]
+    try:
+        time.sleep(2.0)
+        p = build(plcs, tags)
+        sub = p.subscribe("delta")
+        cpu0, wall0 = time.process_time(), time.monotonic()
+        frames, gaps, last = 0, [], None
+        while time.monotonic() - wall0 < seconds:
+            try:
+                sub.get(timeout=1.0)
+            except Exception:
+                continue
+            now = time.monotonic()
+            if last is not None:
+                gaps.append(now - last)
+            last, frames = now, frames + 1
+        cpu, wall = time.process_time() - cpu0, time.monotonic() - wall0
+        p.unsubscribe(sub)
+        scan = sorted(c.scan_ms for c in p.controllers.values() if c.online and c.scan_ms is not None)
+        gaps.sort()
+        report = p.report()
+        print(f"controllers: {n} emulated + {dead} dead, {p.workers} workers, {p.interval}s tick")
+        print(f"online: {report['online']}/{report['controllers']}")
+        print(f"frames: {frames} in {wall:.1f}s ({frames / wall:.2f}/s), overruns: {report['overruns']}")
+        if gaps:
+            print(f"tick gap ms: p50 {gaps[len(gaps) // 2] * 1000:.0f}  max {gaps[-1] * 1000:.0f}")
+        if scan:
+            print(f"scan ms (online): p50 {scan[len(scan) // 2]}  max {scan[-1]}")
+        print(f"skipped scans (controller still busy): {report['skipped_scans']}")
+        print(f"cpu: {cpu / wall * 100:.1f}% of one core, threads: {threading.active_count()}, "
+              f"max rss: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} MB")
+    finally:
+        for proc in procs:
+            proc.terminate()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["loadtest"]:
+        args = sys.argv[2:]
+        loadtest(int(args[0]) if args else 30, int(args[1]) if len(args) > 1 else 2,
+                 float(args[2]) if len(args) > 2 else 30.0)
+    else:
+        app.run(host="0.0.0.0", port=5001, debug=False, threaded=True)
@@ -0,0 +1,644 @@
+"""Shared PLC poller: one read loop per controller, fanned out to every subscriber."""
+import collections, json, os, queue, threading, time
+from pylogix import PLC
+from pylogix.lgx_response import Response
+from link import LinkHealth, check_responses, tag_error
+from metrics import counter, histogram
+from readplan import ReadPlan
+from wire import DELTA, KEYFRAME
+
+RETRY_SEC = 1.5     # delay before reconnecting after a PLC error
+KEYFRAME_SEC = 30.0  # delta streams get a full snapshot at least this often
+RESUME_FRAMES = 120  # frames kept so a reconnecting client can catch up with a delta
+STATS_READS = 240    # scheduled reads per scan class kept for rate/jitter stats
+
+READ_SECONDS = histogram("plc_read_seconds", "PLC read round trip per scan class", "scan_class")
+DECODE_SECONDS = histogram("plc_decode_seconds", "Responses -> values decode time")
+ENCODE_SECONDS = histogram("sse_encode_seconds", "JSON serialization of one SSE message")
+BAD_STATUS = counter("plc_read_errors_total", "Tag reads that returned a non-Success status", "tag")
+CONNECTS = counter("plc_sessions_total", "PLC sessions opened by the poller")
+
+
+def error_text(e):
+    """Last line of an exception message, as shown to the HMI."""
+    lines = str(e).splitlines()
+    return lines[-1] if lines else type(e).__name__
+
+
+def sse(event_id, payload):
+    started = time.perf_counter()
+    msg = f"id: {event_id}\ndata: {json.dumps(payload)}\n\n"
+    ENCODE_SECONDS.observe(time.perf_counter() - started)
+    return msg
+
+
+class Frame:
+    """One poll cycle. Each SSE form is encoded lazily and cached, so it is
+    serialized at most once per cycle however many clients want it."""
+
+    __slots__ = ("seq", "id", "ts", "values", "changed", "error", "status", "keyframe", "_full", "_key", "_delta",
+                 "_packed")
+
+    def __init__(self, seq, event_id, values=None, changed=None, error=None, keyframe=False, ts=None, status=None):
+        self.seq = seq
+        self.id = event_id
+        self.ts = time.time() if ts is None else ts
+        self.values = values
+        self.changed = changed
+        self.error = error
+        self.status = status  # connection health sent with an error, e.g. {"state": "open", ...}
+        self.keyframe = keyframe
+        self._full = self._key = self._delta = None
+        self._packed = None
+
+    def full_msg(self):
+        if self._full is None:
+            payload = {"error": self.error} if self.error is not None else {"values": self.values}
+            if self.status is not None:
+                payload["plc"] = self.status
+            self._full = sse(self.id, payload)
+        return self._full
+
+    def keyframe_msg(self):
+        if self._key is None:
+            self._key = sse(self.id, {"values": self.values, "keyframe": True})
+        return self._key
+
+    def delta_msg(self):
+        if self._delta is None:
+            self._delta = sse(self.id, {"values": self.changed, "delta": True})
+        return self._delta
+
+    def packed_msg(self, codec, flags):
+        # A frame belongs to one broadcaster, so every packed client has its codec
+        if self._packed is None:
+            self._packed = {}
+        msg = self._packed.get(flags)
+        if msg is None:
+            started = time.perf_counter()
+            msg = self._packed[flags] = codec.message(self.id, self.changed if flags & DELTA else self.values, flags)
+            ENCODE_SECONDS.observe(time.perf_counter() - started)
+        return msg
+
+
+class Subscriber:
+    """Per-client bounded queue. When the client falls behind, the oldest
+    update is dropped so the poll loop never waits on a slow browser.
+
+    In "delta" mode only changed tags are sent; a keyframe goes out on
+    connect, on the poller's keyframe interval, and whenever this client
+    missed a frame (dropped or reconnected) so its merged state stays exact.
+    In "full" mode every update is the whole snapshot, so it goes out at most
+    once per `full_interval` seconds (set from the broadcaster) rather than
+    on every fast-class pass. With a `codec` (wire.PackedCodec) updates are
+    packed instead of JSON.
+    """
+
+    def __init__(self, maxsize=4, mode="full", codec=None):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.mode = mode
+        self.codec = codec
+        self.dropped = 0
+        self.last_seq = None
+        self.pending = None  # message to send before the first queued frame
+        self.full_interval = None
+        self._full_ts = None
+
+    def put(self, item):
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        return self.queue.get(timeout=timeout)
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    def encode(self, frame):
+        """SSE message for `frame` in this client's mode, or None to skip it."""
+        if self.last_seq is not None and frame.seq <= self.last_seq:
+            return None  # already covered by a resume delta
+        in_order = self.last_seq is not None and frame.seq == self.last_seq + 1
+        self.last_seq = frame.seq
+        if frame.error is not None:
+            return frame.full_msg()
+        if self.mode != "delta":
+            # 10% slack, as in Sampler, so a frame landing a little early isn't held a whole pass
+            if self.full_interval and self._full_ts is not None and frame.ts - self._full_ts < self.full_interval * 0.9:
+                return None
+            self._full_ts = frame.ts
+            return frame.full_msg() if self.codec is None else frame.packed_msg(self.codec, 0)
+        if frame.keyframe or not in_order:
+            return frame.keyframe_msg() if self.codec is None else frame.packed_msg(self.codec, KEYFRAME)
+        return frame.delta_msg() if self.codec is None else frame.packed_msg(self.codec, DELTA)
+
+    def next_message(self, timeout=None):
+        """Block for the next frame and return it encoded for this client."""
+        if self.pending is not None:
+            msg, self.pending = self.pending, None
+            return msg
+        while True:
+            msg = self.encode(self.get(timeout))
+            if msg is not None:
+                return msg
+
+
+class Broadcaster:
+    """Turns a series of value snapshots into Frames (sequence ids, deltas,
+    keyframes, resume history) and hands each one to every listener."""
+
+    full_interval = None  # seconds between snapshots for "full" mode subscribers
+
+    def __init__(self, tags, queue_size=4):
+        self.tags = list(tags)
+        self.queue_size = queue_size
+        self.epoch = int(time.time())  # event ids from a previous process never resume
+        self.latest = None  # last Frame
+        self.codec = None   # wire.PackedCodec for ?format=packed clients, built on first use
+        self._seq = 0
+        self._values = None
+        self._last_key = 0.0
+        self._recent = collections.deque(maxlen=RESUME_FRAMES)
+        self._subs = set()
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """Called (with the lock held) whenever a listener attaches."""
+
+    def _stop(self):
+        """Called (with the lock held) when the last listener detaches."""
+
+    def subscribe(self, mode="full", last_id=None, codec=None):
+        sub = Subscriber(self.queue_size, mode, codec)
+        self.attach(sub, last_id)
+        return sub
+
+    def attach(self, listener, last_id=None, prime=True):
+        """Register anything with a put(frame) method; new frames are handed
+        to it from the poll thread. With `prime`, it first gets the latest
+        frame (or a resume delta) so the client isn't blank until the next poll."""
+        with self._lock:
+            self._subs.add(listener)
+            if prime:
+                self._prime(listener, last_id)
+            try:
+                self._start()
+            except Exception:
+                self._subs.discard(listener)  # e.g. a watch over the cap
+                raise
+
+    def prime(self, sub, last_id=None):
+        """Give a subscriber fed through some other listener its first frame."""
+        with self._lock:
+            self._prime(sub, last_id)
+
+    def _prime(self, sub, last_id):
+        if isinstance(sub, Subscriber):
+            sub.full_interval = self.full_interval
+        if getattr(sub, "mode", None) == "delta" and last_id:
+            self._resume(sub, last_id)
+        if self.latest is not None:
+            sub.put(self.latest)
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+            if not self._subs:
+                self._stop()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subs)
+
+    def _resume(self, sub, last_id):
+        # Called with the lock held. Rebuild the tags changed since `last_id`
+        # from the recent frames; if they have rolled off, fall back to a keyframe.
+        try:
+            epoch, seq = (int(x) for x in last_id.split("-", 1))
+        except ValueError:
+            return
+        latest = self.latest
+        if epoch != self.epoch or latest is None or latest.values is None or seq > latest.seq:
+            return
+        missed = [f for f in self._recent if f.seq > seq]
+        if len(missed) != latest.seq - seq or any(f.changed is None for f in missed):
+            return
+        keys = set()
+        for f in missed:
+            keys.update(f.changed)
+        values = {k: latest.values[k] for k in keys}
+        codec = getattr(sub, "codec", None)
+        sub.pending = (sse(latest.id, {"values": values, "delta": True}) if codec is None
+                       else codec.message(latest.id, values, DELTA))
+        sub.last_seq = latest.seq
+
+    def _publish(self, values=None, error=None, ts=None, status=None):
+        self._seq += 1
+        event_id = f"{self.epoch}-{self._seq}"
+        if error is not None:
+            frame = Frame(self._seq, event_id, error=error, ts=ts, status=status)
+            self._values = None  # force a keyframe once reads recover
+        else:
+            now = time.monotonic()
+            prev = self._values
+            keyframe = prev is None or now - self._last_key >= KEYFRAME_SEC
+            if keyframe:
+                self._last_key = now
+            changed = None
+            if prev is not None:
+                changed = {k: v for k, v in values.items() if k not in prev or prev[k] != v}
+            frame = Frame(self._seq, event_id, values, changed, keyframe=keyframe, ts=ts)
+            self._values = values
+        with self._lock:
+            self.latest = frame
+            self._recent.append(frame)
+            subs = list(self._subs)
+        for sub in subs:
+            sub.put(frame)
+        return frame
+
+
+class ScanClass:
+    """Tags read together every `period` seconds, with achieved-rate and
+    jitter statistics over the last STATS_READS scheduled reads."""
+
+    def __init__(self, name, period, tags, word_types=None):
+        self.name = name
+        self.period = period
+        self.word_types = word_types
+        self.plan = ReadPlan(tags, word_types)
+        self.due = 0.0          # monotonic time of the next scheduled read
+        self.refresh = False    # read on the next pass, outside the schedule
+        self.reads = 0
+        self.failed = False     # every tag of the last read came back with a tag error
+        self.refreshes = 0      # extra reads requested by refresh()
+        self.overruns = 0       # scheduled reads dropped because the loop fell behind
+        self.read_ms = None
+        self._starts = collections.deque(maxlen=STATS_READS)
+        self._late = collections.deque(maxlen=STATS_READS)  # start - due, seconds
+
+    def replan(self, tags):
+        self.plan = ReadPlan(tags, self.word_types)
+
+    def scheduled(self, now, started, finished):
+        """Book a scheduled read that was due at self.due and ran from
+        `started` to `finished`, and move the schedule on by one period."""
+        self.reads += 1
+        self.read_ms = (finished - started) * 1000
+        self._starts.append(started)
+        self._late.append(max(0.0, started - self.due))
+        self.due += self.period
+        if self.due < now - self.period:
+            self.overruns += 1
+            self.due = now  # fell behind: drop the missed reads, keep the rate
+
+    def report(self):
+        starts, late = list(self._starts), list(self._late)
+        rate = None
+        if len(starts) > 1 and starts[-1] > starts[0]:
+            rate = round((len(starts) - 1) / (starts[-1] - starts[0]), 3)
+        return {
+            "period_sec": self.period,
+            "tags": len(self.plan.tags),
+            "reads": self.reads,
+            "rate_hz": rate,
+            "target_hz": round(1.0 / self.period, 3),
+            "jitter_ms": {"mean": round(sum(late) / len(late) * 1000, 1) if late else None,
+                          "max": round(max(late) * 1000, 1) if late else None},
+            "read_ms": self.read_ms and round(self.read_ms, 1),
+            "overruns": self.overruns,
+            "refreshes": self.refreshes,
+            "failed": self.failed,
+            "read_plan": self.plan.report(),
+        }
+
+
+class TagPoller(Broadcaster):
+    """Reads `tags` from one PLC on a background thread and broadcasts each
+    snapshot, as a Frame, to all subscribers.
+
+    `classes` ({name: (period, tags)}) puts tags on their own read rates;
+    everything else, plus watched tags, is read every `interval` seconds in
+    the "default" class. Reads run on a fixed-rate schedule (the period does
+    not stretch by the read time), and every pass that reads anything
+    publishes the merged snapshot. Reconnects follow `health` (a LinkHealth,
+    usually shared with the writer).
+
+    With a `recorder` (see replay.py) the raw word reads of every pass are
+    recorded; with `replaying` set, nothing is read and feed() supplies the
+    raw reads instead.
+
+    `max_watched` caps the extra tags watch() may add across all watchers."""
+
+    def __init__(self, ip, tags, interval, decode, word_types=None, queue_size=4, classes=None, health=None,
+                 max_watched=None):
+        self.ip = ip
+        self.health = health or LinkHealth()
+        self.word_types = word_types
+        tags = list(dict.fromkeys(tags))
+        self.classes = {}
+        listed = set()
+        for name, (period, class_tags) in (classes or {}).items():
+            class_tags = [t for t in dict.fromkeys(class_tags) if t in tags and t not in listed]
+            listed.update(class_tags)
+            self.classes[name] = ScanClass(name, period, class_tags, word_types)
+        self.default = ScanClass("default", interval, [t for t in tags if t not in listed], word_types)
+        self.classes["default"] = self.default
+        super().__init__(tags, queue_size)
+        self.interval = interval
+        self.full_interval = interval  # the fast classes still reach full clients, at the poll rate
+        self.decode = decode  # list of pylogix Responses -> {tag: value}
+        self._watched = collections.Counter()  # extra tags -> number of watchers
+        self.max_watched = max_watched
+        self._replan = False
+        self._snapshot = {}
+        self.last_good = None  # last Frame with values, kept through read errors
+        self.recorder = None   # gets each pass's raw reads (replay.Recorder)
+        self.replaying = False  # raw reads come from feed(), not the PLC
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def plan(self):
+        return self.default.plan
+
+    def check_watch(self, tags):
+        """Raise ValueError if watching `tags` now would go over max_watched."""
+        with self._lock:
+            self._check_room(tags)
+
+    def _check_room(self, tags):
+        # Called with the lock held, so the check and watch()'s update are one step
+        if self.max_watched is None:
+            return
+        new = {t for t in tags if t not in self.tags and t not in self._watched}
+        if len(self._watched) + len(new) > self.max_watched:
+            raise ValueError(f"Too many tags being watched ({len(self._watched)} of {self.max_watched}), "
+                             "try again later")
+
+    def watch(self, tags):
+        """Add `tags` to the scan until a matching unwatch(); reference counted,
+        so overlapping watchers share one read. Takes effect on the next scan.
+        Raises ValueError, watching nothing, when over max_watched."""
+        tags = list(tags)
+        with self._lock:
+            self._check_room(tags)
+            self._watched.update(t for t in dict.fromkeys(tags) if t not in self.tags)
+            self._replan = True
+        self._wake.set()  # read the new tags now rather than at the next due class
+
+    def unwatch(self, tags):
+        with self._lock:
+            self._watched.subtract(t for t in dict.fromkeys(tags) if t not in self.tags)
+            self._watched += collections.Counter()  # drop tags nobody watches
+            self._replan = True
+
+    @property
+    def watched(self):
+        """Extra tags currently in the scan, with their watcher counts."""
+        return dict(self._watched)
+
+    def refresh(self, tags):
+        """Re-read the classes holding any of `tags` now (e.g. a preset just
+        written), without moving their schedule."""
+        tags = set(tags)
+        hit = False
+        for c in self.classes.values():
+            if tags.intersection(c.plan.tags):
+                c.refresh = hit = True
+        if hit:
+            self._wake.set()
+
+    def _current_classes(self):
+        with self._lock:
+            if self._replan:
+                self._replan = False
+                listed = {t for c in self.classes.values() if c is not self.default for t in c.plan.tags}
+                self.default.replan([t for t in self.tags if t not in listed] + list(self._watched))
+                self.default.refresh = True
+                for t in list(self._snapshot):
+                    if t not in self.tags and t not in self._watched:
+                        del self._snapshot[t]
+            return [c for c in self.classes.values() if c.plan.tags]
+
+    def _publish(self, values=None, error=None, ts=None, status=None):
+        frame = super()._publish(values, error, ts, status)
+        if values is not None:
+            self.last_good = frame
+        return frame
+
+    def restore(self, ts, values):
+        """Publish values saved by an earlier run (read at `ts`) so clients
+        have something to show before the first read; call before polling starts."""
+        self._publish(values={t: values.get(t) for t in self.tags}, ts=ts)
+
+    def read_once(self, comm, tags=None):
+        """Read `tags` (default: the poller's own) once on `comm` and return
+        them decoded. Uses a plan of its own, so it is safe from any thread
+        and leaves the scan's plans, counters and snapshot alone."""
+        res = ReadPlan(self.tags if tags is None else tags, self.word_types).read(comm)
+        check_responses(res)
+        return self.decode(res)
+
+    def feed(self, ts, raw, error=None):
+        """Publish one recorded pass: `raw` is {request: Response} for the
+        word reads, unpacked through the current plans like a live read.
+        Requests that weren't recorded come back as failed reads."""
+        if error is not None:
+            self._snapshot = {}
+            self._publish(error=error, ts=ts)
+            return
+        for c in self._current_classes():
+            res = []
+            for req in c.plan.requests:
+                r = raw.get(req)
+                if r is None:
+                    r = Response(req if isinstance(req, str) else req[0], None, 0)
+                    r.Status = "Not recorded"
+                res.append(r)
+            self._snapshot.update(self.decode(c.plan.unpack(res)))
+        self._publish(values=dict(self._snapshot), ts=ts)
+
+    def _start(self):
+        if self._thread is None and not self.replaying:
+            self._thread = threading.Thread(target=self._run, name="plc-poller", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            wait = self.health.attempt()
+            if wait:
+                time.sleep(wait)  # circuit open and the probe isn't ours yet
+                continue
+            try:
+                with PLC() as comm:
+                    comm.IPAddress = self.ip
+                    CONNECTS.inc()
+                    now = time.monotonic()
+                    for c in self.classes.values():
+                        c.due = now  # (re)connected: read everything on the first pass
+                    while True:
+                        self._pass(comm)
+            except Exception as e:
+                self.health.failed(error_text(e))
+                if self.recorder is not None:
+                    self.recorder.record(time.time(), error=error_text(e))
+                self._snapshot = {}
+                self._publish(error=error_text(e), status=self.health.report())
+                time.sleep(self.health.retry_in())
+
+    def _pass(self, comm):
+        classes = self._current_classes()
+        now = time.monotonic()
+        due = [c for c in classes if c.due <= now or c.refresh]
+        recorded = []
+        status = None  # of the last class whose tags all failed
+        for c in due:
+            started = time.monotonic()
+            raw = c.plan.read_raw(comm)
+            finished = time.monotonic()
+            if self.recorder is not None:
+                recorded.append((c.plan.requests, raw))
+            res = c.plan.unpack(raw)
+            READ_SECONDS.observe(finished - started, c.name)
+            for r in res:
+                if r.Status != "Success":
+                    BAD_STATUS.inc(r.TagName)
+            c.failed = bool(res) and all(r.Status != "Success" for r in res)
+            if c.failed:
+                status = res[0].Status
+                if not all(tag_error(r.Status) for r in res):
+                    raise ConnectionError(status)  # the session failed, not the tags
+            t = time.perf_counter()
+            self._snapshot.update(self.decode(res))
+            DECODE_SECONDS.observe(time.perf_counter() - t)
+            if c.due <= now:
+                c.scheduled(finished, started, finished)
+            else:
+                c.refreshes += 1
+            c.refresh = False
+        if due and all(c.failed for c in classes):
+            # The controller answers but no class reads anything: treat it as down
+            raise ConnectionError(status)
+        if due:
+            if self.recorder is not None:
+                self.recorder.record(time.time(), recorded)
+            if self.health.state != "connected":
+                self.health.ok()
+            self._publish(values=dict(self._snapshot))
+        self._wake.clear()
+        delay = min(c.due for c in classes) - time.monotonic() if classes else self.interval
+        if delay > 0:
+            self._wake.wait(delay)
+
+    def report(self):
+        return {name: c.report() for name, c in self.classes.items() if c.plan.tags}
+
+
+class Sampler:
+    """Listener that passes on at most one frame per `interval` seconds (and
+    every error), so 1 s trend storage stays 1 s when faster scan classes
+    publish several frames a second."""
+
+    def __init__(self, listener, interval):
+        self.listener = listener
+        self.interval = interval
+        self._last = 0.0
+
+    def put(self, frame):
+        # 10% slack so a frame that lands a little early isn't pushed a whole tick later
+        if frame.values is None or frame.ts - self._last >= self.interval * 0.9:
+            if frame.values is not None:
+                self._last = frame.ts
+            self.listener.put(frame)
+
+
+class SnapshotFile:
+    """Listener that keeps the last good snapshot in a JSON file, rewritten at
+    most every `interval` seconds, so a restarted service starts warm."""
+
+    def __init__(self, path, interval=5.0):
+        self.path = path
+        self.interval = interval
+        self._saved = 0.0
+
+    def load(self):
+        """(ts, {tag: value}) from the file, or None when missing or unreadable."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            return float(data["ts"]), dict(data["values"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def put(self, frame):
+        if frame.values is not None and frame.ts - self._saved >= self.interval:
+            self.save(frame)
+
+    def save(self, frame):
+        if frame is None or frame.values is None:
+            return
+        self._saved = frame.ts
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"ts": frame.ts, "values": frame.values}, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+
+class SliceView(Broadcaster):
+    """A renamed subset of another broadcaster's snapshot, e.g. one booth's
+    tags out of the combined controller read. `mapping` is {key: source tag};
+    clients see values under the keys. Frames are re-encoded once per cycle
+    for the view, so each subscriber only pays for its own slice."""
+
+    def __init__(self, source, mapping, queue_size=4):
+        super().__init__(mapping, queue_size)
+        self.source = source
+        self.mapping = dict(mapping)
+        self.full_interval = source.full_interval
+        source.attach(self, prime=False)
+
+    def put(self, frame):
+        # Called from the source's poll thread
+        if frame.values is None:
+            self._publish(error=frame.error, ts=frame.ts, status=frame.status)
+        else:
+            get = frame.values.get
+            self._publish(values={key: get(tag) for key, tag in self.mapping.items()}, ts=frame.ts)
+
+
+class WatchView(SliceView):
+    """A SliceView that only listens while it has subscribers, e.g. one
+    client's own tag set. Tags in `mapping` that the source doesn't poll
+    anyway are watch()ed for as long as it has subscribers."""
+
+    def __init__(self, source, mapping, queue_size=4):
+        Broadcaster.__init__(self, mapping, queue_size)
+        self.source = source
+        self.mapping = dict(mapping)
+        self.full_interval = source.full_interval
+        self.extra = [t for t in dict.fromkeys(self.mapping.values()) if t not in source.tags]
+        self._watching = False
+
+    def _start(self):
+        if not self._watching:
+            self.source.watch(self.extra)  # may refuse: over the source's watch cap
+            self._watching = True
+            self.source.attach(self, prime=False)
+
+    def _stop(self):
+        if self._watching:
+            self._watching = False
+            self.source.unsubscribe(self)
+            self.source.unwatch(self.extra)
+            self.latest = self._values = None  # next viewer starts from a fresh keyframe
@@ -0,0 +1,227 @@
+"""Read planning: collapse bit and element reads into whole-word reads.
+
+`M[0].5`, `M[0].6` and `M[0].9` are three CIP services if read by name, but
+all live in the INT `M[0]`. A ReadPlan dedupes the tag list, reads every
+word once, and unpacks the bits locally. Results are pylogix Responses
+keyed by the original tag names.
+
+What costs time on the wire is round trips, not services: pylogix packs
+plain reads into Multiple Service Packets up to the connection size, but
+sends every array read ("W00[0]", 12) as a request of its own, closing the
+packet before it. A long run of words is only read as one array slice when
+that saves a round trip (see batches()), and slices go after the plain
+reads so they don't split the packet.
+"""
+import re
+from pylogix.lgx_response import Response
+
+TYPE_SIZES = {"BOOL": 1, "SINT": 1, "INT": 2, "DINT": 4, "REAL": 4, "LINT": 8}
+CONNECTION_SIZE = 4002  # pylogix's Large Forward Open; controllers that refuse it get 504
+
+# base[index].bit, base[index], or base.bit (e.g. R000.3)
+_ADDR = re.compile(r"^(?P<base>[A-Za-z_][A-Za-z0-9_]*)(?:\[(?P<idx>\d+)\])?(?:\.(?P<bit>\d+))?$")
+
+
+def parse_address(tag):
+    """Return (base, index, bit) for word/bit addresses, or None for anything
+    that must be read by name (scalars, structure members such as TMR[6].ACC)."""
+    m = _ADDR.match(tag)
+    if not m or (m.group("idx") is None and m.group("bit") is None):
+        return None
+    idx = m.group("idx")
+    bit = m.group("bit")
+    return m.group("base"), None if idx is None else int(idx), None if bit is None else int(bit)
+
+
+def _word_name(base, idx):
+    return base if idx is None else f"{base}[{idx}]"
+
+
+def _path_bytes(tag):
+    # Symbolic segment per name part (padded to even) plus an element segment per index
+    n = 0
+    for part in tag.split("."):
+        if part.isdigit():
+            continue  # bit number, extracted on our side
+        name, _, rest = part.partition("[")
+        n += 2 + len(name) + (len(name) & 1)
+        if rest:
+            idx = int(rest.rstrip("]"))
+            n += 2 if idx < 0x100 else 4 if idx < 0x10000 else 6
+    return n
+
+
+def service_bytes(tag, data_size):
+    """Estimated request + reply bytes for one Read Tag service inside a
+    Multiple Service Packet (including its 2-byte offset entries)."""
+    request = 2 + 2 + 1 + 1 + _path_bytes(tag) + 2
+    reply = 2 + 4 + 2 + data_size
+    return request + reply
+
+
+def batches(requests, size_of, connection_size=CONNECTION_SIZE):
+    """The round trips pylogix makes for comm.Read(requests), as lists of
+    requests: plain reads share Multiple Service Packets while request and
+    reply fit the connection (its own sizing rule), an array read is one
+    round trip on its own and ends the packet in progress. `size_of(name)`
+    is the byte size of one element."""
+    out, current = [], []
+    send = reply = 0
+    for req in requests:
+        if not isinstance(req, str):
+            if current:
+                out.append(current)
+                current = []
+            out.append([req])
+            continue
+        service = 4 + _path_bytes(req)
+        size = 8 + size_of(req)
+        if current and (send + service + 2 >= connection_size or reply + size >= connection_size):
+            out.append(current)
+            current = []
+        if not current:
+            send, reply = 30, 28
+        current.append(req)
+        send += service + 2
+        reply += size
+    if current:
+        out.append(current)
+    return out
+
+
+class ReadPlan:
+    """Precomputed set of reads for a tag list; build once, call read() every scan.
+
+    word_types maps array/word base names to their PLC type (for sizing);
+    runs of at least `slice_min` word indexes, allowing `max_gap` unused words
+    between them, are read as one array slice.
+    """
+
+    def __init__(self, tags, word_types=None, default_type="INT", slice_min=8, max_gap=2,
+                 connection_size=CONNECTION_SIZE):
+        self.tags = list(dict.fromkeys(tags))  # dedupe, keep first-seen order
+        self.word_types = dict(word_types or {})
+        self.default_type = default_type
+        self.connection_size = connection_size
+        self.requests = []   # arguments for comm.Read: "name" or ("name", count)
+        self._unpack = []    # per request: [(orig_tag, offset, bit)]
+        self._build(slice_min, max_gap)
+        self.stats = self._estimate(list(tags))
+        self.scans = 0
+
+    def _size(self, base):
+        return TYPE_SIZES.get(self.word_types.get(base, self.default_type), 4)
+
+    def _size_of(self, tag):
+        addr = parse_address(tag)
+        return self._size(addr[0]) if addr else 4
+
+    def round_trips(self, requests):
+        return len(batches(requests, self._size_of, self.connection_size))
+
+    def _build(self, slice_min, max_gap):
+        words = {}  # (base, idx) -> [(tag, bit)]
+        for tag in self.tags:
+            addr = parse_address(tag)
+            if addr is None:
+                self.requests.append(tag)
+                self._unpack.append([(tag, 0, None)])
+            else:
+                base, idx, bit = addr
+                words.setdefault((base, idx), []).append((tag, bit))
+
+        by_base = {}
+        runs = []  # (base, indexes) long enough to be worth a slice
+        for base, idx in words:
+            by_base.setdefault(base, []).append(idx)
+        for base, indexes in by_base.items():
+            if None in indexes:
+                self._add_word(base, None, words[(base, None)])
+                indexes = [i for i in indexes if i is not None]
+            indexes.sort()
+            run = []
+            for idx in indexes + [None]:
+                if run and (idx is None or idx - run[-1] > max_gap + 1):
+                    if run[-1] - run[0] + 1 >= slice_min:
+                        runs.append((base, run))
+                    else:
+                        for i in run:
+                            self._add_word(base, i, words[(base, i)])
+                    run = []
+                if idx is not None:
+                    run.append(idx)
+        # Slices go last, and only where reading the words instead would take more round trips
+        slices = []
+        for base, run in runs:
+            sliced = self.requests + [req for req, _, _ in slices] + [(_word_name(base, run[0]), run[-1] - run[0] + 1)]
+            plain = self.requests + [_word_name(base, i) for i in run] + [req for req, _, _ in slices]
+            if self.round_trips(sliced) < self.round_trips(plain):
+                slices.append((sliced[-1], base, run))
+            else:
+                for i in run:
+                    self._add_word(base, i, words[(base, i)])
+        for _, base, run in slices:
+            self._add_slice(base, run, words)
+
+    def _add_word(self, base, idx, refs):
+        self.requests.append(_word_name(base, idx))
+        self._unpack.append([(tag, 0, bit) for tag, bit in refs])
+
+    def _add_slice(self, base, run, words):
+        start = run[0]
+        self.requests.append((_word_name(base, start), run[-1] - start + 1))
+        self._unpack.append([(tag, i - start, bit) for i in run for tag, bit in words[(base, i)]])
+
+    def _estimate(self, raw_tags):
+        size_of = self._size_of
+        naive_bytes = sum(service_bytes(t, size_of(t)) for t in raw_tags)
+        planned_bytes = 0
+        for req in self.requests:
+            name, count = req if isinstance(req, tuple) else (req, 1)
+            planned_bytes += service_bytes(name, size_of(name) * count)
+        return {
+            "tags": len(raw_tags),
+            "unique_tags": len(self.tags),
+            "requests_naive": len(raw_tags),
+            "requests_planned": len(self.requests),
+            "requests_saved": len(raw_tags) - len(self.requests),
+            "round_trips_naive": self.round_trips(raw_tags),
+            "round_trips_planned": self.round_trips(self.requests),
+            "bytes_naive": naive_bytes,
+            "bytes_planned": planned_bytes,
+            "bytes_saved": naive_bytes - planned_bytes,
+        }
+
+    def read(self, comm):
+        """Run the plan on an open pylogix PLC and return one Response per unique tag."""
+        return self.unpack(self.read_raw(comm))
+
+    def read_raw(self, comm):
+        """The word/slice Responses for self.requests, as the PLC returned them."""
+        res = comm.Read(self.requests)
+        return res if isinstance(res, list) else [res]
+
+    def unpack(self, res):
+        """Raw Responses (one per request) -> one Response per unique tag."""
+        out = {}
+        for r, refs in zip(res, self._unpack):
+            ok = getattr(r, "Status", "") == "Success"
+            for tag, offset, bit in refs:
+                value = None
+                if ok:
+                    value = r.Value[offset] if isinstance(r.Value, list) else r.Value
+                    if bit is not None and value is not None:
+                        value = (int(value) >> bit) & 1
+                resp = Response(tag, value, 0)
+                resp.Status = r.Status
+                out[tag] = resp
+        self.scans += 1
+        return [out[t] for t in self.tags if t in out]
+
+    def report(self):
+        """Per-scan savings plus running totals since startup."""
+        report = dict(self.stats, scans=self.scans)
+        report["requests_saved_total"] = self.stats["requests_saved"] * self.scans
+        report["round_trips_saved_total"] = (self.stats["round_trips_naive"] - self.stats["round_trips_planned"]) * self.scans
+        report["bytes_saved_total"] = self.stats["bytes_saved"] * self.scans
+        return report
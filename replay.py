@@ -0,0 +1,235 @@
+"""Record the raw PLC reads of every poll pass, and replay them in place of the PLC.
+
+    PAINTBOOTH_RECORD=data/recordings python3 paintbooth.py    # record while serving
+    python3 replay.py data/recordings/2026-10-17.rec.gz 10     # serve a recording at 10x
+    python3 replay.py info FILE
+    python3 replay.py bench FILE                               # max speed through the dashboard
+
+A recording is gzip'd JSON lines, one per poll pass:
+
+    [ts, {request: value}, {request: status}]     changed word reads only
+    [ts, null, "error text"]                      the pass failed (link down)
+
+Requests are the ReadPlan's word/slice reads ("M[0]", "W16[0],3" for a
+slice of 3), so a replay goes through the same unpacking and decoding as a
+live read; tags that were not being read when it was recorded come back as
+failed reads. Only values and statuses that changed since the previous pass
+are written, which is a few bytes a pass while the booth is idle. One file
+per day; its first good pass carries every request's last value, so a file
+replays on its own even if the slow classes weren't read in that pass.
+
+Every flush appends a complete gzip member, so a process killed between
+flushes leaves a readable file that the next one appends to. A tail cut
+off mid-write is skipped by passes().
+"""
+import datetime, gzip, json, os, sys, threading, time, zlib
+from pylogix.lgx_response import Response
+
+FLUSH_SEC = 10.0  # recorder appends a gzip member at least this often
+_MISSING = object()
+
+
+def request_key(req):
+    return req if isinstance(req, str) else f"{req[0]},{req[1]}"
+
+
+def parse_key(key):
+    name, _, count = key.rpartition(",")
+    return (name, int(count)) if name else key
+
+
+class Recorder:
+    """Poller hook (TagPoller.recorder) writing raw reads to `directory`/<day>.rec.gz."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._day = None
+        self._pending = []  # lines since the last flush
+        self._values, self._status = {}, {}
+        self._keyframe = True  # next good pass writes the full state
+        self._flushed = 0.0
+        self.passes = 0
+        self._lock = threading.Lock()
+
+    def record(self, ts, reads=(), error=None):
+        """`reads` is [(requests, raw Responses)] for the classes read in one pass."""
+        with self._lock:
+            self._roll(ts)
+            if error is not None:
+                line = [ts, None, error]
+            else:
+                changed, status = {}, {}
+                for requests, raw in reads:
+                    for req, r in zip(requests, raw):
+                        key = request_key(req)
+                        if self._status.get(key, "Success") != r.Status:
+                            status[key] = self._status[key] = r.Status
+                        if r.Status == "Success" and self._values.get(key, _MISSING) != r.Value:
+                            changed[key] = self._values[key] = r.Value
+                if self._keyframe:
+                    changed, status = dict(self._values), dict(self._status)
+                    self._keyframe = False
+                line = [ts, changed, status] if status else [ts, changed]
+            self._pending.append(json.dumps(line, separators=(",", ":")) + "\n")
+            self.passes += 1
+            if ts - self._flushed >= FLUSH_SEC:
+                self._write()
+                self._flushed = ts
+
+    def _roll(self, ts):
+        day = datetime.date.fromtimestamp(ts).isoformat()
+        if day != self._day:
+            self._write()
+            self._day = day
+            self._keyframe = True  # each file starts with full values
+
+    def _write(self):
+        # One gzip member per flush: nothing is left half-compressed between flushes
+        if self._pending:
+            os.makedirs(self.directory, exist_ok=True)
+            data = gzip.compress("".join(self._pending).encode())
+            with open(os.path.join(self.directory, self._day + ".rec.gz"), "ab") as f:
+                f.write(data)
+            self._pending = []
+
+    def flush(self):
+        with self._lock:
+            self._write()
+
+    close = flush
+
+
+def _lines(path):
+    with gzip.open(path, "rt") as f:
+        try:
+            yield from f
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            return  # member cut off mid-write (or still being written): stop at the last good line
+
+
+def passes(path):
+    """Yield (ts, {request: Response} or None, error) per recorded pass, with
+    the full state at that pass (deltas applied)."""
+    values, status = {}, {}
+    for line in _lines(path):
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            return  # truncated tail of a file still being written
+        ts, changed = rec[0], rec[1]
+        if changed is None:
+            yield ts, None, rec[2]
+            continue
+        values.update(changed)
+        if len(rec) > 2:
+            status.update(rec[2])
+        raw = {}
+        for key in values.keys() | status.keys():
+            req = parse_key(key)
+            s = status.get(key, "Success")
+            r = Response(req if isinstance(req, str) else req[0], values.get(key) if s == "Success" else None, 0)
+            r.Status = s
+            raw[req] = r
+        yield ts, raw, None
+
+
+class Replay:
+    """Feeds a recording to a TagPoller instead of the PLC. `speed` is a
+    multiple of real time, or None for as fast as possible. Frames are
+    timestamped as if the recording started now (at `speed`), so trends
+    and history line up with the wall clock."""
+
+    def __init__(self, poller, paths, speed=1.0, loop=False):
+        self.poller = poller
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.speed = speed
+        self.loop = loop
+        self.passes = 0
+        self.done = threading.Event()
+        self.wall_sec = None
+        poller.replaying = True
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="replay", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        started, wall0 = time.time(), time.monotonic()
+        while True:
+            first = None
+            for path in self.paths:
+                for ts, raw, error in passes(path):
+                    if first is None:
+                        first = ts
+                    offset = ts - first
+                    if self.speed:
+                        offset /= self.speed
+                        delay = started + offset - time.time()
+                        if delay > 0:
+                            time.sleep(delay)
+                    self.poller.feed(started + offset, raw, error)
+                    self.passes += 1
+            if not self.loop:
+                break
+            started = time.time()
+        self.wall_sec = time.monotonic() - wall0
+        self.done.set()
+
+
+def parse_speed(text):
+    return None if text in ("max", "0") else float(text.rstrip("x"))
+
+
+def info(path):
+    n = errors = 0
+    first = last = None
+    for ts, raw, error in passes(path):
+        n += 1
+        errors += error is not None
+        first = ts if first is None else first
+        last = ts
+    size = os.path.getsize(path)
+    return {"passes": n, "failed_passes": errors, "from": first, "to": last,
+            "seconds": round(last - first, 1) if n else 0, "bytes": size,
+            "bytes_per_pass": round(size / n, 2) if n else None}
+
+
+def bench(path):
+    """Replay at max speed through the dashboard's own poller, booth views and
+    history, with one delta SSE subscriber; report passes per second."""
+    os.environ["PAINTBOOTH_REPLAY"] = path
+    os.environ["PAINTBOOTH_REPLAY_SPEED"] = "max"
+    import paintbooth
+    sub = paintbooth.booth_views["1"].subscribe("delta")
+    replay = paintbooth.replay
+    sent = 0
+    while not replay.done.is_set() or not sub.queue.empty():
+        try:
+            sub.next_message(timeout=0.1)
+            sent += 1
+        except Exception:
+            pass
+    history = paintbooth.history
+    return {"passes": replay.passes, "seconds": round(replay.wall_sec, 3),
+            "passes_per_sec": round(replay.passes / replay.wall_sec, 1) if replay.wall_sec else None,
+            "delta_messages": sent,
+            "history_samples": len(history.raw(history.tags[:1], 0, float("inf"))[0])}
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["info"]:
+        print(json.dumps(info(args[1]), indent=2))
+    elif args[:1] == ["bench"]:
+        print(json.dumps(bench(args[1]), indent=2))
+    elif args:
+        # Serve the dashboard from a recording: python3 replay.py FILE [speed|max]
+        os.environ["PAINTBOOTH_REPLAY"] = args[0]
+        os.environ["PAINTBOOTH_REPLAY_SPEED"] = args[1] if len(args) > 1 else "1"
+        import paintbooth
+        paintbooth.app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
+    else:
+        print(__doc__)
@@ -1,9 +1,12 @@
+import os
 import sys
 import time
 import subprocess
 import math
 import random
+import threading
 from pylogix import PLC
+import ladder as ladder_mod  # start_emulator() has a ladder= flag
 
 # Tags to emulate (Same as write_loop.py)
 # Tags to emulate (Same as write_loop.py)
@@ -28,33 +31,43 @@ TAGS_DEF = [
 ]
 
 EMULATOR_IP = "127.0.0.1"
+LADDER_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ladder.py")
 
-def start_emulator():
-    cmd = [sys.executable, "-m", "cpppo.server.enip", "--address", "0.0.0.0:44818", *TAGS_DEF]
-    return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+def start_emulator(port=44818, ladder=False, faults=None):
+    # ladder=True runs the L5X program itself (ladder.py) instead of the bare tag set;
+    # faults is a ladder.py fault spec ("latency=40,jitter=20,drop=0.01,error=...,stuck=...")
+    if ladder:
+        cmd = [sys.executable, LADDER_PY, str(port), str(ladder_mod.SCAN_MS), faults or ""]
+    elif faults:
+        cmd = [sys.executable, LADDER_PY, "tags", str(port), faults, *TAGS_DEF]
+    else:
+        cmd = [sys.executable, "-m", "cpppo.server.enip", "--address", f"0.0.0.0:{port}", *TAGS_DEF]
+    # ladder.py finds the L5X next to it
+    return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, cwd=os.path.dirname(LADDER_PY))
 
-def simulation_loop():
-    print("Starting simulation loop...")
-    with PLC() as comm:
-        comm.IPAddress = EMULATOR_IP
+def write_one(comm, tag, value):
+    try:
+        return comm.Write(tag, value).Status == "Success"
+    except Exception:
+        return False
+
+def simulation_loop(port=44818):
+    print(f"Starting simulation loop on port {port}...")
+    with PLC(EMULATOR_IP, port=port) as comm:
         
         # Initialize some values if they are 0
         try:
-            # Set initial setpoint if 0
-            if comm.Read("W00_15").Value == 0:
-                comm.Write("W00_15", 12000) # Spray SP default
-            if comm.Read("W00_13").Value == 0:
-                comm.Write("W00_13", 14000) # Bake SP default
-                
-            # Set initial bake time preset if 0
-            if comm.Read("B1_Bake_Time").Value == 0:
-                comm.Write("B1_Bake_Time", 30.0)
-            # Set initial cooldown preset if 0
-            if comm.Read("TMR_6_PRE").Value == 0:
-                comm.Write("TMR_6_PRE", 300000) # 5 min
-            # Set initial mode to Auto
-            comm.Write("M_1_4", 1)
-            comm.Write("M_1_5", 0)
+            vals = {r.TagName: r.Value for r in comm.Read(["W00_15", "W00_13", "B1_Bake_Time", "TMR_6_PRE"])}
+            init = [("M_1_4", 1), ("M_1_5", 0)]  # Set initial mode to Auto
+            if vals.get("W00_15") == 0:
+                init.append(("W00_15", 12000)) # Spray SP default
+            if vals.get("W00_13") == 0:
+                init.append(("W00_13", 14000)) # Bake SP default
+            if vals.get("B1_Bake_Time") == 0:
+                init.append(("B1_Bake_Time", 30.0))
+            if vals.get("TMR_6_PRE") == 0:
+                init.append(("TMR_6_PRE", 300000)) # 5 min
+            comm.Write(init)
         except Exception as e:
             print(f"Init error: {e}")
 
@@ -68,21 +81,21 @@ def simulation_loop():
                 # Read commands and current states
                 reads = comm.Read(["M_1_0", "M_0_15", "M_1_4", "M_1_5", "M_3_0", "M_0_11", "W00_15", "W00_13"])
                 vals = {r.TagName: r.Value for r in reads if r.Status == "Success"}
+                # Everything this iteration writes goes out in one batched request
+                writes = []
                 
                 # Lights Logic
                 # Latch M_3_0 based on commands
                 if vals.get("M_1_0") == 1:
-                    comm.Write("M_3_0", 1)
-                    comm.Write("M_1_0", 0) # Reset command
+                    writes += [("M_3_0", 1), ("M_1_0", 0)] # Reset command
                 elif vals.get("M_0_15") == 1:
-                    comm.Write("M_3_0", 0)
-                    comm.Write("M_0_15", 0) # Reset command
+                    writes += [("M_3_0", 0), ("M_0_15", 0)] # Reset command
                 
                 # Mode Logic: Ensure mutual exclusivity
                 if vals.get("M_1_4") == 1 and vals.get("M_1_5") == 1:
-                    comm.Write("M_1_5", 0) # Default to Auto
+                    writes.append(("M_1_5", 0)) # Default to Auto
                 elif vals.get("M_1_4") == 0 and vals.get("M_1_5") == 0:
-                    comm.Write("M_1_4", 1) # Default to Auto
+                    writes.append(("M_1_4", 1)) # Default to Auto
                 
                 # Setpoint Logic
                 # Determine active setpoint based on mode (Auto = Bake Active)
@@ -93,7 +106,7 @@ def simulation_loop():
                 
                 # Update W16_1 based on state
                 target_sp = vals.get("W00_13", 14000) if bake_active else vals.get("W00_15", 12000)
-                comm.Write("W16_1", int(target_sp))
+                writes.append(("W16_1", int(target_sp)))
                 
                 # Simulate values
                 # Temp: Sine wave between 70.0 and 150.0 degrees (scaled x100 -> 7000 to 15000)
@@ -109,27 +122,71 @@ def simulation_loop():
                 system_on = 1
                 heat_enabled = 1 if (int(t) % 10) < 8 else 0 # On for 8s, off for 2s
                 
-                comm.Write("M_0_0", system_on)
-                comm.Write("M_40_0", heat_enabled)
-                comm.Write("M_0_11", bake_active)
-                comm.Write("W16_2", int(temp_val))
-                comm.Write("B1_Bake_Time_ACC", float(bake_time))
-                comm.Write("TMR_6_ACC", int(cooldown))
-                comm.Write("M_40_4", 1) # Cooldown Active
+                writes += [
+                    ("M_0_0", system_on),
+                    ("M_40_0", heat_enabled),
+                    ("M_0_11", bake_active),
+                    ("W16_2", int(temp_val)),
+                    ("B1_Bake_Time_ACC", float(bake_time)),
+                    ("TMR_6_ACC", int(cooldown)),
+                    ("M_40_4", 1), # Cooldown Active
+                ]
+                try:
+                    failed = [r.TagName for r in comm.Write(writes) if r.Status != "Success"]
+                except Exception:
+                    # pylogix can't batch a tag whose type it failed to read; write one by one
+                    failed = [tag for tag, value in writes if not write_one(comm, tag, value)]
+                if failed:
+                    print(f"Write failed on port {port}: {failed}")
                 
             except Exception as e:
                 print(f"Error in loop: {e}")
             
             time.sleep(0.2)
 
+def parse_args(argv):
+    # run_demo.py [--ladder] [--booths N] [--port P] [--faults SPEC]
+    opts = {"ladder": False, "booths": 1, "port": 44818, "faults": None}
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg == "--ladder":
+            opts["ladder"] = True
+        elif arg in ("--booths", "--port"):
+            opts[arg[2:]] = int(args.pop(0))
+        elif arg == "--faults":
+            opts["faults"] = args.pop(0)
+        elif arg.isdigit():
+            opts["port"] = int(arg)  # run_demo.py --ladder PORT, as before
+    return opts
+
 if __name__ == "__main__":
-    # Start cpppo
-    p = start_emulator()
+    opts = parse_args(sys.argv[1:])
+    ports = [opts["port"] + i for i in range(opts["booths"])]
+
+    if opts["ladder"] and len(ports) == 1:
+        # Scan the real program instead of faking values (see ladder.py)
+        ladder_mod.main(ports[0], faults=ladder_mod.Faults.parse(opts["faults"]))
+        sys.exit(0)
+
+    # One emulator process per booth, on consecutive ports
+    procs = [start_emulator(port, opts["ladder"], opts["faults"]) for port in ports]
     time.sleep(1)
+    print(f"{len(ports)} emulated booth(s) on ports {ports[0]}-{ports[-1]}"
+          + (f", faults: {opts['faults']}" if opts["faults"] else ""))
     
     try:
-        simulation_loop()
+        if opts["ladder"]:
+            # The program simulates itself
+            while True:
+                time.sleep(1)
+        threads = [threading.Thread(target=simulation_loop, args=(port,), daemon=True) for port in ports]
+        for t in threads:
+            t.start()
+        while True:
+            time.sleep(1)
     except KeyboardInterrupt:
         print("Stopping...")
     finally:
-        p.terminate()
+        for p in procs:
+            p.terminate()
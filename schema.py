@@ -0,0 +1,112 @@
+"""Declarative tag schema, compiled into per-tag decoders and encoders.
+
+Each dashboard tag is declared once, as a Field: PLC type, display scale
+and units, write limits, whether it may be written, and its scan class.
+Values travel in PLC units, as the controller holds them (W16[2] = 12345
+for 123.45 °F): `scale` is PLC units per engineering unit, and `lo`/`hi`
+are in engineering units, so limits read like the HMI:
+
+    Field("INT", scale=100, units="°F", decimals=1, lo=0, hi=250, writable=True)
+
+The decoder and encoder for a field are chosen once, from its type, when
+it is declared; decoder() then builds one lookup table over the PLC tags
+of every booth, so a poll pass is a dict hit and a call per value.
+"""
+import math
+
+# Raw range per integer type; BOOL is a bit
+INT_RANGES = {"BOOL": (0, 1), "SINT": (-2 ** 7, 2 ** 7 - 1), "INT": (-2 ** 15, 2 ** 15 - 1),
+              "DINT": (-2 ** 31, 2 ** 31 - 1)}
+
+
+def _int(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _real(decimals):
+    def decode(v):
+        try:
+            return round(float(v), decimals)
+        except (TypeError, ValueError):
+            return None
+    return decode
+
+
+def generic(v):
+    """Decoder for tags outside the schema (watched ad-hoc tags): REALs to
+    one decimal, everything else to int."""
+    return round(v, 1) if isinstance(v, float) else _int(v)
+
+
+class Field:
+    __slots__ = ("type", "scale", "units", "decimals", "lo", "hi", "writable", "scan", "poll",
+                 "pulse", "display", "label", "decode")
+
+    def __init__(self, type, scale=1, units="", decimals=0, lo=None, hi=None, writable=False,
+                 scan=None, poll=True, pulse=None, display=None, label=""):
+        if type not in INT_RANGES and type != "REAL":
+            raise ValueError(f"unsupported type {type}")
+        self.type = type
+        self.scale = scale
+        self.units = units
+        self.decimals = decimals   # shown on the pages; REALs are also rounded to it when read
+        self.lo, self.hi = lo, hi  # write limits, engineering units
+        self.writable = writable
+        self.scan = scan           # scan class name, None for the default rate
+        self.poll = poll           # False: written by the pages but never read
+        self.pulse = pulse         # momentary button: seconds before the 0 is written
+        self.display = display     # page rendering hint: "mmss" for timers
+        self.label = label
+        self.decode = _real(decimals) if type == "REAL" else _int
+
+    def encode(self, value):
+        """The PLC value to write for `value` (PLC units, from JSON); raises
+        ValueError when it isn't a number, is outside the limits, or doesn't
+        fit the type."""
+        if isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"{value!r} is not a number")
+        eng = value / self.scale
+        if self.lo is not None and eng < self.lo:
+            raise ValueError(f"{eng:g} {self.units} is below the minimum of {self.lo:g} {self.units}")
+        if self.hi is not None and eng > self.hi:
+            raise ValueError(f"{eng:g} {self.units} is above the maximum of {self.hi:g} {self.units}")
+        if self.type == "REAL":
+            return float(value)
+        raw = round(value)
+        if abs(raw - value) > 1e-6:
+            raise ValueError(f"{self.type} needs a whole number, got {value!r}")
+        lo, hi = INT_RANGES[self.type]
+        if not lo <= raw <= hi:
+            raise ValueError(f"{raw} does not fit a {self.type}")
+        return raw
+
+    def describe(self):
+        """What the pages need to render and enter the value."""
+        return {"type": self.type, "scale": self.scale, "units": self.units, "decimals": self.decimals,
+                "lo": self.lo, "hi": self.hi, "writable": self.writable, "display": self.display,
+                "label": self.label}
+
+
+def by_tag(schema, booth_tags):
+    """{PLC tag: Field} over every booth's mapping of the schema's keys."""
+    return {tag: schema[key] for tags in booth_tags.values() for key, tag in tags.items() if key in schema}
+
+
+def decoder(fields):
+    """decode(res) for a TagPoller: pylogix Responses -> {tag: value}, each
+    through its field's decoder (generic() for tags outside the schema),
+    failed reads as None."""
+    table = {tag: f.decode for tag, f in fields.items()}
+    get = table.get
+
+    def decode(res):
+        values = {}
+        for r in res:
+            values[r.TagName] = get(r.TagName, generic)(r.Value) if r.Status == "Success" else None
+        return values
+    return decode
@@ -0,0 +1,45 @@
+import os, socket, sys, time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip("cpppo")
+from pylogix import PLC
+import run_demo
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def test_ladder_serves_reads_and_writes_over_enip():
+    port = free_port()
+    proc = run_demo.start_emulator(port, ladder=True)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            assert proc.poll() is None, "ladder.py exited"
+            try:
+                socket.create_connection(("127.0.0.1", port), 0.5).close()
+                break
+            except OSError:
+                assert time.monotonic() < deadline, "ladder.py never listened"
+                time.sleep(0.2)
+        with PLC("127.0.0.1", port=port) as comm:
+            assert comm.Read("W16[2]").Status == "Success"
+            assert comm.Write("B1_Bake_Time", 12.5).Status == "Success"
+            assert comm.Read("B1_Bake_Time").Value == 12.5
+            # A bit write is a Read-Modify-Write to pylogix; the HMI's AUTO button
+            assert comm.Write("M[1].3", 1).Status == "Success"
+            assert comm.Read("M[1].3").Value
+            assert comm.Write("M[1].3", 0).Status == "Success"
+            assert not comm.Read("M[1].3").Value
+            res = comm.Read(["M[0]", "W16[2]", "TMR[6].PRE"])  # one Multiple Service Packet
+            assert [r.Status for r in res] == ["Success"] * 3
+    finally:
+        proc.terminate()
+        proc.wait(10)
@@ -0,0 +1,30 @@
+import json, os, socket, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import plant
+
+
+def test_plcs_come_from_the_config_file(tmp_path):
+    path = tmp_path / "plcs.json"
+    assert plant.load_plcs(str(path)) == plant.DEFAULT_PLCS
+    path.write_text(json.dumps([{"name": "b12", "ip": "10.0.0.1"}, {"name": "b34", "ip": "10.0.0.2", "port": 2222}]))
+    assert [p["name"] for p in plant.load_plcs(str(path))] == ["b12", "b34"]
+    path.write_text(json.dumps([{"name": "b12", "ip": "10.0.0.1"}, {"name": "b12", "ip": "10.0.0.2"}]))
+    with pytest.raises(ValueError):
+        plant.load_plcs(str(path))
+
+
+def test_dead_controller_backs_off():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()  # nothing listens: connection refused
+    c = plant.Controller("dead", "127.0.0.1", ["M[0].0"], plant.decode_values, port=port, timeout=0.5)
+    waits = []
+    for _ in range(4):
+        c.scan()
+        waits.append(c.health.retry_in())
+    assert not c.online and c.failures == 4
+    assert waits[0] <= plant.LinkHealth().base and waits[-1] > plant.LinkHealth().base * 2  # jittered doubling
@@ -0,0 +1,76 @@
+import os, sys, threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pylogix.lgx_response import Response
+from poller import Broadcaster, TagPoller, WatchView
+
+
+def test_full_mode_gets_snapshots_at_the_poll_interval():
+    # A 4 Hz fast class publishes every 0.25 s; full clients want one snapshot a second
+    b = Broadcaster(["a", "b"])
+    b.full_interval = 1.0
+    full, delta = b.subscribe("full"), b.subscribe("delta")
+    sent = {"full": 0, "delta": 0}
+    for i in range(40):
+        b._publish(values={"a": i, "b": 0}, ts=100 + i * 0.25)
+        for name, sub in (("full", full), ("delta", delta)):
+            while not sub.queue.empty():
+                if sub.encode(sub.get()) is not None:
+                    sent[name] += 1
+    assert sent == {"full": 10, "delta": 40}
+    b._publish(error="PLC gone", ts=110.1)
+    assert "PLC gone" in full.encode(full.get())  # errors are never held back
+
+
+def test_watch_cap_holds_under_concurrent_subscribers():
+    p = TagPoller("0.0.0.0", ["a"], 1.0, lambda res: {}, max_watched=6)
+    p.replaying = True  # no poll thread
+    views = [WatchView(p, {"x": "x%d" % i, "y": "y%d" % i}) for i in range(20)]
+    start, results = threading.Barrier(len(views)), []
+
+    def join(view):
+        start.wait()
+        try:
+            results.append(view.subscribe("delta"))
+        except ValueError:
+            results.append(None)
+    threads = [threading.Thread(target=join, args=(v,)) for v in views]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(p.watched) == 6 and sum(r is not None for r in results) == 3
+    assert sum(v.subscriber_count for v in views) == 3  # refused subscribers aren't left attached
+
+
+class FakeComm:
+    def __init__(self, status):
+        self.status = status  # {tag: status} for tags that fail
+
+    def Read(self, requests):
+        out = []
+        for req in requests:
+            r = Response(req, None if req in self.status else 1, 0)
+            r.Status = self.status.get(req, "Success")
+            out.append(r)
+        return out
+
+
+def test_a_class_of_missing_tags_is_not_a_dead_link():
+    decode = lambda res: {r.TagName: r.Value for r in res}
+    p = TagPoller("0.0.0.0", ["A", "B", "P1", "P2"], 1.0, decode, classes={"presets": (5.0, ["P1", "P2"])})
+    missing = {"P1": "Path destination unknown", "P2": "Path destination unknown"}
+    p._pass(FakeComm(missing))
+    assert p.latest.values == {"A": 1, "B": 1, "P1": None, "P2": None}
+    assert p.classes["presets"].failed and not p.default.failed
+
+    for c in p.classes.values():
+        c.refresh = True
+    with pytest.raises(ConnectionError):  # a connection status is the link, even on one class
+        p._pass(FakeComm({"P1": "Connection failure", "P2": "Connection failure"}))
+    for c in p.classes.values():
+        c.refresh = True
+    with pytest.raises(ConnectionError):  # nothing at all reads: treated as down too
+        p._pass(FakeComm(dict(missing, A="Object does not exist", B="Object does not exist")))
@@ -0,0 +1,33 @@
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from readplan import ReadPlan, batches
+
+
+def test_array_reads_are_round_trips_of_their_own():
+    reqs = ["M[0]", "M[1]", ("W00[0]", 12), "M[2]"]
+    assert batches(reqs, lambda t: 2) == [["M[0]", "M[1]"], [("W00[0]", 12)], ["M[2]"]]
+
+
+def test_slice_only_when_it_saves_round_trips():
+    tags = ["W00[%d]" % i for i in range(12)] + ["M[0].5", "B1_Bake_Time"]
+    plan = ReadPlan(tags, {"W00": "INT", "M": "INT"})
+    # Everything fits one Multiple Service Packet; a slice would add a round trip
+    assert all(isinstance(r, str) for r in plan.requests)
+    assert plan.stats["round_trips_planned"] == 1
+
+    tags = ["W00[%d]" % i for i in range(300)] + ["M[0].5", "B1_Bake_Time"]
+    plan = ReadPlan(tags, {"W00": "INT", "M": "INT"}, connection_size=504)
+    assert plan.requests[-1] == ("W00[0]", 300)  # after the plain reads
+    assert plan.stats["round_trips_planned"] < plan.stats["round_trips_naive"]
+    values = {"W00[%d]" % i: i for i in range(300)}
+    values.update({"M[0]": 1 << 5, "B1_Bake_Time": 7})
+
+    class Comm:
+        def Read(self, reqs):
+            from pylogix.lgx_response import Response
+            return [Response(r[0], [values["W00[%d]" % i] for i in range(r[1])], 0) if isinstance(r, tuple)
+                    else Response(r, values[r], 0) for r in reqs]
+
+    out = {r.TagName: r.Value for r in plan.read(Comm())}
+    assert out["W00[299]"] == 299 and out["M[0].5"] == 1 and out["B1_Bake_Time"] == 7
@@ -0,0 +1,40 @@
+import datetime, gzip, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pylogix.lgx_response import Response
+from replay import Recorder, passes
+
+
+def reads(values):
+    return [(list(values), [Response(k, v, 0) for k, v in values.items()])]
+
+
+def test_new_day_file_starts_with_every_class(tmp_path):
+    midnight = time.mktime(datetime.date(2026, 10, 17).timetuple())
+    rec = Recorder(str(tmp_path))
+    rec.record(midnight - 2, reads({"W16[2]": 1, "B1_Bake_Time": 10}))  # fast + slow class
+    rec.record(midnight - 1, reads({"W16[2]": 2}))
+    rec.record(midnight + 1, reads({"W16[2]": 3}))  # only the fast class is due
+    rec.record(midnight + 2, reads({"W16[2]": 3}))
+    rec.close()
+    new = [raw for _, raw, _ in passes(os.path.join(str(tmp_path), "2026-10-17.rec.gz"))]
+    assert [{k: r.Value for k, r in raw.items()} for raw in new] == [{"W16[2]": 3, "B1_Bake_Time": 10}] * 2
+
+
+def test_restart_appends_after_an_unclosed_recorder(tmp_path):
+    ts = time.mktime(datetime.date(2026, 10, 17).timetuple()) + 3600
+    path = os.path.join(str(tmp_path), "2026-10-17.rec.gz")
+    killed = Recorder(str(tmp_path))
+    for i in range(30):
+        killed.record(ts + i, reads({"W16[2]": i}))  # flushed every 10 s, never closed
+    restarted = Recorder(str(tmp_path))
+    for i in range(100, 103):
+        restarted.record(ts + i, reads({"W16[2]": i}))
+    restarted.close()
+    seen = [raw["W16[2]"].Value for _, raw, _ in passes(path)]
+    assert seen[:21] == list(range(21)) and seen[-3:] == [100, 101, 102]
+
+    with open(path, "ab") as f:
+        f.write(gzip.compress(b'[1,{"W16[2]":5}]\n' * 50)[:40])  # killed mid-flush
+    got = [raw["W16[2]"].Value for _, raw, _ in passes(path)]  # the whole lines that made it, then stop
+    assert got[:len(seen)] == seen and set(got[len(seen):]) <= {5}
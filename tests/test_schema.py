@@ -0,0 +1,37 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from schema import Field
+
+
+def test_encode_converts_to_the_plc_type():
+    assert Field("BOOL").encode(True) == 1 and type(Field("BOOL").encode(True)) is int
+    assert Field("INT").encode(250.0) == 250 and type(Field("INT").encode(250.0)) is int
+    assert Field("REAL").encode(3) == 3.0 and type(Field("REAL").encode(3)) is float
+
+
+@pytest.mark.parametrize("value", ["12", None, [1], float("nan"), float("inf")])
+def test_encode_rejects_non_numbers(value):
+    with pytest.raises(ValueError, match="not a number"):
+        Field("INT").encode(value)
+
+
+def test_encode_limits_are_in_engineering_units():
+    f = Field("INT", scale=100, units="min", lo=0, hi=300)
+    assert f.encode(30000) == 30000
+    with pytest.raises(ValueError, match="above the maximum of 300 min"):
+        f.encode(30001)
+    with pytest.raises(ValueError, match="below the minimum"):
+        f.encode(-1)
+
+
+def test_encode_rejects_what_the_type_cannot_hold():
+    with pytest.raises(ValueError, match="whole number"):
+        Field("INT").encode(1.5)
+    with pytest.raises(ValueError, match="does not fit a INT"):
+        Field("INT").encode(32768)
+    with pytest.raises(ValueError, match="does not fit a SINT"):
+        Field("SINT").encode(-129)
+    assert Field("DINT").encode(2 ** 31 - 1) == 2 ** 31 - 1
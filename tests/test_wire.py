@@ -0,0 +1,25 @@
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wire import DELTA, KEYFRAME, PackedCodec
+
+KEYS = ["M[0].0", "B1_Mode", "B1_Bake_Time", "B1_Count", "B1_Temp", "M[0].1", "Other"]
+CODEC = PackedCodec(KEYS, ["BOOL", "SINT", "INT", "DINT", "REAL", "BOOL", None],
+                    [None, None, None, None, 1, None, None])
+
+
+def test_full_frame_round_trip():
+    values = {"M[0].0": 1, "B1_Mode": -3, "B1_Bake_Time": 1800, "B1_Count": 2 ** 31 - 1,
+              "B1_Temp": 71.3, "M[0].1": 0, "Other": 0.1}
+    for flags in (0, KEYFRAME):
+        assert CODEC.unpack(CODEC.pack(values, flags)) == (values, flags)
+    # a key left out of a full frame, or read as None, comes back null
+    sent = dict(values, B1_Count=None)
+    del sent["B1_Mode"]
+    assert CODEC.unpack(CODEC.pack(sent))[0] == dict(sent, B1_Mode=None)
+
+
+def test_delta_carries_only_its_keys():
+    values = {"B1_Temp": 180.06, "M[0].1": 1, "B1_Bake_Time": None}
+    data = CODEC.pack(values, DELTA)
+    assert CODEC.unpack(data) == ({"B1_Temp": 180.1, "M[0].1": 1, "B1_Bake_Time": None}, DELTA)
@@ -0,0 +1,102 @@
+import os, sys, threading, time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pylogix.lgx_response import Response
+from link import LinkDown, LinkHealth
+import writer
+from writer import PulseScheduler, TagWriter
+
+
+@pytest.fixture
+def plc(monkeypatch):
+    class FakePLC:
+        calls = []                  # one list of (tag, value, monotonic time) per Write
+        gate = threading.Event()    # Write blocks until set
+        entered = threading.Event()
+        fail = []                   # statuses to answer the next Writes with, one per call
+
+        def __init__(self):
+            self.IPAddress = None
+
+        def Write(self, tag, value=None):
+            FakePLC.entered.set()
+            FakePLC.gate.wait(5)
+            batch = tag if isinstance(tag, list) else [(tag, value)]
+            now = time.monotonic()
+            FakePLC.calls.append([(t, v, now) for t, v in batch])
+            status = FakePLC.fail.pop(0) if FakePLC.fail else 0
+            res = [Response(t, v, status) for t, v in batch]
+            return res if isinstance(tag, list) else res[0]
+
+        def Close(self):
+            pass
+
+    FakePLC.gate.set()
+    monkeypatch.setattr(writer, "PLC", FakePLC)
+    return FakePLC
+
+
+def writes(plc):
+    return [[(t, v) for t, v, _ in call] for call in plc.calls]
+
+
+def wait_for(cond, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_queued_writes_coalesce_and_keep_order(plc):
+    plc.gate.clear()
+    w = TagWriter("ip")
+    first = w.submit("A", 1)
+    assert plc.entered.wait(5)  # A=1 is on the wire; everything below queues behind it
+    b1, a2, b3, a4 = w.submit("B", 1), w.submit("A", 2), w.submit("B", 3), w.submit("A", 4)
+    plc.gate.set()
+    assert first.result(5)["value"] == 1
+    assert a2.result(5) == a4.result(5) and a4.result()["value"] == 4 and a4.result()["coalesced"] == 1
+    assert b1.result(5)["value"] == 3 and b1.result()["status"] == "Success"
+    assert writes(plc) == [[("A", 1)], [("B", 3), ("A", 4)]]  # one batch, first-submitted tag first
+
+
+def test_failed_session_opens_the_circuit(plc, monkeypatch):
+    def broken(self, tag, value=None):
+        raise OSError("connection reset")
+    monkeypatch.setattr(plc, "Write", broken)
+    w = TagWriter("ip", LinkHealth(open_after=1, base=60))
+    with pytest.raises(ConnectionError):
+        w.write("A", 1, timeout=5)
+    with pytest.raises(LinkDown):  # fails fast, no new session
+        w.write("A", 1, timeout=5)
+
+
+def test_pulse_releases_after_its_width(plc):
+    pulses = PulseScheduler(TagWriter("ip"), {"M[1].3": 0.2})
+    assert pulses.pulse("M[1].3").result(5)["status"] == "Success"
+    wait_for(lambda: len(plc.calls) == 2 and not pulses.pending)
+    (on,), (off,) = plc.calls
+    assert on[:2] == ("M[1].3", 1) and off[:2] == ("M[1].3", 0)
+    assert 0.2 <= off[2] - on[2] < 0.5
+
+
+def test_repeat_pulse_replaces_the_pending_release(plc):
+    pulses = PulseScheduler(TagWriter("ip"), default_width=0.2)
+    pulses.pulse("M[1].3").result(5)
+    time.sleep(0.1)
+    second = time.monotonic()
+    pulses.pulse("M[1].3").result(5)
+    wait_for(lambda: len(plc.calls) == 3)
+    time.sleep(0.3)  # the first pulse's release would have landed by now
+    assert [v for call in writes(plc) for _, v in call] == [1, 1, 0]  # one release, for the later pulse
+    assert plc.calls[-1][0][2] - second >= 0.2
+
+
+def test_failed_release_is_retried(plc, monkeypatch):
+    monkeypatch.setattr(PulseScheduler, "RETRY_SEC", 0.05)
+    pulses = PulseScheduler(TagWriter("ip"), default_width=0.05)
+    pulses.pulse("M[1].3").result(5)
+    plc.fail.append(0x05)  # the first release comes back "Path destination unknown"
+    wait_for(lambda: len(plc.calls) == 3 and not pulses.pending)
+    assert [v for call in writes(plc) for _, v in call] == [1, 0, 0] and not pulses.pending
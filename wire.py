@@ -0,0 +1,196 @@
+"""Packed stream encoding: tag names once per connection, then positional values.
+
+    /stream?format=packed[&mode=delta]
+    python3 wire.py bench
+
+A JSON update repeats every tag name ("B1_Bake_Time_ACC", "TMR[6].PRE") in
+every event. A packed stream names its tags once, in a `schema` event sent
+on connect, with their types and (for REALs) decimals:
+
+    event: schema
+    data: {"tags": ["M[0].0", ...], "types": ["BOOL", ...], "decimals": [null, ...]}
+
+Each update after that is the base64 of:
+
+    u8       flags: 1 delta, 2 keyframe, 0 full snapshot
+    present  bit per tag, deltas only: the tags this update carries
+    null     bit per tag: carried, but the read failed
+    bools    bit per BOOL tag: its value
+    values   every other carried, non-null tag in index order, little-endian:
+             SINT b, INT h, DINT i, REAL f (float32), anything else d (float64)
+
+Bit fields run LSB first and are padded to whole bytes. Errors stay JSON
+({"error": ...}); a data line starting with "{" is never base64. The stream's
+tag set is fixed, so the schema holds for the whole connection.
+"""
+import base64, json, struct, sys, time
+
+DELTA, KEYFRAME = 1, 2
+CODES = {"SINT": "b", "INT": "h", "DINT": "i", "REAL": "f"}  # everything else but BOOL: "d"
+
+
+class PackedCodec:
+    """Encoder (and reference decoder) for one stream's fixed key list.
+    `types` are PLC type names or None (sent as float64); `decimals` rounds
+    REALs back after float32 on the client."""
+
+    def __init__(self, keys, types, decimals=None):
+        self.keys = list(keys)
+        self.types = list(types)
+        self.decimals = list(decimals) if decimals is not None else [None] * len(self.keys)
+        self._bits = (len(self.keys) + 7) // 8
+        self._fields = []  # (key, struct code or None for BOOL, bit in the bools field)
+        nbools = 0
+        for key, t in zip(self.keys, self.types):
+            if t == "BOOL":
+                self._fields.append((key, None, nbools))
+                nbools += 1
+            else:
+                self._fields.append((key, CODES.get(t, "d"), None))
+        self._bool_bytes = (nbools + 7) // 8
+        self._structs = {}
+        self.schema_msg = "event: schema\ndata: %s\n\n" % json.dumps(self.schema())
+
+    def schema(self):
+        return {"tags": self.keys, "types": self.types, "decimals": self.decimals}
+
+    def pack(self, values, flags=0):
+        """Bytes for `values` ({key: value}). In a delta only the keys present
+        are carried; otherwise a missing key is sent as null."""
+        present = nulls = bools = 0
+        nums, fmt = [], "<"
+        delta = flags & DELTA
+        for i, (key, code, b) in enumerate(self._fields):
+            if key in values:
+                v = values[key]
+                present |= 1 << i
+            elif delta:
+                continue
+            else:
+                v = None
+            if v is None:
+                nulls |= 1 << i
+            elif code is None:
+                if v:
+                    bools |= 1 << b
+            else:
+                nums.append(v)
+                fmt += code
+        st = self._structs.get(fmt)
+        if st is None:
+            st = self._structs[fmt] = struct.Struct(fmt)
+        n = self._bits
+        head = bytes((flags,)) + (present.to_bytes(n, "little") if delta else b"")
+        return head + nulls.to_bytes(n, "little") + bools.to_bytes(self._bool_bytes, "little") + st.pack(*nums)
+
+    def message(self, event_id, values, flags=0):
+        """SSE message: `id:` line plus the base64 update."""
+        return f"id: {event_id}\ndata: {base64.b64encode(self.pack(values, flags)).decode('ascii')}\n\n"
+
+    def unpack(self, data):
+        """(values, flags) from pack()'s bytes; what the pages' JS does."""
+        flags, n, off = data[0], self._bits, 1
+        delta = flags & DELTA
+        present = int.from_bytes(data[off:off + n], "little") if delta else -1
+        off += n if delta else 0
+        nulls = int.from_bytes(data[off:off + n], "little")
+        off += n
+        bools = int.from_bytes(data[off:off + self._bool_bytes], "little")
+        off += self._bool_bytes
+        values = {}
+        for i, (key, code, b) in enumerate(self._fields):
+            if not present >> i & 1:
+                continue
+            if nulls >> i & 1:
+                values[key] = None
+            elif code is None:
+                values[key] = bools >> b & 1
+            else:
+                v = struct.unpack_from("<" + code, data, off)[0]
+                off += struct.calcsize(code)
+                d = self.decimals[i]
+                values[key] = round(v, d) if code == "f" and d is not None else v
+        return values, flags
+
+
+# Shared by the pages: parse one stream event into the JSON payload's shape
+PACKED_JS = """
+    // Packed stream (?format=packed, see wire.py): the 'schema' event names the
+    // tags once, then each update is base64 bit fields and little-endian values
+    function packedSchema(s) {
+      s.bools = []; let nb = 0;
+      s.types.forEach((t, i) => { if (t === 'BOOL') s.bools[i] = nb++; });
+      s.boolBytes = (nb + 7) >> 3;
+      return s;
+    }
+    function unpackEvent(s, data) {
+      if (data[0] === '{') return JSON.parse(data);
+      const bin = atob(data), buf = new Uint8Array(bin.length);
+      for (let i = 0; i < bin.length; i++) buf[i] = bin.charCodeAt(i);
+      const dv = new DataView(buf.buffer), n = s.tags.length, nb = (n + 7) >> 3;
+      const flags = buf[0], delta = flags & 1;
+      const bit = (at, i) => (buf[at + (i >> 3)] >> (i & 7)) & 1;
+      const present = 1, nulls = delta ? 1 + nb : 1, bools = nulls + nb;
+      let off = bools + s.boolBytes;
+      const values = {};
+      for (let i = 0; i < n; i++) {
+        if (delta && !bit(present, i)) continue;
+        const t = s.types[i];
+        let v;
+        if (bit(nulls, i)) v = null;
+        else if (t === 'BOOL') v = bit(bools, s.bools[i]);
+        else if (t === 'SINT') { v = dv.getInt8(off); off += 1; }
+        else if (t === 'INT') { v = dv.getInt16(off, true); off += 2; }
+        else if (t === 'DINT') { v = dv.getInt32(off, true); off += 4; }
+        else if (t === 'REAL') { v = dv.getFloat32(off, true); off += 4; if (s.decimals[i] !== null) v = Number(v.toFixed(s.decimals[i])); }
+        else { v = dv.getFloat64(off, true); off += 8; }
+        values[s.tags[i]] = v;
+      }
+      return delta ? {values, delta: true} : flags & 2 ? {values, keyframe: true} : {values};
+    }
+"""
+
+
+def bench(n=20000):
+    """json.dumps(payload) against pack() + base64 for Booth 1's stream: a
+    keyframe and a typical delta (the fast-scan tags changing)."""
+    import random
+    import paintbooth
+    view = paintbooth.booth_views["1"]
+    codec = paintbooth.packed_codec(view)
+    rng = random.Random(1)
+    values = {}
+    for key, t in zip(codec.keys, codec.types):
+        values[key] = (rng.randint(0, 1) if t == "BOOL" else round(rng.uniform(0, 300), 1) if t == "REAL"
+                       else rng.randint(0, 30000))
+    fast = [k for k, f in paintbooth.TAG_SCHEMA.items() if f.scan == "fast" and k in values]
+    cases = {"keyframe": ({"values": values, "keyframe": True}, values, KEYFRAME),
+             "delta": ({"values": {k: values[k] for k in fast}, "delta": True}, {k: values[k] for k in fast}, DELTA)}
+    out = {"tags": len(codec.keys), "schema_bytes": len(codec.schema_msg)}
+    for name, (payload, vals, flags) in cases.items():
+        t0 = time.perf_counter()
+        for _ in range(n):
+            text = json.dumps(payload)
+        t1 = time.perf_counter()
+        for _ in range(n):
+            msg = base64.b64encode(codec.pack(vals, flags))
+        t2 = time.perf_counter()
+        for _ in range(n):
+            json.loads(text)
+        t3 = time.perf_counter()
+        raw = codec.pack(vals, flags)
+        for _ in range(n):
+            codec.unpack(base64.b64decode(msg))
+        t4 = time.perf_counter()
+        assert codec.unpack(raw)[0] == vals
+        out[name] = {"json_bytes": len(text), "packed_bytes": len(msg),
+                     "json_encode_us": round((t1 - t0) / n * 1e6, 2), "packed_encode_us": round((t2 - t1) / n * 1e6, 2),
+                     "json_decode_us": round((t3 - t2) / n * 1e6, 2), "packed_decode_us": round((t4 - t3) / n * 1e6, 2)}
+    return out
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        print(json.dumps(bench(), indent=2))
+    else:
+        print(__doc__)
@@ -0,0 +1,200 @@
+"""Tag writer: one long-lived PLC session owned by a worker thread.
+
+HTTP handlers submit writes and get a Future back. Writes to a tag that is
+still waiting in the queue are coalesced (last value wins, every caller gets
+the result of the write that actually went out), and everything pending is
+sent as a single batched comm.Write. While the shared LinkHealth has the
+circuit open, writes fail at once instead of opening a session.
+"""
+import heapq, threading, time
+from concurrent.futures import Future
+from pylogix import PLC
+from link import LinkDown, LinkHealth
+from poller import error_text
+
+
+class _Pending:
+    __slots__ = ("value", "futures", "enqueued")
+
+    def __init__(self, value, enqueued):
+        self.value = value
+        self.futures = []
+        self.enqueued = enqueued
+
+
+class TagWriter:
+    def __init__(self, ip, health=None):
+        self.ip = ip
+        self.health = health or LinkHealth()
+        self._pending = {}  # tag -> _Pending, in submission order
+        self._cond = threading.Condition()
+        self._comm = None
+        self._thread = None
+
+    def submit(self, tag, value):
+        """Queue a write and return a Future resolving to a result dict:
+        {"tag", "value", "status", "queue_ms", "plc_ms", "coalesced"}."""
+        fut = Future()
+        with self._cond:
+            p = self._pending.get(tag)
+            if p is None:
+                p = self._pending[tag] = _Pending(value, time.monotonic())
+            else:
+                p.value = value
+            p.futures.append(fut)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="plc-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return fut
+
+    def write(self, tag, value, timeout=None):
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(tag, value).result(timeout)
+
+    def _session(self):
+        if self._comm is None:
+            self._comm = PLC()
+            self._comm.IPAddress = self.ip
+        return self._comm
+
+    def _drop_session(self):
+        if self._comm is not None:
+            try:
+                self._comm.Close()
+            except Exception:
+                pass
+            self._comm = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                batch = list(self._pending.items())
+                self._pending = {}
+            started = time.monotonic()
+            try:
+                self.health.check()
+                comm = self._session()
+                if len(batch) == 1:
+                    tag, p = batch[0]
+                    results = [comm.Write(tag, p.value)]
+                else:
+                    results = comm.Write([(tag, p.value) for tag, p in batch])
+            except LinkDown as e:
+                for _, p in batch:
+                    for fut in p.futures:
+                        fut.set_exception(e)
+                continue
+            except Exception as e:
+                self.health.failed(error_text(e))
+                self._drop_session()
+                for _, p in batch:
+                    for fut in p.futures:
+                        fut.set_exception(ConnectionError(error_text(e)))
+                continue
+            plc_ms = round((time.monotonic() - started) * 1000, 1)
+            for (tag, p), r in zip(batch, results):
+                result = {
+                    "tag": tag,
+                    "value": p.value,
+                    "status": r.Status,
+                    "queue_ms": round((started - p.enqueued) * 1000, 1),
+                    "plc_ms": plc_ms,
+                    "coalesced": len(p.futures) - 1,
+                }
+                for fut in p.futures:
+                    fut.set_result(result)
+            if all(r.Status != "Success" for r in results):
+                # A dead connection shows up as a status, not an exception
+                self.health.failed(results[0].Status)
+                self._drop_session()
+            elif self.health.state != "connected":
+                self.health.ok()
+
+
+class PulseScheduler:
+    """Momentary (pulse-and-release) writes without holding a request thread.
+
+    pulse() writes the on value through the TagWriter and returns that write's
+    Future; the release (0) is put on a heap and written by the scheduler
+    thread `width` seconds after the on write completes, whether or not the
+    HTTP client is still there. A second pulse on a bit that is still held
+    extends the hold instead of starting a new pulse. Failed releases are
+    retried until they succeed.
+    """
+
+    RETRY_SEC = 0.5
+
+    def __init__(self, writer, widths=None, default_width=0.5):
+        self.writer = writer
+        self.widths = dict(widths or {})
+        self.default_width = default_width
+        self._heap = []     # (due, seq, tag)
+        self._due = {}      # tag -> due time of its pending release
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def width(self, tag):
+        return self.widths.get(tag, self.default_width)
+
+    def pulse(self, tag, value=1, width=None):
+        width = self.width(tag) if width is None else width
+        with self._cond:
+            held = tag in self._due
+            if held:
+                # Merge with the pulse already in progress
+                self._schedule(tag, max(self._due[tag], time.monotonic() + width))
+        fut = self.writer.submit(tag, value)
+        if not held:
+            # Measure the hold from when the on write reached the PLC
+            fut.add_done_callback(lambda _f: self._release_after(tag, width))
+        return fut
+
+    @property
+    def pending(self):
+        return len(self._due)
+
+    def _release_after(self, tag, width):
+        with self._cond:
+            self._schedule(tag, max(self._due.get(tag, 0), time.monotonic() + width))
+
+    def _schedule(self, tag, due):
+        # Called with the lock held; older heap entries for the tag go stale
+        self._seq += 1
+        self._due[tag] = due
+        heapq.heappush(self._heap, (due, self._seq, tag))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="plc-pulses", daemon=True)
+            self._thread.start()
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due, _, tag = self._heap[0]
+                    if self._due.get(tag) != due:
+                        heapq.heappop(self._heap)  # superseded by a merged pulse
+                        continue
+                    delay = due - time.monotonic()
+                    if delay <= 0:
+                        heapq.heappop(self._heap)
+                        break
+                    self._cond.wait(delay)
+            try:
+                ok = self.writer.write(tag, 0, timeout=10)["status"] == "Success"
+            except Exception:
+                ok = False
+            with self._cond:
+                if self._due.get(tag) != due:
+                    continue  # pulsed again while releasing; the newer release stands
+                if ok:
+                    del self._due[tag]
+                else:
+                    self._schedule(tag, time.monotonic() + self.RETRY_SEC)
@@ -0,0 +1,257 @@
+"""Cross-reference index for the controller's ladder logic.
+
+    python3 xref.py M[0].3 TMR[5].DN    # who drives / reads these tags
+    python3 xref.py bench
+
+The L5X export is parsed once into an inverted index, tag -> [(rung,
+instruction, role)], where role is "write" (OTE/OTL/TON/MOV destination...)
+or "read" (XIC/XIO/compare/MOV source...). The index is cached as JSON
+under a name derived from the file's SHA-256, so restarts skip the parse
+until the program is re-exported. Lookups are dict hits; answers are built
+once per tag and reused.
+"""
+import hashlib, json, os, re, sys, time
+import xml.etree.ElementTree as ET
+
+CACHE_VERSION = 1
+DEFAULT_L5X = "MainProgram_Program.L5X"
+DEFAULT_CACHE = "data/xref"
+
+# Operand roles per instruction, by position; None = not a tag (presets, routine names)
+ROLES = {
+    "XIC": ("read",), "XIO": ("read",),
+    "OTE": ("write",), "OTL": ("write",), "OTU": ("write",),
+    "ONS": ("write",), "OSR": ("write", "write"), "OSF": ("write", "write"),
+    "TON": ("write", None, None), "TOF": ("write", None, None), "RTO": ("write", None, None),
+    "CTU": ("write", None, None), "CTD": ("write", None, None), "RES": ("write",),
+    "MOV": ("read", "write"), "COP": ("read", "write", None), "CPT": ("write", "read"),
+    "ADD": ("read", "read", "write"), "SUB": ("read", "read", "write"),
+    "MUL": ("read", "read", "write"), "DIV": ("read", "read", "write"),
+    "MOD": ("read", "read", "write"), "ABS": ("read", "write"), "NEG": ("read", "write"),
+    "GRT": ("read", "read"), "LES": ("read", "read"), "GEQ": ("read", "read"),
+    "LEQ": ("read", "read"), "EQU": ("read", "read"), "NEQ": ("read", "read"),
+    "LIM": ("read", "read", "read"),
+    # PID(block, PV, tieback, CV, feedforward, alarm disable, hold)
+    "PID": ("write", "read", "read", "write", "read", "read", "read"),
+    "JSR": (None, None), "NOP": (),
+}
+
+_INSTR = re.compile(r"([A-Z][A-Z0-9_]*)\(")
+_TAG = re.compile(r"(?<![\w.:\]])[A-Za-z_][A-Za-z0-9_]*(?::[A-Za-z0-9_]+)*"
+                  r"(?:\[\d+(?:,\d+)*\])?(?:\.[A-Za-z0-9_]+(?:\[\d+\])?)*")
+
+
+def operands(text, start):
+    """Split the operand list that starts just after an opening paren at
+    `start`; returns ([operand text], index after the closing paren)."""
+    depth, i, args = 1, start, []
+    while depth and i < len(text):
+        c = text[i]
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if not depth:
+                args.append(text[start:i].strip())
+        elif c == "," and depth == 1:
+            args.append(text[start:i].strip())
+            start = i + 1
+        i += 1
+    return ([] if args == [""] else args), i
+
+
+def instructions(text):
+    """Yield (mnemonic, [operand text]) for each instruction in a neutral
+    rung text, skipping branch brackets; nested parens stay in the operand."""
+    pos = 0
+    while True:
+        m = _INSTR.search(text, pos)
+        if not m:
+            return
+        args, pos = operands(text, m.end())
+        yield m.group(1), args
+
+
+def operand_tags(operand):
+    """Tag references in one operand (several for a CPT expression)."""
+    return [t for t in _TAG.findall(operand) if not t[0].isdigit()]
+
+
+def parents(tag):
+    """Enclosing words/structures: TMR[5].DN -> TMR[5], TMR; M[0].3 -> M[0], M."""
+    out = []
+    while True:
+        cut = max(tag.rfind("."), tag.rfind("["))
+        if cut <= 0:
+            return out
+        tag = tag[:cut]
+        out.append(tag)
+
+
+def parse_l5x(path):
+    """(rungs, comments, types) from an L5X export: rungs as [routine, number,
+    text], comments as {tag: text} from tag and operand comments, types as
+    {tag: DataType} for controller and program tags."""
+    root = ET.parse(path).getroot()
+    rungs, comments, types = [], {}, {}
+    for tag in root.iter("Tag"):
+        name = tag.get("Name")
+        types[name] = tag.get("DataType")
+        desc = tag.find("Description")
+        if desc is not None and desc.text:
+            comments[name] = desc.text.strip()
+        for c in tag.iterfind("Comments/Comment"):
+            comments[name + c.get("Operand", "")] = " ".join((c.text or "").split())
+    for routine in root.iter("Routine"):
+        for rung in routine.iterfind("RLLContent/Rung"):
+            text = rung.findtext("Text") or ""
+            rungs.append([routine.get("Name"), int(rung.get("Number")), " ".join(text.split())])
+    return rungs, comments, types
+
+
+def build_index(rungs):
+    """{tag: [[rung index, mnemonic, role], ...]} over every operand of every rung."""
+    refs = {}
+    for n, (_, _, text) in enumerate(rungs):
+        for mnemonic, args in instructions(text):
+            roles = ROLES.get(mnemonic)
+            for i, arg in enumerate(args):
+                role = roles[i] if roles is not None and i < len(roles) else "read"
+                if role is None:
+                    continue
+                for tag in operand_tags(arg):
+                    entry = [n, mnemonic, role]
+                    lst = refs.setdefault(tag, [])
+                    if entry not in lst:
+                        lst.append(entry)
+    return refs
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class XrefIndex:
+    def __init__(self, data):
+        self.source_hash = data["source_sha256"]
+        self.rungs = data["rungs"]
+        self.refs = data["refs"]
+        self.comments = data["comments"]
+        self.types = data["types"]
+        self._names = {t.lower(): t for t in list(self.refs) + list(self.comments)}
+        self._children = {}  # tag -> indexed tags inside it (bits of a word, members of a timer)
+        for t in self.refs:
+            for p in parents(t):
+                self._children.setdefault(p, []).append(t)
+        self._answers = {}
+
+    @classmethod
+    def load(cls, l5x=DEFAULT_L5X, cache_dir=DEFAULT_CACHE):
+        """Index for `l5x`, from the cache when its hash matches, else parsed and cached."""
+        digest = file_hash(l5x)
+        cache = os.path.join(cache_dir, f"{digest[:16]}.json") if cache_dir else None
+        if cache and os.path.exists(cache):
+            try:
+                with open(cache) as f:
+                    data = json.load(f)
+                if data.get("version") == CACHE_VERSION and data.get("source_sha256") == digest:
+                    return cls(data)
+            except (OSError, ValueError):
+                pass  # unreadable cache: rebuild it
+        rungs, comments, types = parse_l5x(l5x)
+        data = {
+            "version": CACHE_VERSION,
+            "source_sha256": digest,
+            "rungs": rungs,
+            "refs": build_index(rungs),
+            "comments": comments,
+            "types": types,
+        }
+        if cache:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = cache + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, cache)
+            for name in os.listdir(cache_dir):
+                if name.endswith(".json") and os.path.join(cache_dir, name) != cache:
+                    os.remove(os.path.join(cache_dir, name))  # index of an older export
+        return cls(data)
+
+    def canonical(self, tag):
+        """The tag as spelled in the program (Logix names are case-insensitive),
+        or None when neither it nor any enclosing word/structure is referenced."""
+        tag = tag.replace(" ", "")
+        for p in [tag] + parents(tag):
+            name = self._names.get(p.lower())
+            if name is not None:
+                return name + tag[len(p):]
+        return None
+
+    def rung_key(self, n):
+        routine, number, _ = self.rungs[n]
+        return f"{routine}/{number}"
+
+    def lookup(self, tag):
+        """{"tag", "description", "drivers", "readers", "rungs"} for a tag,
+        including references made through its word/structure (MOV to M[100]
+        drives M[100].3; TON(TMR[5]) drives TMR[5].DN) and through its bits
+        or members. None when the program never mentions it."""
+        name = self.canonical(tag)
+        if name is None:
+            return None
+        answer = self._answers.get(name)
+        if answer is None:
+            answer = self._answers[name] = self._build(name)
+        return answer
+
+    def _build(self, name):
+        related = [name] + parents(name) + self._children.get(name, [])
+        drivers, readers, rungs = [], [], {}
+        for operand in related:
+            for n, mnemonic, role in self.refs.get(operand, ()):
+                routine, number, text = self.rungs[n]
+                ref = {"routine": routine, "rung": number, "instruction": mnemonic, "operand": operand}
+                (drivers if role == "write" else readers).append(ref)
+                rungs[self.rung_key(n)] = text
+        order = lambda r: (r["routine"], r["rung"])
+        return {
+            "tag": name,
+            "description": self.comments.get(name),
+            "drivers": sorted(drivers, key=order),
+            "readers": sorted(readers, key=order),
+            "rungs": rungs,
+        }
+
+
+def bench(l5x=DEFAULT_L5X):
+    import tempfile
+    with tempfile.TemporaryDirectory() as d:
+        t0 = time.perf_counter()
+        idx = XrefIndex.load(l5x, d)
+        t1 = time.perf_counter()
+        idx = XrefIndex.load(l5x, d)
+        t2 = time.perf_counter()
+    print(f"{len(idx.rungs)} rungs, {len(idx.refs)} tags referenced")
+    print(f"parse + index: {(t1 - t0) * 1000:.1f} ms, load from cache: {(t2 - t1) * 1000:.1f} ms")
+    tags = list(idx.refs)
+    for t in tags:
+        idx.lookup(t)  # first lookup builds the answer
+    n = 100000
+    t0 = time.perf_counter()
+    for i in range(n):
+        idx.lookup(tags[i % len(tags)])
+    print(f"lookup: {(time.perf_counter() - t0) / n * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["bench"]:
+        bench(*sys.argv[2:3])
+    else:
+        index = XrefIndex.load()
+        for t in sys.argv[1:]:
+            print(json.dumps(index.lookup(t), indent=2))